@@ -1,23 +1,44 @@
+import os
+import html
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, Column, Integer, String, Text, Date, Boolean, Float
 from sqlalchemy.orm import declarative_base, sessionmaker
 from modules_ai import extract_maintenance_fields_with_examples, generate_extraction_examples, parse_descriptions_bulk_batched, parse_description_deepseek
+from extraction_schemas import record_columns
 import json
 
+AERLINGUS_FILES = [
+    "data/aerlingus/ohf_ei_data_export_v0_1.csv",
+    "data/aerlingus/ohf_ei_data_export_v0_2.csv",
+]
+ID_COLUMNS = ['work_order_id', 'task_card_number', 'ac_registration_id']
+DESCRIPTION_COLUMNS = ['header_text', 'text_plain', 'text_html']
+ACTION_COLUMNS = ['action_header_text', 'action_text', 'action_comment']
+INGEST_COLUMNS = ID_COLUMNS + DESCRIPTION_COLUMNS + ACTION_COLUMNS
+AERLINGUS_PROMPT = 'extract_description_fields_aerlingus_v1.txt'
+
+def results_to_frame(results, index, prefix):
+    """
+    Normaliza una lista de resultados (dicts) en un DataFrame de una sola vez.
+    Los diccionarios anidados se aplanan en columnas (prefijo_clave_subclave) y
+    las listas se conservan como listas; los valores no se convierten a texto.
+    """
+    records = [result if isinstance(result, dict) else {} for result in results[:len(index)]]
+    frame = pd.json_normalize(records, sep='_')
+    frame.index = index[:len(records)]
+    return frame.add_prefix(prefix)
+
+
 def process_results(df_to_process,df_with_content, results_descriptions, results_actions):
     try:
-        for idx, (result_desc, result_action) in enumerate(zip(results_descriptions, results_actions)):
-            if idx < len(df_with_content):
-                df_index = df_with_content.index[idx]
-                
-                # Agregar campos extraídos como nuevas columnas
-                if isinstance(result_desc, dict):
-                    for key, value in result_desc.items():
-                        df_to_process.loc[df_index, f'llm_{key}'] = str(value) if value is not None else None
-
-                if isinstance(result_action, dict):
-                    for key, value in result_action.items():
-                        df_to_process.loc[df_index, f'llm_action_{key}'] = str(value) if value is not None else None
+        # Agregar campos extraídos como nuevas columnas con un único join por índice
+        extracted = pd.concat([
+            results_to_frame(results_descriptions, df_with_content.index, 'llm_'),
+            results_to_frame(results_actions, df_with_content.index, 'llm_action_'),
+        ], axis=1)
+        df_to_process = df_to_process.drop(columns=[col for col in extracted.columns if col in df_to_process.columns])
+        df_to_process = df_to_process.join(extracted)
 
         # Mostrar algunos ejemplos de los resultados
         llm_columns = [col for col in df_to_process.columns if col.startswith('llm_')]
@@ -38,23 +59,68 @@ def process_results(df_to_process,df_with_content, results_descriptions, results
     
     return df_to_process
 
-def create_custom_descriptions(df):
+def strip_html(series):
+    """Elimina etiquetas, entidades HTML y espacios repetidos de una Serie de texto"""
+    text = series.str.replace(r"(?is)<(script|style)\b.*?</\1\s*>", " ", regex=True)
+    text = text.str.replace(r"<[^>]*>", " ", regex=True)
+    # html.unescape solo sobre las filas que contienen alguna entidad
+    has_entity = text.str.contains("&", regex=False, na=False)
+    if has_entity.any():
+        text = text.mask(has_entity, text[has_entity].map(html.unescape))
+    return text.str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def _clean_text_column(series):
+    text = series.astype("string").str.strip()
+    return text.mask(text.isin(["", "nan"]))
+
+
+def _factorize_clean(series, html_markup=False):
+    """
+    Limpia cada valor distinto de la columna una sola vez (pd.factorize).
+
+    Returns:
+        (códigos por fila, array de textos limpios; el código -1 de los nulos apunta al último, vacío)
     """
-    Crear columnas concatenadas para descripción y acción
+    codes, uniques = pd.factorize(series)
+    cleaned = _clean_text_column(pd.Series(uniques, dtype=object))
+    if html_markup:
+        cleaned = _clean_text_column(strip_html(cleaned))
+    return codes, np.append(cleaned.fillna("").to_numpy(dtype=object), "")
+
+
+def _join_columns(df, columns, html_columns=()):
+    """Une las columnas con un espacio omitiendo los valores vacíos, sin recorrer filas"""
+    parts = [_factorize_clean(df[col], col in html_columns) for col in columns]
+
+    # Cada combinación distinta de valores se une una sola vez
+    combination = np.zeros(len(df), dtype=np.int64)
+    for codes, values in parts:
+        combination, _ = pd.factorize(combination * len(values) + codes % len(values))
+    _, first_rows = np.unique(combination, return_index=True)
+
+    joined = pd.Series("", index=range(len(first_rows)), dtype=object)
+    for codes, values in parts:
+        # Cada parte ya viene sin espacios en los extremos: el strip solo quita el separador sobrante
+        joined = (joined + " " + values[codes[first_rows]]).str.strip()
+    return pd.Series(joined.to_numpy(dtype=object)[combination], index=df.index, dtype=object)
+
+
+def create_custom_descriptions(df, strip_html_columns=('text_html',)):
+    """
+    Crear columnas concatenadas para descripción y acción.
+    Las columnas de strip_html_columns se limpian de marcado HTML antes de concatenarlas.
     """
     # Crear description_custom concatenando header_text, text_plain y text_html
-    df['description_custom'] = df[['header_text', 'text_plain', 'text_html']].fillna('').apply(
-        lambda x: ' '.join([str(val).strip() for val in x if str(val).strip() != '' and str(val).strip() != 'nan']), axis=1
-    )
+    df['description_custom'] = _join_columns(df, ['header_text', 'text_plain', 'text_html'], strip_html_columns)
     
     # Crear action_custom concatenando action_header_text, action_text, action_comment
-    df['action_custom'] = df[['action_header_text', 'action_text', 'action_comment']].fillna('').apply(
-        lambda x: ' '.join([str(val).strip() for val in x if str(val).strip() != '' and str(val).strip() != 'nan']), axis=1
-    )
+    df['action_custom'] = _join_columns(df, ['action_header_text', 'action_text', 'action_comment'], strip_html_columns)
     
     return df
 
-def process_with_llm(df, batch_size=5, max_records=None, use_deepseek=False):
+def process_with_llm(df, batch_size=5, max_records=None, use_deepseek=False, max_concurrency=4,
+                     max_input_tokens=8000, max_output_tokens=4000):
     """
     Procesar los textos concatenados con LLM para extraer campos estructurados
     """
@@ -108,8 +174,11 @@ def process_with_llm(df, batch_size=5, max_records=None, use_deepseek=False):
     results_descriptions = parse_descriptions_bulk_batched(
         descriptions,
         batch_size=batch_size,
-        prompt_template='extract_description_fields_aerlingus_v1.txt',
-        deepseek=use_deepseek
+        prompt_template=AERLINGUS_PROMPT,
+        deepseek=use_deepseek,
+        max_concurrency=max_concurrency,
+        max_input_tokens=max_input_tokens,
+        max_output_tokens=max_output_tokens
                 )
         # results_actions = parse_descriptions_bulk_batched(   #TODO FALTA EL PROMPT
         #     actions,
@@ -134,69 +203,92 @@ def process_with_llm(df, batch_size=5, max_records=None, use_deepseek=False):
     #     print("Continuando sin procesamiento LLM...")
     
 
+    # Las acciones aún no se extraen (falta el prompt): solo se añaden los campos de la descripción
+    return process_results(df_to_process, df_with_content, results_descriptions, [None] * len(results_descriptions))
 
 
-def process_aerlingus(use_llm=True, max_records=None, batch_size=3, use_deepseek=False):
-    file_path1 = "data/aerlingus/ohf_ei_data_export_v0_2.csv"
 
-    df1 = pd.read_csv(file_path1)
-    df2 = pd.read_csv(file_path2)
+def iter_aerlingus_chunks(file_paths=AERLINGUS_FILES, chunksize=50_000, columns=INGEST_COLUMNS):
+    """
+    Lee los CSV de Aerlingus por bloques leyendo solo las columnas necesarias
+    y crea description_custom/action_custom en cada bloque. La memoria
+    máxima depende del tamaño de bloque, no del tamaño de los archivos.
 
-    df_total = pd.concat([df1,df2])
-    df_total = df_total.sample(n=200, random_state=42).reset_index(drop=True)
-    # Mostrar información básica del dataframe
-    # print(f"Shape del dataframe: {df_total.shape}")
-    # print(f"Columnas disponibles: {list(df_total.columns)}")
-    
-    # Verificar si las columnas necesarias existen
-    required_cols_desc = ['header_text', 'text_plain', 'text_html']
-    required_cols_action = ['action_header_text', 'action_text', 'action_comment']
-    
-    desc_cols_exist = all(col in df_total.columns for col in required_cols_desc)
-    action_cols_exist = all(col in df_total.columns for col in required_cols_action)
-    
-    # print(f"Columnas de descripción disponibles: {desc_cols_exist}")
-    # print(f"Columnas de acción disponibles: {action_cols_exist}")
-    
-    if desc_cols_exist or action_cols_exist:
-        # Crear las columnas concatenadas
-        df_total = create_custom_descriptions(df_total)
-        
-        print(f"Columnas creadas exitosamente!")
-        
-        # Mostrar algunas muestras de las nuevas columnas
+    Yields:
+        DataFrame de hasta `chunksize` filas con `columns`, los campos concatenados y `source_file`
+    """
+    wanted = set(columns)
+    for file_path in file_paths:
+        available = pd.read_csv(file_path, nrows=0).columns
+        if not any(col in available for col in DESCRIPTION_COLUMNS + ACTION_COLUMNS):
+            print(f"{file_path}: no se encontraron las columnas necesarias para crear los campos concatenados")
+            continue
+
+        reader = pd.read_csv(file_path, usecols=lambda col: col in wanted, dtype=str, chunksize=chunksize)
+        for chunk in reader:
+            # Las columnas que faltan en un archivo se crean vacías para que todos los bloques tengan el mismo esquema
+            chunk = chunk.reindex(columns=columns)
+            chunk['source_file'] = os.path.basename(file_path)
+            yield create_custom_descriptions(chunk)
+
+
+def process_aerlingus(use_llm=True, max_records=None, batch_size=3, use_deepseek=False, max_concurrency=4,
+                      max_input_tokens=8000, max_output_tokens=4000, file_paths=AERLINGUS_FILES,
+                      chunksize=50_000, output_file="exports/aerlingus_processed.csv"):
+    """
+    Procesa los CSV de Aerlingus en streaming: cada bloque se concatena, se
+    envía a extracción y se añade a `output_file` antes de leer el siguiente.
+
+    Returns:
+        Número de registros escritos en `output_file`
+    """
+    if use_llm:
+        print(f"\n{'='*50}")
+        print("INICIANDO PROCESAMIENTO CON LLM")
+        print(f"{'='*50}")
+
+    if os.path.dirname(output_file):
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    output_columns = None
+    total_records = 0
+
+    for chunk in iter_aerlingus_chunks(file_paths, chunksize=chunksize):
+        if max_records is not None:
+            chunk = chunk.head(max_records - total_records)
+        if chunk.empty:
+            break
 
-        # if 'description_custom' in df_total.columns:
-        #     print(f"\nEjemplos de description_custom:")
-        #     for i, desc in enumerate(df_total['description_custom'].head(3)):
-        #         print(f"  {i+1}: {desc[:100]}...")
-        
-        # if 'action_custom' in df_total.columns:
-        #     print(f"\nEjemplos de action_custom:")
-        #     for i, action in enumerate(df_total['action_custom'].head(3)):
-        #         print(f"  {i+1}: {action[:100]}...")
-        
-        # Procesar con LLM si se solicita
         if use_llm:
-            print(f"\n{'='*50}")
-            print("INICIANDO PROCESAMIENTO CON LLM")
-            print(f"{'='*50}")
-
-            df_total = process_with_llm(
-                df_total, 
-                batch_size=batch_size, 
-                max_records=max_records, 
-                use_deepseek=use_deepseek
+            chunk = process_with_llm(
+                chunk,
+                batch_size=batch_size,
+                use_deepseek=use_deepseek,
+                max_concurrency=max_concurrency,
+                max_input_tokens=max_input_tokens,
+                max_output_tokens=max_output_tokens
             )
-            
-            # Guardar resultados en CSV para análisis posterior
-            output_file = "exports/aerlingus_processed.csv"
-            df_total.to_csv(output_file, index=False)
-            print(f"\nResultados guardados en: {output_file}")
-    else:
-        print("No se encontraron las columnas necesarias para crear los campos concatenados")
-    
-    return df_total
+
+        # La cabecera se fija con el primer bloque más todas las columnas llm_ del esquema del prompt:
+        # un bloque sin algún campo extraído (p. ej. todas sus peticiones fallaron) no la recorta
+        if output_columns is None:
+            output_columns = list(chunk.columns)
+            if use_llm:
+                output_columns += [col for col in record_columns(AERLINGUS_PROMPT, 'llm_') if col not in chunk.columns]
+            chunk.reindex(columns=output_columns).to_csv(output_file, index=False)
+        else:
+            dropped = [col for col in chunk.columns if col not in output_columns]
+            if dropped:
+                print(f"Warning: columnas fuera del esquema y del primer bloque descartadas: {dropped}")
+            chunk.reindex(columns=output_columns).to_csv(output_file, mode='a', header=False, index=False)
+
+        total_records += len(chunk)
+        print(f"Bloque procesado: {len(chunk)} registros ({total_records} en total)")
+        if max_records is not None and total_records >= max_records:
+            break
+
+    if total_records:
+        print(f"\nResultados guardados en: {output_file}")
+    return total_records
 
  
 
@@ -204,8 +296,12 @@ if __name__ == '__main__':
     # Configuración del procesamiento
     USE_LLM = True          # True para usar LLM, False solo para crear campos concatenados
     MAX_RECORDS = 200         # Número máximo de registros a procesar (None para todos)
-    BATCH_SIZE = 5          # Tamaño del batch para LLM
+    BATCH_SIZE = 5          # Máximo de descripciones por petición LLM
+    MAX_INPUT_TOKENS = 8000     # Presupuesto de tokens del prompt por petición
+    MAX_OUTPUT_TOKENS = 4000    # Presupuesto de tokens de respuesta por petición
     USE_DEEPSEEK = False     # True para usar DeepSeek, False para Azure OpenAI
+    MAX_CONCURRENCY = 4     # Número máximo de peticiones LLM en paralelo
+    CHUNKSIZE = 50_000      # Filas de CSV leídas por bloque
     
     print("PROCESAMIENTO DE DATOS AERLINGUS")
     print(f"Configuración:")
@@ -213,13 +309,20 @@ if __name__ == '__main__':
     print(f"  - Máximo registros: {MAX_RECORDS if MAX_RECORDS else 'Todos'}")
     print(f"  - Tamaño de batch: {BATCH_SIZE}")
     print(f"  - Usar DeepSeek: {USE_DEEPSEEK}")
+    print(f"  - Peticiones en paralelo: {MAX_CONCURRENCY}")
+    print(f"  - Filas por bloque: {CHUNKSIZE}")
+    print(f"  - Presupuesto de tokens (entrada/salida): {MAX_INPUT_TOKENS}/{MAX_OUTPUT_TOKENS}")
     print("-" * 50)
     
-    df_result = process_aerlingus(
+    total_records = process_aerlingus(
         use_llm=USE_LLM, 
         max_records=MAX_RECORDS, 
         batch_size=BATCH_SIZE,
-        use_deepseek=USE_DEEPSEEK
+        use_deepseek=USE_DEEPSEEK,
+        max_concurrency=MAX_CONCURRENCY,
+        max_input_tokens=MAX_INPUT_TOKENS,
+        max_output_tokens=MAX_OUTPUT_TOKENS,
+        chunksize=CHUNKSIZE
     )
     
-    print(f"\nProcesamiento completado. Shape final: {df_result.shape}")
\ No newline at end of file
+    print(f"\nProcesamiento completado. Registros procesados: {total_records}")
\ No newline at end of file
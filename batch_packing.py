@@ -0,0 +1,82 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken es opcional: se usa una estimación por caracteres
+    tiktoken = None
+
+# Tokens aproximados que añade el prefijo "\nDescription N: " a cada descripción
+DESCRIPTION_OVERHEAD_TOKENS = 6
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Sin acceso a los archivos de codificación (p. ej. entorno sin red)
+        return None
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """Cuenta tokens con el tokenizador local del modelo (o ~4 caracteres por token si no está disponible)"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def estimate_output_tokens(description_tokens, output_tokens_per_item=300):
+    """Estimación de la salida JSON de una descripción: una parte fija más la mitad de su longitud"""
+    return output_tokens_per_item + description_tokens // 2
+
+
+def pack_batches(descriptions, prompt_template, max_input_tokens=None, max_output_tokens=None,
+                 output_tokens_per_item=300, max_batch_size=None, model="gpt-4o-mini"):
+    """
+    Agrupa descripciones consecutivas en lotes que no superan el presupuesto de
+    tokens de entrada (template + descripciones) ni el de salida estimada.
+
+    Args:
+        descriptions: Lista de textos en el orden en que deben procesarse
+        prompt_template: Contenido del template con el campo {description}
+        max_input_tokens: Presupuesto de tokens del prompt (None = sin límite)
+        max_output_tokens: Presupuesto de tokens de la respuesta (None = sin límite)
+        output_tokens_per_item: Tokens de salida fijos estimados por descripción
+        max_batch_size: Máximo de descripciones por lote (None = sin límite)
+        model: Modelo cuyo tokenizador se usa para contar
+
+    Returns:
+        Lista de lotes, cada uno una lista de índices de `descriptions`
+    """
+    template_tokens = count_tokens(prompt_template.format(description=""), model)
+    batches = []
+    current = []
+    input_tokens = template_tokens
+    output_tokens = 0
+
+    for index, desc in enumerate(descriptions):
+        desc_tokens = count_tokens(str(desc), model) + DESCRIPTION_OVERHEAD_TOKENS
+        desc_output = estimate_output_tokens(desc_tokens, output_tokens_per_item)
+        exceeds = (
+            (max_input_tokens is not None and input_tokens + desc_tokens > max_input_tokens)
+            or (max_output_tokens is not None and output_tokens + desc_output > max_output_tokens)
+            or (max_batch_size is not None and len(current) >= max_batch_size)
+        )
+        # Una descripción que por sí sola supera el presupuesto va en un lote propio
+        if current and exceeds:
+            batches.append(current)
+            current = []
+            input_tokens = template_tokens
+            output_tokens = 0
+        current.append(index)
+        input_tokens += desc_tokens
+        output_tokens += desc_output
+
+    if current:
+        batches.append(current)
+    return batches
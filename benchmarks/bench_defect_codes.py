@@ -0,0 +1,89 @@
+"""
+Traducción de la columna Reason: df['Reason'].map(defect_code_dict) (método
+anterior, solo coincidencia exacta) frente a DefectCodeNormalizer, sobre
+códigos con variantes de espacios, mayúsculas y erratas. Compara también la
+búsqueda aproximada en el trie con la distancia de edición contra todas las
+claves.
+
+Uso:
+    python benchmarks/bench_defect_codes.py [num_filas]
+"""
+import sys
+import os
+import time
+import random
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+from defect_codes import DefectCodeNormalizer, CodeTrie, canonical_code
+from settings import defect_code_dict
+
+
+def variant(code, rng):
+    kind = rng.random()
+    if kind < 0.6:
+        return code
+    if kind < 0.75:
+        return code.replace(":", ": ") if ":" in code else f" {code} "
+    if kind < 0.85:
+        return code.lower()
+    if kind < 0.95 and len(code) >= 8:
+        i = rng.randrange(len(code))
+        return code[:i] + code[i + 1:]  # errata: un carácter omitido
+    return f"UNKNOWN {rng.randint(0, 30)}"
+
+
+def synthetic_reasons(num_rows, seed=42):
+    rng = random.Random(seed)
+    codes = list(defect_code_dict)
+    return pd.Series([variant(rng.choice(codes), rng) if rng.random() > 0.02 else None for _ in range(num_rows)])
+
+
+def levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j in range(1, len(b) + 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (char != b[j - 1]))
+    return row[-1]
+
+
+def timed(label, func, rows):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    translated = result[0] if isinstance(result, tuple) else result
+    print(f"{label:<44} {elapsed * 1000:>9.1f} ms {translated.notna().sum() / rows:>9.1%}")
+    return result
+
+
+if __name__ == '__main__':
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    reasons = synthetic_reasons(num_rows)
+    print(f"{num_rows:,} filas, {reasons.nunique()} códigos distintos")
+    print(f"{'Método':<44} {'tiempo':>12} {'traducidas':>10}")
+    print("-" * 68)
+
+    timed("map(defect_code_dict) (anterior)", lambda: reasons.map(defect_code_dict), num_rows)
+    normalizer = DefectCodeNormalizer(defect_code_dict)
+    translated, unmapped = timed("normalize, primera llamada (resuelve códigos)",
+                                 lambda: normalizer.normalize(reasons), num_rows)
+    # Con los códigos ya resueltos: coste de aplicar la traducción a las filas
+    timed("resolve fila a fila, códigos en caché",
+          lambda: reasons.map(lambda code: None if code is None else normalizer.resolve(code)), num_rows)
+    timed("normalize (categórica), códigos en caché", lambda: normalizer.normalize(reasons), num_rows)
+    print(f"Códigos distintos por método: {dict(normalizer.stats())}")
+    print(f"Sin traducción: {len(unmapped)} códigos distintos en {int(unmapped.sum()):,} filas")
+
+    keys = list({canonical_code(code) for code in defect_code_dict})
+    words = [canonical_code(code) for code in reasons.dropna().unique()]
+    trie = CodeTrie(keys)
+    start = time.perf_counter()
+    trie_matches = [trie.search(word, 2) for word in words]
+    trie_time = time.perf_counter() - start
+    start = time.perf_counter()
+    brute_matches = [sorted((d, key) for key in keys if (d := levenshtein(word, key)) <= 2) for word in words]
+    brute_time = time.perf_counter() - start
+    assert trie_matches == brute_matches
+    print(f"Búsqueda aproximada de {len(words)} códigos: trie {trie_time * 1000:.1f} ms, "
+          f"todas las claves {brute_time * 1000:.1f} ms ({brute_time / trie_time:.1f}x)")
@@ -0,0 +1,77 @@
+"""
+Compactación del Excel de hallazgos (una hoja por taskbar): lectura
+secuencial con pd.read_excel(sheet_name=None) (método anterior) frente al
+pool de procesos, con calamine si está instalado, y lectura posterior del
+Excel compactado frente al intermedio columnar.
+
+Uso:
+    python benchmarks/bench_excel_compactor.py [num_hojas] [filas_por_hoja] [procesos]
+"""
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+from bench_regex_extraction import synthetic_descriptions
+import excel_compactor
+
+
+def build_workbook(path, num_sheets, rows_per_sheet):
+    descriptions = synthetic_descriptions(num_sheets * rows_per_sheet)
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for n in range(num_sheets):
+            chunk = descriptions[n * rows_per_sheet:(n + 1) * rows_per_sheet]
+            pd.DataFrame({
+                'Description': chunk,
+                'W/O': [8019242 + i for i in range(len(chunk))],
+                'A/C': ["EC-MXV"] * len(chunk),
+                'Date': pd.date_range("2024-01-01", periods=len(chunk)),
+                'ATA': ["25"] * len(chunk),
+                'Flags': ["NRC"] * len(chunk),
+                'Non-Relevant': [False] * len(chunk),
+                'Reason': ["SP:CRACKS"] * len(chunk),
+            }).to_excel(writer, sheet_name=f"TB{n:05d}", index=False)
+
+
+def sequential_read(path):
+    all_sheets = pd.read_excel(path, sheet_name=None)
+    return pd.concat([df.assign(taskbar_id=name) for name, df in all_sheets.items()], ignore_index=True)
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<50} {time.perf_counter() - start:8.2f} s")
+    return result
+
+
+if __name__ == '__main__':
+    num_sheets = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows_per_sheet = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    work_dir = tempfile.mkdtemp()
+    source = os.path.join(work_dir, "Findings_PP.xlsx")
+    build_workbook(source, num_sheets, rows_per_sheet)
+    print(f"{num_sheets} hojas x {rows_per_sheet} filas, {workers} procesos "
+          f"(calamine {'disponible' if excel_compactor.python_calamine else 'no instalado'})")
+    print("-" * 62)
+
+    old = timed("Secuencial, openpyxl (anterior)", lambda: sequential_read(source))
+    new = timed("Pool de procesos, openpyxl",
+                lambda: excel_compactor.concat_sheets_with_taskbar_id(source, max_workers=workers, engine="openpyxl"))
+    if excel_compactor.python_calamine is not None:
+        timed("Pool de procesos, calamine",
+              lambda: excel_compactor.concat_sheets_with_taskbar_id(source, max_workers=workers, engine="calamine"))
+    assert len(old) == len(new)
+
+    compacted = os.path.join(work_dir, "Findings_PP_compactado.xlsx")
+    new.to_excel(compacted, index=False, sheet_name='Sheet1')
+    timed("process_findings: Excel compactado", lambda: excel_compactor.read_findings(compacted))
+    try:
+        intermediate = os.path.join(work_dir, "Findings_PP_compactado.parquet")
+        excel_compactor.write_intermediate(new, intermediate)
+        timed("process_findings: intermedio Parquet", lambda: excel_compactor.read_findings(intermediate))
+    except ImportError:
+        print("Intermedio Parquet/Feather: requiere pyarrow")
@@ -0,0 +1,67 @@
+"""
+Exportación de finding_description_tasks: lectura completa con
+pd.read_sql_table (método anterior) frente a la exportación por bloques con
+cursor de servidor. Se mide el tiempo y el pico de memoria (tracemalloc).
+
+Uso:
+    python benchmarks/bench_export_tables.py [num_filas] [filas_por_bloque]
+"""
+import sys
+import os
+import time
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+from sqlalchemy import create_engine, insert
+from bench_regex_extraction import synthetic_descriptions
+import export_tables_to_csv as exporter
+from models import Base, Taskbar
+
+
+def build_database(path, num_rows):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    descriptions = synthetic_descriptions(num_rows)
+    with engine.begin() as connection:
+        connection.execute(insert(Taskbar), [
+            {"taskbar_id": f"TB{i:08d}", "wo_number": f"80{i:06d}", "raw_description": description,
+             "finding": description[:200], "part_numbers": "G2557685700000, G2557685700001",
+             "send_to_workshop": i % 7 == 0}
+            for i, description in enumerate(descriptions)
+        ])
+    engine.dispose()
+
+
+def full_table_export(db_path, output_dir):
+    df = pd.read_sql_table('finding_description_tasks', create_engine(f"sqlite:///{db_path}"))
+    df.to_csv(os.path.join(output_dir, 'finding_description_tasks.csv'), index=False, encoding='utf-8')
+
+
+def measured(label, func, num_rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<40} {elapsed:8.3f} s  {num_rows / elapsed:12,.0f} filas/s  pico {peak / 2 ** 20:8.1f} MiB")
+
+
+if __name__ == '__main__':
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else exporter.DEFAULT_CHUNK_SIZE
+    work_dir = tempfile.mkdtemp()
+    db_path = os.path.join(work_dir, "aircraft_data.db")
+    build_database(db_path, num_rows)
+    print(f"Exportación de {num_rows:,} filas (bloques de {chunk_size:,})")
+    print("-" * 90)
+
+    measured("pd.read_sql_table completo (anterior)", lambda: full_table_export(db_path, work_dir), num_rows)
+    measured("Por bloques, CSV", lambda: exporter.export_table_to_csv(
+        'finding_description_tasks', db_path, os.path.join(work_dir, "csv"), chunk_size=chunk_size), num_rows)
+    if exporter.pa is not None:
+        measured("Por bloques, Parquet", lambda: exporter.export_table_to_csv(
+            'finding_description_tasks', db_path, os.path.join(work_dir, "parquet"), format='parquet',
+            chunk_size=chunk_size), num_rows)
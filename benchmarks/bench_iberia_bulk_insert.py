@@ -0,0 +1,87 @@
+"""
+Benchmark de carga en SQLite: inserción fila a fila con commit por Taskbar
+(load_findings_row_by_row) frente a la inserción masiva bulk_load_findings.
+
+Uso:
+    python benchmarks/bench_iberia_bulk_insert.py [num_filas]
+"""
+import sys
+import os
+import time
+import random
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from bench_regex_extraction import synthetic_descriptions
+
+# Las bases de datos del benchmark se crean en un directorio temporal
+os.chdir(tempfile.mkdtemp())
+import iberia_findings_to_db as iberia
+from regex_extractor import extract_regex_fields
+
+
+def synthetic_findings(num_rows, seed=42):
+    rng = random.Random(seed)
+    descriptions = [desc.lower() for desc in synthetic_descriptions(num_rows, seed)]
+    return pd.DataFrame({
+        'taskbar_id': [f"TB{i:08d}" for i in range(num_rows)],
+        'Description': descriptions,
+        'W/O': [f"80{rng.randint(10000, 99999)}" for _ in range(num_rows)],
+        'A/C': [rng.choice(["EC-MXV", "EC-NIG", "EC-LUB"]) for _ in range(num_rows)],
+        'Date': pd.to_datetime("2024-01-01") + pd.to_timedelta([rng.randint(0, 365) for _ in range(num_rows)], unit="D"),
+        'ATA': [rng.choice(["25", "32", "52"]) for _ in range(num_rows)],
+        'Flags': ["NRC"] * num_rows,
+        'Non-Relevant': [rng.random() < 0.1 for _ in range(num_rows)],
+        'Reason': [rng.choice(["damaged", "worn", None]) for _ in range(num_rows)],
+    })
+
+
+def new_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", iberia.set_sqlite_pragmas)
+    iberia.Base.metadata.create_all(engine)
+    return engine
+
+
+def table_rows(engine):
+    with engine.connect() as connection:
+        taskbars = connection.execute(text(
+            "SELECT taskbar_id, wo_number, part_numbers, amm_task, send_to_workshop FROM finding_description_tasks ORDER BY id"
+        )).fetchall()
+        work_orders = connection.execute(text(
+            "SELECT taskbar_id, date, non_relevant FROM finding_work_orders ORDER BY id"
+        )).fetchall()
+    return taskbars, work_orders
+
+
+def timed(label, func, num_rows):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed:8.3f} s  {num_rows / elapsed:12,.0f} filas/s")
+    return elapsed
+
+
+if __name__ == '__main__':
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    df = synthetic_findings(num_rows)
+    parsed = [extract_regex_fields(desc) for desc in df['Description']]
+    print(f"Carga de {num_rows:,} hallazgos ({2 * num_rows:,} filas)")
+    print("-" * 80)
+
+    row_engine = new_engine("row_by_row.db")
+    session = sessionmaker(bind=row_engine)()
+    row_time = timed("Fila a fila (load_findings_row_by_row)",
+                     lambda: iberia.load_findings_row_by_row(df, parsed, session), 2 * num_rows)
+    session.close()
+
+    bulk_engine = new_engine("bulk.db")
+    bulk_time = timed("Masiva (bulk_load_findings)",
+                      lambda: iberia.bulk_load_findings(df, parsed, db_engine=bulk_engine), 2 * num_rows)
+
+    assert table_rows(row_engine) == table_rows(bulk_engine)
+    print("-" * 80)
+    print(f"Speedup: {row_time / bulk_time:.2f}x")
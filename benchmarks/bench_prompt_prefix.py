@@ -0,0 +1,59 @@
+"""
+Tokens de cada parte del prompt por template: prefijo común que el proveedor
+puede servir desde su caché de prompts con el formato anterior (un único
+mensaje con las descripciones en medio) frente al formato sistema + usuario.
+
+Uso:
+    python benchmarks/bench_prompt_prefix.py [num_peticiones] [descripciones_por_petición]
+"""
+import sys
+import os
+import glob
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from batch_packing import count_tokens
+from modules_ai import load_template, numbered_descriptions
+from prompt_templates import PROMPT_CACHE_MIN_TOKENS
+
+DESCRIPTIONS = [
+    "FINDING (NRC) TASKCARD ZL-151-02-2 (4) / ITEM-1WO8019242 AFT CARGO: IN BAD CONDITION SIDEWALLPANEL 152NW P/NG2557685700000",
+    "ENGINE STARTER PERFORM ON PN:3505468-6 SN:GRTA0635 SERVICING (STARTER-801100-G1-1- OIL CHANGE)",
+    "THRUST RV 33F-FIRESHIELD/SEALS-GVI-INSPECTION FLAP TRACK FAIRING N°4 GALMAR",
+    "SEAT 12C BACKREST TORN. REPLACED COVER IAW CMM 25-21-11",
+]
+# Los tokens de entrada servidos desde la caché se facturan a la mitad (gpt-4o-mini)
+CACHED_INPUT_PRICE_FACTOR = 0.5
+
+
+def billed_tokens(prefix_tokens, total_tokens, num_requests):
+    """Tokens facturados equivalentes si el prefijo se sirve de la caché a partir de la segunda petición"""
+    if prefix_tokens < PROMPT_CACHE_MIN_TOKENS:
+        return total_tokens * num_requests
+    cached = prefix_tokens * (num_requests - 1)
+    return total_tokens * num_requests - cached * (1 - CACHED_INPUT_PRICE_FACTOR)
+
+
+if __name__ == '__main__':
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    batch = [DESCRIPTIONS[i % len(DESCRIPTIONS)] for i in range(batch_size)]
+    descriptions_text = numbered_descriptions(batch)
+    print(f"{num_requests} peticiones de {batch_size} descripciones")
+    print(f"{'Template':<48} {'sistema':>8} {'usuario':>8} {'prefijo ant.':>12} {'prefijo nuevo':>13} {'ahorro':>8}")
+    print("-" * 102)
+
+    prompts_dir = os.path.join(os.path.dirname(__file__), '..', 'prompts')
+    for path in sorted(glob.glob(os.path.join(prompts_dir, '*.txt'))):
+        template = load_template(os.path.basename(path))
+        messages = template.messages(descriptions_text)
+        system_tokens = template.system_tokens
+        user_tokens = count_tokens(messages[-1]["content"])
+        total_tokens = system_tokens + user_tokens
+        # Formato anterior: solo el texto anterior a las descripciones es idéntico entre peticiones
+        old_prefix = count_tokens(template.text.split("{description}")[0].format())
+        old_billed = billed_tokens(old_prefix, count_tokens(template.format(descriptions_text)), num_requests)
+        new_billed = billed_tokens(system_tokens, total_tokens, num_requests)
+        print(f"{template.name:<48} {system_tokens:>8} {user_tokens:>8} {old_prefix:>12} {system_tokens:>13} "
+              f"{1 - new_billed / old_billed:>8.1%}")
+    print(f"\nLa caché de prompts solo se aplica a prefijos de {PROMPT_CACHE_MIN_TOKENS} tokens o más; "
+          f"los tokens en caché se facturan al {CACHED_INPUT_PRICE_FACTOR:.0%}.")
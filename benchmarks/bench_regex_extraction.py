@@ -0,0 +1,82 @@
+"""
+Benchmark de extracción regex: bucle por fila de test/test_regex.extract_data
+frente a la versión vectorizada regex_extractor.extract_regex_frame.
+
+Uso:
+    python benchmarks/bench_regex_extraction.py [num_filas]
+"""
+import sys
+import os
+import time
+import random
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'test')))
+import pandas as pd
+from test_regex import extract_data
+from regex_extractor import extract_regex_fields, extract_regex_frame
+
+TEMPLATE = (
+    "FINDING (NRC) TASKCARD ZL-151-0{card}-2 ({seq}) / ITEM-1WO80{wo}    {location}: IN BAD CONDITION "
+    "SIDEWALLPANEL {panel}  P/NG25576{pn}00000AMM TASK 25-53-00-000-801-AREMOVAL OF THE CEILING PANELS, "
+    "THEPARTITION PANELS AND THE SIDEWALLPANELS IN THE AFT CARGO COMPARTMENT{action}AMM TASK "
+    "25-53-00-400-801-AINSTALLATION OF THE CEILING PANELS, THEPARTITION PANELS AND THESIDEWALL PANELS "
+    "IN THE AFT CARGO COMPARTMENT"
+)
+ACTIONS = ["SEND TO WORKSHOP IAW WRF", "DAMAGES OUT OF LIMITS IAW AMM 25-50-00-283 REV 42SUPPLY A NEW PANEL", ""]
+LOCATIONS = ["AFT CARGO", "FWD CARGO", "R/H WING", "L/H WING"]
+
+
+def synthetic_descriptions(num_rows, seed=42):
+    rng = random.Random(seed)
+    return [
+        TEMPLATE.format(
+            card=rng.randint(1, 9),
+            seq=rng.randint(1, 9),
+            wo=rng.randint(10000, 99999),
+            location=rng.choice(LOCATIONS),
+            panel=f"{rng.randint(100, 999)}{rng.choice(['NW', 'SW', 'NE', 'AL'])}",
+            pn=rng.randint(1000, 9999),
+            action=rng.choice(ACTIONS),
+        )
+        for _ in range(num_rows)
+    ]
+
+
+def duplicated_descriptions(num_rows, unique_ratio=0.2, seed=42):
+    """Exportación realista: muchas filas repiten la misma descripción"""
+    rng = random.Random(seed)
+    pool = synthetic_descriptions(max(1, int(num_rows * unique_ratio)), seed)
+    return [rng.choice(pool) for _ in range(num_rows)]
+
+
+def timed(label, func, num_rows):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed:8.3f} s  {num_rows / elapsed:12,.0f} filas/s")
+    return elapsed, result
+
+
+def run(title, descriptions):
+    num_rows = len(descriptions)
+    series = pd.Series(descriptions)
+    print(f"{title}: {num_rows:,} filas ({series.nunique():,} distintas)")
+    print("-" * 80)
+
+    loop_time, _ = timed("Bucle por fila (test_regex.extract_data)", lambda: [extract_data(d) for d in descriptions], num_rows)
+    scalar_time, scalar = timed("Bucle por fila (extract_regex_fields)", lambda: [extract_regex_fields(d) for d in descriptions], num_rows)
+    frame_time, frame = timed("Vectorizado (extract_regex_frame)", lambda: extract_regex_frame(series), num_rows)
+
+    assert frame["taskcard"].tolist() == [r["taskcard"] for r in scalar]
+    assert frame["part_numbers"].tolist() == [r["part_numbers"] for r in scalar]
+    print("-" * 80)
+    print(f"Speedup vectorizado vs extract_data: {loop_time / frame_time:.2f}x")
+    print(f"Speedup vectorizado vs extract_regex_fields: {scalar_time / frame_time:.2f}x")
+    print()
+
+
+if __name__ == '__main__':
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    run("Descripciones únicas", synthetic_descriptions(num_rows))
+    run("Descripciones con repeticiones", duplicated_descriptions(num_rows))
@@ -0,0 +1,136 @@
+"""
+Consultas habituales sobre el esquema anterior de hallazgos (FK por
+taskbar_id sin índices, P/N separados por comas) frente al esquema revisado
+(finding_id, índices compuestos y tablas hijas), migrando la misma base de
+datos con migrate_finding_schema.
+
+Uso:
+    python benchmarks/bench_schema_queries.py [num_hallazgos]
+"""
+import sys
+import os
+import time
+import random
+import shutil
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import create_engine, text
+
+# Las bases de datos del benchmark se crean en un directorio temporal
+os.chdir(tempfile.mkdtemp())
+import iberia_findings_to_db as iberia
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE finding_description_tasks (id INTEGER PRIMARY KEY, taskbar_id VARCHAR(50) NOT NULL,"
+    " wo_number VARCHAR(50) NOT NULL, part_numbers TEXT, amm_task VARCHAR(100), amm_description TEXT,"
+    " raw_description TEXT, description_hash VARCHAR(64), finding VARCHAR(255))",
+    "CREATE UNIQUE INDEX uq_finding_description_tasks_key"
+    " ON finding_description_tasks (taskbar_id, wo_number, description_hash)",
+    "CREATE TABLE finding_work_orders (id INTEGER PRIMARY KEY,"
+    " taskbar_id VARCHAR(50) REFERENCES finding_description_tasks (taskbar_id), wo_number VARCHAR(50) NOT NULL,"
+    " ac VARCHAR(10), date DATE, ata VARCHAR(10), flags VARCHAR(50), non_relevant BOOLEAN, reason TEXT)",
+]
+# (nombre, consulta en el esquema anterior, consulta en el esquema revisado)
+QUERIES = [
+    ("Órdenes de trabajo con su hallazgo",
+     "SELECT COUNT(*) FROM finding_work_orders o JOIN finding_description_tasks t"
+     " ON t.taskbar_id = o.taskbar_id AND t.wo_number = o.wo_number",
+     "SELECT COUNT(*) FROM finding_work_orders o JOIN finding_description_tasks t ON t.id = o.finding_id"),
+    ("ATA 25 en un trimestre",
+     "SELECT COUNT(*) FROM finding_work_orders WHERE ata = '25' AND date BETWEEN '2024-01-01' AND '2024-03-31'",
+     "SELECT COUNT(*) FROM finding_work_orders WHERE ata = '25' AND date BETWEEN '2024-01-01' AND '2024-03-31'"),
+    ("Un avión en un mes",
+     "SELECT COUNT(*) FROM finding_work_orders WHERE ac = 'EC-M07' AND date BETWEEN '2024-05-01' AND '2024-05-31'",
+     "SELECT COUNT(*) FROM finding_work_orders WHERE ac = 'EC-M07' AND date BETWEEN '2024-05-01' AND '2024-05-31'"),
+    ("Hallazgos por motivo",
+     "SELECT COUNT(*) FROM finding_work_orders WHERE reason = 'cracks'",
+     "SELECT COUNT(*) FROM finding_work_orders WHERE reason = 'cracks'"),
+    ("Hallazgos con un P/N",
+     "SELECT COUNT(*) FROM finding_description_tasks WHERE ',' || REPLACE(part_numbers, ' ', '') || ','"
+     " LIKE '%,PN00042,%'",
+     "SELECT COUNT(DISTINCT finding_id) FROM finding_part_numbers WHERE part_number = 'PN00042'"),
+]
+LOOKUPS = 500
+
+
+def build_legacy_database(path, num_findings, seed=42):
+    rng = random.Random(seed)
+    engine = create_engine(f"sqlite:///{path}")
+    findings, work_orders = [], []
+    for i in range(num_findings):
+        part_numbers = ",".join(f"PN{rng.randint(0, 4999):05d}" for _ in range(rng.randint(0, 3)))
+        findings.append({"taskbar_id": f"TB{i // 5:07d}", "wo_number": f"80{i:07d}", "part_numbers": part_numbers,
+                         "amm_task": f"25-{rng.randint(10, 99)}-00", "description_hash": f"{i:064d}",
+                         "finding": "panel dented"})
+        work_orders.append({"taskbar_id": f"TB{i // 5:07d}", "wo_number": f"80{i:07d}",
+                            "ac": f"EC-M{rng.randint(0, 49):02d}",
+                            "date": f"{rng.choice([2023, 2024, 2025])}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                            "ata": str(rng.choice(range(20, 80))), "reason": rng.choice(["cracks", "dent", "worn",
+                                                                                           "corrosion", "missing"])})
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text(
+            "INSERT INTO finding_description_tasks (taskbar_id, wo_number, part_numbers, amm_task, description_hash,"
+            " finding) VALUES (:taskbar_id, :wo_number, :part_numbers, :amm_task, :description_hash, :finding)"
+        ), findings)
+        connection.execute(text(
+            "INSERT INTO finding_work_orders (taskbar_id, wo_number, ac, date, ata, reason)"
+            " VALUES (:taskbar_id, :wo_number, :ac, :date, :ata, :reason)"
+        ), work_orders)
+    engine.dispose()
+    return [(row["taskbar_id"], row["wo_number"]) for row in work_orders]
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_query(engine, sql):
+    with engine.connect() as connection:
+        return connection.execute(text(sql)).scalar()
+
+
+def run_lookups(engine, keys):
+    # Búsqueda fila a fila por clave de carga, como en upsert_findings y load_findings_row_by_row
+    with engine.connect() as connection:
+        return sum(len(connection.execute(text(
+            "SELECT id FROM finding_work_orders WHERE taskbar_id = :taskbar_id AND wo_number = :wo_number"
+        ), {"taskbar_id": taskbar_id, "wo_number": wo_number}).fetchall()) for taskbar_id, wo_number in keys)
+
+
+if __name__ == '__main__':
+    num_findings = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    legacy_path = os.path.abspath("legacy.db")
+    keys = build_legacy_database(legacy_path, num_findings)
+    revised_path = os.path.abspath("revised.db")
+    shutil.copy(legacy_path, revised_path)
+    legacy = create_engine(f"sqlite:///{legacy_path}")
+    revised = create_engine(f"sqlite:///{revised_path}")
+
+    start = time.perf_counter()
+    iberia.migrate_description_keys(revised)
+    iberia.migrate_updated_at(revised)
+    iberia.migrate_finding_schema(revised)
+    print(f"{num_findings:,} hallazgos; migración del esquema en {time.perf_counter() - start:.2f} s")
+    print(f"{'Consulta':<40} {'anterior':>10} {'revisado':>10} {'mejora':>8}")
+    print("-" * 72)
+
+    for name, legacy_sql, revised_sql in QUERIES:
+        legacy_time, legacy_result = timed(lambda: run_query(legacy, legacy_sql))
+        revised_time, revised_result = timed(lambda: run_query(revised, revised_sql))
+        assert legacy_result == revised_result, (name, legacy_result, revised_result)
+        print(f"{name:<40} {legacy_time * 1000:>8.1f}ms {revised_time * 1000:>8.1f}ms "
+              f"{legacy_time / revised_time:>7.1f}x")
+
+    sample = random.Random(0).sample(keys, min(LOOKUPS, len(keys)))
+    legacy_time, _ = timed(lambda: run_lookups(legacy, sample), repeat=1)
+    revised_time, _ = timed(lambda: run_lookups(revised, sample), repeat=1)
+    print(f"{f'{len(sample)} búsquedas por (taskbar_id, W/O)':<40} {legacy_time * 1000:>8.1f}ms "
+          f"{revised_time * 1000:>8.1f}ms {legacy_time / revised_time:>7.1f}x")
@@ -0,0 +1,105 @@
+"""
+Caché semántica: tasa de aciertos y exactitud de los registros reutilizados
+sobre un conjunto reservado, para varios umbrales de similitud.
+
+Sin argumentos usa hallazgos sintéticos con el formato de Iberia (plantillas
+repetidas con distintos identificadores). Con un diario de extracción
+(run_journal) y el Excel de hallazgos se evalúa con las extracciones reales.
+
+Uso:
+    python benchmarks/bench_semantic_cache.py [num_hallazgos]
+    python benchmarks/bench_semantic_cache.py --journal data/iberia/extraction_journal.jsonl --findings data/iberia/Findings_PP_compactado.xlsx
+"""
+import sys
+import os
+import time
+import random
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from semantic_cache import evaluate_semantic_cache
+
+THRESHOLDS = [0.8, 0.85, 0.9, 0.95, 0.98]
+# (descripción, hallazgo normalizado, acciones)
+TEMPLATES = [
+    ("{location}: IN BAD CONDITION SIDEWALLPANEL {panel} P/N{pn}", "Sidewall panel in bad condition", {}),
+    ("{location}: CEILING PANEL {panel} DELAMINATED. SEND TO WORKSHOP", "Ceiling panel delaminated", {"send_to_workshop": True}),
+    ("{location}: FLOOR PANEL {panel} CORRODED OUT OF LIMITS IAW SRM", "Floor panel corroded", {"damage_out_of_limits": True}),
+    ("{location}: SEAL OF ACCESS PANEL {panel} DAMAGED. NEW MATERIAL REQUIRED P/N{pn}", "Access panel seal damaged",
+     {"supply_new_material": True}),
+    ("{location}: LINING {panel} SCRATCHED", "Lining scratched", {}),
+]
+LOCATIONS = ["AFT CARGO", "FWD CARGO", "BULK CARGO", "CABIN ZONE B", "LH WING"]
+# Hallazgos en texto libre: comparten vocabulario pero el hallazgo cambia con el componente y el defecto
+COMPONENTS = ["SEAT BACKREST", "SEAT TRACK COVER", "OVERHEAD BIN LATCH", "LAV DOOR HINGE", "GALLEY OVEN DOOR",
+              "CARPET", "WINDOW SHADE", "READING LIGHT", "TRAY TABLE", "ARMREST"]
+DEFECTS = ["TORN", "LOOSE", "BROKEN", "MISSING", "INOP", "CRACKED", "WORN"]
+ACTIONS = ["send_to_workshop", "damage_out_of_limits", "supply_new_material"]
+
+
+def synthetic_findings(num_findings, seed=42):
+    rng = random.Random(seed)
+    descriptions, records = [], []
+    for _ in range(num_findings):
+        template, finding, actions = rng.choice(TEMPLATES)
+        location = rng.choice(LOCATIONS)
+        taskcard = f"ZL-{rng.randint(100, 999)}-{rng.randint(1, 99):02d}-{rng.randint(1, 9)}"
+        item = str(rng.randint(1, 9))
+        work_order = f"WO{rng.randint(8000000, 8999999)}"
+        panel = f"{rng.randint(100, 999)}{rng.choice(['NW', 'AL', 'BR', 'CZ'])}"
+        pn = f"G{rng.randint(10 ** 12, 10 ** 13 - 1)}"
+        if rng.random() < 0.4:
+            component, defect = rng.choice(COMPONENTS), rng.choice(DEFECTS)
+            template, finding, actions = f"{{location}}: {component} {defect}", f"{component} {defect}".capitalize(), {}
+        body = template.format(location=location, panel=panel, pn=pn)
+        descriptions.append(f"FINDING (NRC) TASKCARD {taskcard} ({item}) / ITEM-{item}{work_order} {body}")
+        records.append({
+            "taskcard": f"{taskcard} ({item})",
+            "work_order": work_order,
+            "item": item,
+            "location": location,
+            "panel_code": panel if "{panel}" in template else None,
+            "fin": panel if "{panel}" in template else None,
+            "part_numbers": [pn] if "{pn}" in template else [],
+            "finding": finding,
+            "actions": {action: actions.get(action, False) for action in ACTIONS},
+        })
+    return descriptions, records
+
+
+def journal_findings(journal_path, findings_path):
+    from run_journal import RunJournal
+    from excel_compactor import read_findings
+    from iberia_findings_to_db import _finding_keys
+
+    df = read_findings(findings_path)
+    df['Description'] = df['Description'].str.lower()
+    keys = _finding_keys(df).agg("|".join, axis=1).tolist()
+    extracted = RunJournal(journal_path).load(keys)
+    pairs = [(description, extracted[key]) for key, description in zip(keys, df['Description']) if extracted.get(key)]
+    return [description for description, _ in pairs], [record for _, record in pairs]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("num_findings", nargs="?", type=int, default=1000)
+    parser.add_argument("--journal")
+    parser.add_argument("--findings")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.journal:
+        descriptions, records = journal_findings(args.journal, args.findings)
+    else:
+        descriptions, records = synthetic_findings(args.num_findings)
+    print(f"{len(descriptions)} hallazgos, {args.test_size:.0%} reservados para la evaluación")
+    print(f"{'umbral':>7} {'aciertos':>9} {'exactitud campos':>17} {'registro exacto':>16} {'tiempo':>8}")
+    print("-" * 62)
+    for threshold in THRESHOLDS:
+        start = time.perf_counter()
+        report = evaluate_semantic_cache(descriptions, records, threshold=threshold, test_size=args.test_size)
+        elapsed = time.perf_counter() - start
+        field_accuracy = f"{report['field_accuracy']:.1%}" if report['field_accuracy'] is not None else "-"
+        exact_match = f"{report['exact_match']:.1%}" if report['exact_match'] is not None else "-"
+        print(f"{threshold:>7} {report['hit_rate']:>9.1%} {field_accuracy:>17} {exact_match:>16} {elapsed:>7.2f}s")
+    print("\nLos aciertos no llaman al LLM; el resto se extrae como hasta ahora.")
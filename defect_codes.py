@@ -0,0 +1,175 @@
+import argparse
+import re
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+# Espacios alrededor de la puntuación de los códigos ("SP: CRACKS", "CRACKS & DENTS", "B_R : DAMAGED")
+_PUNCTUATION_SPACES = re.compile(r"\s*([:&/_,>+\-])\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _clean_code(code):
+    """Mayúsculas, sin espacios en los extremos y con los espacios internos colapsados"""
+    return _WHITESPACE.sub(" ", str(code).upper()).strip()
+
+
+def canonical_code(code):
+    """Forma canónica de un código de defecto: además de _clean_code, sin espacios junto a la puntuación"""
+    return _PUNCTUATION_SPACES.sub(r"\1", _clean_code(code))
+
+
+class _TrieNode:
+    __slots__ = ("children", "key")
+
+    def __init__(self):
+        self.children = {}
+        self.key = None
+
+
+class CodeTrie:
+    """
+    Trie de códigos canónicos con búsqueda por distancia de edición
+    (Levenshtein): cada nodo calcula una fila de la matriz a partir de la de
+    su padre, de modo que los prefijos comunes se calculan una sola vez y las
+    ramas cuya distancia mínima ya supera el límite se descartan.
+    """
+
+    def __init__(self, keys=()):
+        self.root = _TrieNode()
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        node.key = key
+
+    def search(self, word, max_distance):
+        """Claves a distancia de edición <= max_distance de word, como lista de (distancia, clave)"""
+        results = []
+        first_row = list(range(len(word) + 1))
+        for char, child in self.root.children.items():
+            self._search(child, char, word, first_row, max_distance, results)
+        return sorted(results)
+
+    def _search(self, node, char, word, previous_row, max_distance, results):
+        row = [previous_row[0] + 1]
+        for i in range(1, len(word) + 1):
+            row.append(min(row[i - 1] + 1, previous_row[i] + 1, previous_row[i - 1] + (word[i - 1] != char)))
+        if node.key is not None and row[-1] <= max_distance:
+            results.append((row[-1], node.key))
+        if min(row) <= max_distance:
+            for next_char, child in node.children.items():
+                self._search(child, next_char, word, row, max_distance, results)
+
+
+class DefectCodeNormalizer:
+    """
+    Traduce los códigos de defecto (columna Reason) con settings.defect_code_dict
+    tolerando variantes de escritura. Cada código se resuelve en este orden:
+
+    1. exacto: tras pasar a mayúsculas y colapsar espacios
+    2. canónico: además sin espacios junto a la puntuación ("SP: CRACKS" -> "SP:CRACKS")
+    3. aproximado: el código canónico más cercano por distancia de edición
+       ("PLUG:DAMAGED" -> "PLUG:DAMAED"), solo en códigos de al menos
+       min_fuzzy_length caracteres y si el más cercano no es ambiguo
+
+    Las claves que comparten forma canónica con traducciones distintas
+    ("P: BAD CONDITION" / "P:BAD CONDITION") solo se resuelven por coincidencia exacta.
+    """
+
+    def __init__(self, code_dict, min_fuzzy_length=4):
+        self.min_fuzzy_length = min_fuzzy_length
+        self.exact = {_clean_code(code): value for code, value in code_dict.items()}
+        canonical = {}
+        for code, value in code_dict.items():
+            canonical.setdefault(canonical_code(code), set()).add(value)
+        # None marca las formas canónicas ambiguas
+        self.canonical = {code: values.pop() if len(values) == 1 else None for code, values in canonical.items()}
+        self.trie = CodeTrie(self.canonical)
+        self._resolved = {}
+
+    def max_distance(self, code):
+        """Distancia de edición admitida: 1 en códigos cortos, 2 a partir de 8 caracteres"""
+        if len(code) < self.min_fuzzy_length:
+            return 0
+        return 1 if len(code) < 8 else 2
+
+    def resolve_with_method(self, code):
+        """Devuelve (traducción, método) con método 'exact', 'canonical', 'fuzzy' o (None, None) si no se resuelve"""
+        if code in self._resolved:
+            return self._resolved[code]
+        result = None, None
+        cleaned = _clean_code(code)
+        canonical = canonical_code(code)
+        if cleaned in self.exact:
+            result = self.exact[cleaned], "exact"
+        elif self.canonical.get(canonical) is not None:
+            result = self.canonical[canonical], "canonical"
+        elif canonical not in self.canonical and self.max_distance(canonical):
+            matches = self.trie.search(canonical, self.max_distance(canonical))
+            if matches:
+                best = {self.canonical[key] for distance, key in matches if distance == matches[0][0]}
+                if len(best) == 1 and None not in best:
+                    result = best.pop(), "fuzzy"
+        self._resolved[code] = result
+        return result
+
+    def resolve(self, code):
+        return self.resolve_with_method(code)[0]
+
+    def normalize(self, reasons):
+        """
+        Traduce una columna de códigos. La columna se pasa a categórica y se
+        resuelve una vez cada código distinto; la traducción se aplica a todas
+        las filas indexando por los códigos de la categórica.
+
+        Returns:
+            (traducciones como Series categórica, frecuencia de los códigos sin traducción)
+        """
+        codes = reasons.astype("category")
+        categories = codes.cat.categories
+        resolved = [self.resolve(code) for code in categories]
+        values = list(dict.fromkeys(value for value in resolved if value is not None))
+        position = {value: i for i, value in enumerate(values)}
+        # -1 final: las filas nulas (código -1) siguen siendo nulas
+        lookup = np.array([position[value] if value is not None else -1 for value in resolved] + [-1])
+        translated = pd.Series(pd.Categorical.from_codes(lookup[codes.cat.codes.to_numpy()], categories=values),
+                               index=reasons.index, name=reasons.name)
+
+        counts = codes.value_counts(sort=False)
+        unmapped = counts[[value is None for value in resolved]]
+        unmapped = unmapped[unmapped > 0].sort_values(ascending=False, kind="stable")
+        unmapped.index = unmapped.index.astype(object)
+        return translated, unmapped
+
+    def stats(self):
+        """Códigos distintos resueltos por cada método (None = sin traducción)"""
+        return Counter(method for value, method in self._resolved.values())
+
+
+def report_unmapped(unmapped, limit=20):
+    """Imprime los códigos sin traducción más frecuentes"""
+    if unmapped.empty:
+        return
+    print(f"Códigos de defecto sin traducción: {len(unmapped)} distintos en {int(unmapped.sum())} filas")
+    for code, count in unmapped.head(limit).items():
+        print(f"  {code!r}: {count}")
+
+
+if __name__ == "__main__":
+    from excel_compactor import read_findings
+    from settings import defect_code_dict
+
+    parser = argparse.ArgumentParser(description="Comprueba la traducción de los códigos de defecto (columna Reason)")
+    parser.add_argument("findings_file", help="Excel compactado o intermedio .parquet/.feather")
+    parser.add_argument("--limit", type=int, default=50, help="Códigos sin traducción a mostrar")
+    args = parser.parse_args()
+    normalizer = DefectCodeNormalizer(defect_code_dict)
+    reasons = read_findings(args.findings_file)['Reason']
+    translated, unmapped = normalizer.normalize(reasons)
+    print(f"{int(translated.notna().sum())} de {int(reasons.notna().sum())} filas traducidas; "
+          f"códigos distintos por método: {dict(normalizer.stats())}")
+    report_unmapped(unmapped, limit=args.limit)
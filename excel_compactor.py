@@ -1,20 +1,127 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
-def concat_sheets_with_taskbar_id(excel_path):
-    # Lee todas las hojas en un diccionario de DataFrames
-    all_sheets = pd.read_excel(excel_path, sheet_name=None)
-    # Lista para almacenar los DataFrames modificados
+try:
+    import python_calamine
+except ImportError:  # calamine es opcional: lector Excel en Rust mucho más rápido que openpyxl
+    python_calamine = None
+
+DEFAULT_ENGINE = "calamine" if python_calamine is not None else "openpyxl"
+INTERMEDIATE_FORMATS = (".parquet", ".feather")
+# Salida por defecto del compactador y entrada por defecto de iberia_findings_to_db
+DEFAULT_INTERMEDIATE_PATH = os.path.join("data", "iberia", "Findings_PP_compactado.parquet")
+
+
+def _read_sheet_group(excel_path, sheet_names, engine):
+    # Cada proceso abre el libro una sola vez y lee su grupo de hojas
+    with pd.ExcelFile(excel_path, engine=engine) as workbook:
+        return [(sheet_name, workbook.parse(sheet_name)) for sheet_name in sheet_names]
+
+
+def concat_sheets_with_taskbar_id(excel_path, max_workers=None, engine=None):
+    """
+    Lee todas las hojas del libro y las concatena añadiendo la columna
+    taskbar_id con el nombre de la hoja (categórica, en el orden de las hojas).
+
+    Args:
+        excel_path: Ruta del libro Excel (una hoja por taskbar)
+        max_workers: Procesos de lectura (por defecto os.cpu_count(); 1 = sin pool)
+        engine: Motor de pandas.read_excel (por defecto calamine si está instalado, si no openpyxl)
+    """
+    engine = engine or DEFAULT_ENGINE
+    with pd.ExcelFile(excel_path, engine=engine) as workbook:
+        sheet_names = workbook.sheet_names
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(sheet_names)))
+
+    if max_workers == 1:
+        sheets = _read_sheet_group(excel_path, sheet_names, engine)
+    else:
+        # Grupos contiguos de hojas: se conserva el orden original al concatenar
+        size = -(-len(sheet_names) // max_workers)
+        groups = [sheet_names[i:i + size] for i in range(0, len(sheet_names), size)]
+        with ProcessPoolExecutor(max_workers=len(groups)) as executor:
+            results = executor.map(_read_sheet_group, [excel_path] * len(groups), groups, [engine] * len(groups))
+            sheets = [sheet for group in results for sheet in group]
+
     dfs = []
-    for sheet_name, df in all_sheets.items():
+    for sheet_name, df in sheets:
         df['taskbar_id'] = sheet_name  # Añade la columna con el nombre de la hoja
         dfs.append(df)
     # Concatena todos los DataFrames en uno solo
     df_concat = pd.concat(dfs, ignore_index=True)
+    df_concat['taskbar_id'] = pd.Categorical(df_concat['taskbar_id'], categories=sheet_names)
     return df_concat
 
+
+def _columnar_safe(df):
+    """Columnas object con tipos mezclados (p. ej. W/O numérico y texto) a texto: Arrow exige un tipo por columna"""
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if values.map(type).nunique() > 1:
+            df[column] = df[column].map(lambda value: value if pd.isna(value) else str(value))
+    return df
+
+
+def write_intermediate(df, path):
+    """Guarda el DataFrame compactado en Parquet o Feather según la extensión (requiere pyarrow)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in INTERMEDIATE_FORMATS:
+        raise ValueError(f"Formato intermedio no soportado: {extension} (opciones: {INTERMEDIATE_FORMATS})")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = _columnar_safe(df)
+    if extension == ".parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_feather(path)
+
+
+def read_findings(file_path, sheet_name='Sheet1'):
+    """
+    Lee los hallazgos de Iberia del intermedio columnar (.parquet / .feather,
+    con taskbar_id categórico) o, para cualquier otra extensión, de la hoja
+    `sheet_name` del Excel compactado.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".parquet":
+        return pd.read_parquet(file_path)
+    if extension == ".feather":
+        return pd.read_feather(file_path)
+    return pd.read_excel(file_path, sheet_name=sheet_name, engine=DEFAULT_ENGINE)
+
+
+def compact_findings(excel_path, intermediate_path, max_workers=None, engine=None, force=False):
+    """
+    Compacta el libro en el intermedio columnar. Si el intermedio es más
+    reciente que el libro se reutiliza sin volver a leer el Excel.
+
+    Returns:
+        DataFrame compactado
+    """
+    if (not force and os.path.exists(intermediate_path)
+            and os.path.getmtime(intermediate_path) >= os.path.getmtime(excel_path)):
+        print(f"Usando el intermedio en caché {intermediate_path}")
+        return read_findings(intermediate_path)
+    df = concat_sheets_with_taskbar_id(excel_path, max_workers=max_workers, engine=engine)
+    write_intermediate(df, intermediate_path)
+    print(f"Compactadas {df['taskbar_id'].cat.categories.size} hojas ({len(df)} filas) en {intermediate_path}")
+    return df
+
+
 if __name__ == "__main__":
-    excel_path1 = r"C:\Users\CristianEscudero\Downloads\Findings.xlsx"
-    excel_path2 = r"C:\Users\CristianEscudero\Downloads\Findings_PP.xlsx"
-    findings_pp = concat_sheets_with_taskbar_id(excel_path2)
-    # Puedes guardar el resultado si lo deseas:
-    findings_pp.to_excel(r"data\Findings_PP_compactado.xlsx", index=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Compacta las hojas del Excel de hallazgos en un único archivo")
+    parser.add_argument("excel_path", nargs="?", default=r"C:\Users\CristianEscudero\Downloads\Findings_PP.xlsx")
+    parser.add_argument("output", nargs="?", default=DEFAULT_INTERMEDIATE_PATH,
+                        help="Intermedio .parquet/.feather (o .xlsx para el formato anterior)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de lectura")
+    parser.add_argument("--engine", default=None, help="Motor de lectura (calamine, openpyxl)")
+    parser.add_argument("--force", action="store_true", help="Volver a leer el Excel aunque el intermedio esté al día")
+    args = parser.parse_args()
+    if args.output.lower().endswith(INTERMEDIATE_FORMATS):
+        compact_findings(args.excel_path, args.output, max_workers=args.workers, engine=args.engine, force=args.force)
+    else:
+        findings_pp = concat_sheets_with_taskbar_id(args.excel_path, max_workers=args.workers, engine=args.engine)
+        findings_pp.to_excel(args.output, index=False, sheet_name='Sheet1')
@@ -1,103 +1,356 @@
-import pandas as pd
-import sqlite3
-from sqlalchemy import create_engine
+import argparse
+import csv
+import datetime
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, inspect, select, and_, or_, MetaData, Table
+from models import Base
 
-def export_table_to_csv(table_name, db_path='aircraft_data.db', output_dir='exports'):
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: solo se necesita para exportar a Parquet
+    pa = None
+    pq = None
+
+# Filas por bloque: la memoria usada por tabla depende solo de este valor
+DEFAULT_CHUNK_SIZE = 50_000
+EXPORT_FORMATS = ("csv", "parquet")
+# Exportación incremental: columna de modificación (si existe) y archivo con la marca de cada tabla
+WATERMARK_COLUMN = 'updated_at'
+WATERMARKS_FILE = '_watermarks.json'
+_watermarks_lock = threading.Lock()
+
+
+def get_engine(db_path='aircraft_data.db'):
+    """Engine compartido por todas las tablas de una exportación"""
+    return create_engine(f'sqlite:///{db_path}')
+
+
+def _reflect_table(table_name, engine):
+    return Table(table_name, MetaData(), autoload_with=engine)
+
+
+def _arrow_type(column_type):
+    python_type = None
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        pass
+    # datetime es subclase de date: se comprueba antes
+    if python_type is datetime.datetime:
+        return pa.timestamp('us')
+    return {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        float: pa.float64(),
+        datetime.date: pa.date32(),
+    }.get(python_type, pa.string())
+
+
+def arrow_schema(table):
     """
-    Exporta una tabla de SQLite a CSV
-    
+    Esquema Arrow de una tabla: los tipos se toman de los modelos (Taskbar,
+    WorkOrder) y, para las columnas o tablas que no están en ellos, de la
+    base de datos.
+    """
+    model = Base.metadata.tables.get(table.name)
+    fields = []
+    for column in table.columns:
+        source = model.c[column.name] if model is not None and column.name in model.c else column
+        fields.append(pa.field(column.name, _arrow_type(source.type), nullable=source.nullable))
+    return pa.schema(fields)
+
+
+def iter_table_chunks(table, engine, chunk_size=DEFAULT_CHUNK_SIZE, statement=None):
+    """
+    Lee la tabla en bloques de `chunk_size` filas con un cursor de servidor
+    (stream_results): nunca se carga la tabla completa en memoria.
+
+    Args:
+        statement: Consulta sobre la tabla (por defecto todas las filas)
+
+    Yields:
+        Listas de filas (tuplas en el orden de table.columns)
+    """
+    statement = statement if statement is not None else select(table)
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(statement)
+        for rows in result.partitions(chunk_size):
+            yield rows
+
+
+def _write_csv(table, chunks, path):
+    rows_written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([column.name for column in table.columns])
+        for rows in chunks:
+            writer.writerows(rows)
+            rows_written += len(rows)
+    return rows_written
+
+
+def _write_parquet(table, chunks, path):
+    schema = arrow_schema(table)
+    rows_written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            rows_written += len(rows)
+    return rows_written
+
+
+def export_table_to_csv(table_name, db_path='aircraft_data.db', output_dir='exports', format='csv',
+                        chunk_size=DEFAULT_CHUNK_SIZE, engine=None):
+    """
+    Exporta una tabla de SQLite a CSV (o Parquet) leyendo y escribiendo por bloques
+
     Args:
         table_name: Nombre de la tabla a exportar
         db_path: Ruta a la base de datos SQLite
-        output_dir: Directorio donde guardar los archivos CSV
+        output_dir: Directorio donde guardar los archivos exportados
+        format: 'csv' o 'parquet' (requiere pyarrow; tipos de columna de models.py)
+        chunk_size: Filas leídas y escritas por bloque
+        engine: Engine SQLAlchemy a reutilizar (por defecto se crea uno para db_path)
+
+    Returns:
+        dict con la tabla, la ruta del archivo, las filas y las columnas exportadas,
+        o None si hubo un error
     """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación no soportado: {format} (opciones: {EXPORT_FORMATS})")
+    if format == 'parquet' and pa is None:
+        raise ImportError("La exportación a Parquet requiere pyarrow (pip install pyarrow)")
+
     # Crear directorio de exportación si no existe
     os.makedirs(output_dir, exist_ok=True)
-    
+
+    path = os.path.join(output_dir, f'{table_name}.{format}')
+    # Se escribe en un archivo temporal: una exportación interrumpida no deja un archivo a medias
+    tmp_path = path + '.tmp'
     try:
-        # Conectar a la base de datos SQLite
-        engine = create_engine(f'sqlite:///{db_path}')
-        
-        # Leer la tabla completa
+        engine = engine if engine is not None else get_engine(db_path)
+        table = _reflect_table(table_name, engine)
+
         print(f"Exportando tabla '{table_name}'...")
-        df = pd.read_sql_table(table_name, engine)
-        
-        # Crear nombre del archivo CSV
-        csv_filename = os.path.join(output_dir, f'{table_name}.csv')
-        
-        # Exportar a CSV
-        df.to_csv(csv_filename, index=False, encoding='utf-8')
-        
+        chunks = iter_table_chunks(table, engine, chunk_size)
+        writer = _write_parquet if format == 'parquet' else _write_csv
+        rows = writer(table, chunks, tmp_path)
+        os.replace(tmp_path, path)
+
+        columns = [column.name for column in table.columns]
         print(f"✅ Tabla '{table_name}' exportada exitosamente")
-        print(f"📁 Archivo: {csv_filename}")
-        print(f"📊 Filas exportadas: {len(df)}")
-        print(f"📋 Columnas: {len(df.columns)}")
-        print(f"🔍 Columnas disponibles: {list(df.columns)}")
+        print(f"📁 Archivo: {path}")
+        print(f"📊 Filas exportadas: {rows}")
+        print(f"📋 Columnas: {len(columns)}")
         print("-" * 60)
-        
-        return df
-        
+
+        return {"table": table_name, "path": path, "rows": rows, "columns": columns}
+
     except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         print(f"❌ Error exportando tabla '{table_name}': {str(e)}")
         return None
 
-def export_all_tables(db_path='aircraft_data.db', output_dir='exports'):
+
+def load_watermarks(output_dir='exports'):
+    """Marca de agua de cada tabla exportada de forma incremental"""
+    path = os.path.join(output_dir, WATERMARKS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_watermark(output_dir, table_name, watermark):
+    # Las tablas se exportan en paralelo: lectura y escritura del archivo bajo un único lock
+    with _watermarks_lock:
+        watermarks = load_watermarks(output_dir)
+        watermarks[table_name] = watermark
+        path = os.path.join(output_dir, WATERMARKS_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(watermarks, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+def _delta_statement(table, watermark):
     """
-    Exporta todas las tablas de la base de datos a CSV
+    Filas posteriores a la marca, ordenadas por (updated_at, id) o por id si la
+    tabla no tiene columna de modificación.
+    """
+    if 'id' not in table.c:
+        raise ValueError(f"La tabla '{table.name}' no tiene columna id para la exportación incremental")
+    last_id = watermark.get('id') if watermark else None
+    if WATERMARK_COLUMN in table.c:
+        column = table.c[WATERMARK_COLUMN]
+        statement = select(table).order_by(column, table.c.id)
+        if watermark and watermark.get('column') == WATERMARK_COLUMN:
+            value = datetime.datetime.fromisoformat(watermark['value'])
+            statement = statement.where(or_(column > value, and_(column == value, table.c.id > last_id)))
+        return statement
+    statement = select(table).order_by(table.c.id)
+    if last_id is not None:
+        statement = statement.where(table.c.id > last_id)
+    return statement
+
+
+def _partition_name(watermark):
+    if not watermark:
+        return "part-full"
+    if watermark.get('column') == WATERMARK_COLUMN:
+        value = datetime.datetime.fromisoformat(watermark['value'])
+        return f"part-after-{value:%Y%m%dT%H%M%S%f}-{watermark['id']}"
+    return f"part-after-{watermark['id']}"
+
+
+def export_table_incremental(table_name, db_path='aircraft_data.db', output_dir='exports', format='csv',
+                             chunk_size=DEFAULT_CHUNK_SIZE, engine=None, ingest_date=None):
+    """
+    Exporta solo las filas nuevas o modificadas desde la exportación anterior.
+
+    Cada tabla guarda en output_dir/_watermarks.json su marca de agua: el
+    updated_at y el id de la última fila exportada (o solo el id si la tabla
+    no tiene updated_at). Las filas posteriores se escriben en un archivo nuevo
+    de la partición output_dir/<tabla>/ingest_date=<fecha>/; la marca solo se
+    actualiza cuando el archivo está completo, y el nombre del archivo depende
+    de la marca de partida, de modo que repetir una exportación interrumpida lo
+    sobrescribe en lugar de duplicar filas.
+
+    Solo se capturan inserciones y actualizaciones: las filas borradas de la
+    base de datos no generan ningún registro en el delta.
+
+    Args:
+        ingest_date: Fecha de la partición (por defecto hoy)
+
+    Returns:
+        dict con la tabla, la ruta del archivo (None si no hay filas nuevas), las
+        filas exportadas y la nueva marca de agua, o None si hubo un error
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación no soportado: {format} (opciones: {EXPORT_FORMATS})")
+    if format == 'parquet' and pa is None:
+        raise ImportError("La exportación a Parquet requiere pyarrow (pip install pyarrow)")
+
+    ingest_date = ingest_date or datetime.date.today().isoformat()
+    tmp_path = None
+    try:
+        engine = engine if engine is not None else get_engine(db_path)
+        table = _reflect_table(table_name, engine)
+        watermark = load_watermarks(output_dir).get(table_name)
+        partition_dir = os.path.join(output_dir, table_name, f"ingest_date={ingest_date}")
+        path = os.path.join(partition_dir, f"{_partition_name(watermark)}.{format}")
+        os.makedirs(partition_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+
+        print(f"Exportando cambios de '{table_name}' desde {watermark or 'el inicio'}...")
+        last_row = []
+
+        def tracked(chunks):
+            for rows in chunks:
+                last_row[:] = [rows[-1]]
+                yield rows
+
+        chunks = tracked(iter_table_chunks(table, engine, chunk_size, _delta_statement(table, watermark)))
+        writer = _write_parquet if format == 'parquet' else _write_csv
+        rows = writer(table, chunks, tmp_path)
+        if rows == 0:
+            os.remove(tmp_path)
+            print(f"✅ Tabla '{table_name}' sin cambios")
+            return {"table": table_name, "path": None, "rows": 0, "watermark": watermark}
+        os.replace(tmp_path, path)
+
+        last = last_row[0]
+        new_watermark = {"column": "id", "id": last.id}
+        if WATERMARK_COLUMN in table.c and last._mapping[WATERMARK_COLUMN] is not None:
+            new_watermark = {"column": WATERMARK_COLUMN, "value": last._mapping[WATERMARK_COLUMN].isoformat(),
+                             "id": last.id}
+        _save_watermark(output_dir, table_name, new_watermark)
+
+        print(f"✅ Tabla '{table_name}': {rows} filas nuevas o modificadas")
+        print(f"📁 Archivo: {path}")
+        print("-" * 60)
+        return {"table": table_name, "path": path, "rows": rows, "watermark": new_watermark}
+
+    except Exception as e:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"❌ Error exportando tabla '{table_name}': {str(e)}")
+        return None
+
+
+def export_all_tables(db_path='aircraft_data.db', output_dir='exports', format='csv',
+                      chunk_size=DEFAULT_CHUNK_SIZE, max_workers=4, incremental=False):
+    """
+    Exporta todas las tablas de la base de datos en paralelo con un único engine
+
+    Args:
+        incremental: Exportar solo las filas nuevas o modificadas desde la
+            exportación anterior (ver export_table_incremental)
     """
     try:
-        # Conectar a la base de datos
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Obtener lista de todas las tablas
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        
+        engine = get_engine(db_path)
+        tables = inspect(engine).get_table_names()
+
         print(f"🗄️  Base de datos: {db_path}")
         print(f"📊 Tablas encontradas: {len(tables)}")
         print("=" * 60)
-        
-        exported_tables = []
-        
-        for table in tables:
-            table_name = table[0]
-            df = export_table_to_csv(table_name, db_path, output_dir)
-            if df is not None:
-                exported_tables.append(table_name)
-        
-        conn.close()
-        
+
+        export_table = export_table_incremental if incremental else export_table_to_csv
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tables) or 1))) as executor:
+            results = list(executor.map(
+                lambda table_name: export_table(table_name, db_path, output_dir, format=format,
+                                                chunk_size=chunk_size, engine=engine),
+                tables,
+            ))
+        engine.dispose()
+        exported_tables = [result["table"] for result in results if result is not None]
+
         print("=" * 60)
         print(f"🎉 Exportación completada!")
         print(f"✅ Tablas exportadas: {len(exported_tables)}")
         print(f"📁 Directorio de salida: {output_dir}")
-        
+
         return exported_tables
-        
+
     except Exception as e:
         print(f"❌ Error accediendo a la base de datos: {str(e)}")
         return []
 
 def main():
     """Función principal"""
-    print("🔄 EXPORTADOR DE TABLAS SQLITE A CSV")
+    parser = argparse.ArgumentParser(description="Exporta las tablas de aircraft_data.db")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=4, help="Tablas exportadas en paralelo")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Exportar solo las filas nuevas o modificadas desde la exportación anterior")
+    args = parser.parse_args()
+    export_table = export_table_incremental if args.incremental else export_table_to_csv
+
+    print(f"🔄 EXPORTADOR DE TABLAS SQLITE A {args.format.upper()}")
     print("=" * 60)
-    
+
     # Especificar qué exportar
     export_specific = input("¿Exportar solo 'finding_description_tasks'? (s/n): ").lower().strip()
-    
+
     if export_specific in ['s', 'si', 'yes', 'y']:
         # Exportar solo la tabla específica
-        export_table_to_csv('finding_description_tasks')
-        
+        engine = get_engine()
+        export_table('finding_description_tasks', format=args.format, chunk_size=args.chunk_size, engine=engine)
+
         # También exportar finding_work_orders si existe
-        export_table_to_csv('finding_work_orders')
-        
+        export_table('finding_work_orders', format=args.format, chunk_size=args.chunk_size, engine=engine)
+
     else:
         # Exportar todas las tablas
-        export_all_tables()
+        export_all_tables(format=args.format, chunk_size=args.chunk_size, max_workers=args.workers,
+                          incremental=args.incremental)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,181 @@
+import copy
+from functools import lru_cache
+import fastjsonschema
+from sqlalchemy import Boolean
+from models import Taskbar
+
+NULLABLE_STRING = {"type": ["string", "null"]}
+
+# Columnas de Taskbar que no salen del LLM (claves de la carga, texto original y marca de modificación)
+TASKBAR_NON_EXTRACTED_COLUMNS = {'id', 'taskbar_id', 'wo_number', 'raw_description', 'description_hash', 'updated_at'}
+
+# Campo del registro extraído del que sale cada columna de Taskbar (si el nombre no coincide)
+TASKBAR_RECORD_FIELDS = {
+    'item_work_order': 'work_order',
+    'amm_task': 'amm_tasks',
+    'amm_description': 'amm_tasks',
+    'amm_revisions_task': 'amm_revisions',
+    'amm_revisions_code': 'amm_revisions',
+}
+
+# Forma de los campos del registro que no son una cadena
+TASKBAR_FIELD_SCHEMAS = {
+    'part_numbers': {"type": "array", "items": {"type": "string"}},
+    'amm_tasks': {"type": "array", "items": {
+        "type": "object",
+        "properties": {"task": NULLABLE_STRING, "description": NULLABLE_STRING},
+        "required": ["task", "description"],
+        "additionalProperties": False,
+    }},
+    'amm_revisions': {"type": "array", "items": {
+        "type": "object",
+        "properties": {"task": NULLABLE_STRING, "revision": NULLABLE_STRING},
+        "required": ["task", "revision"],
+        "additionalProperties": False,
+    }},
+}
+
+# Campos del prompt de Aer Lingus (obligatorios y adicionales), en el orden del prompt
+AERLINGUS_FIELDS = [
+    'description_id', 'maintenance_type', 'component', 'part_number', 'serial_number', 'position',
+    'action', 'result', 'reference', 'location', 'date', 'finding', 'taskcard', 'finding_related',
+    'task_type', 'failure_description', 'corrective_action', 'engineering_order', 'eo_revision',
+    'task', 'instructions', 'reporting', 'personnel', 'findings', 'additional_notes',
+]
+AERLINGUS_FIELD_SCHEMAS = {
+    'finding_related': {"type": "boolean"},
+    'findings': {"type": "array", "items": {"type": "string"}},
+}
+
+
+def strict_object(properties):
+    """Objeto con todas las propiedades obligatorias y sin propiedades extra (requisito del modo strict)"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def iberia_record_schema():
+    """
+    Esquema de un registro de Iberia generado a partir de las columnas de Taskbar:
+    las columnas booleanas forman el objeto `actions` y el resto se agrupa por el
+    campo del registro del que se obtienen.
+    """
+    properties = {}
+    actions = {}
+    for column in Taskbar.__table__.columns:
+        if column.name in TASKBAR_NON_EXTRACTED_COLUMNS:
+            continue
+        if isinstance(column.type, Boolean):
+            actions[column.name] = {"type": "boolean"}
+            continue
+        field = TASKBAR_RECORD_FIELDS.get(column.name, column.name)
+        properties.setdefault(field, TASKBAR_FIELD_SCHEMAS.get(field, NULLABLE_STRING))
+    properties['actions'] = strict_object(actions)
+    return strict_object(properties)
+
+
+def aerlingus_record_schema():
+    """Esquema de un registro de Aer Lingus a partir de la lista de campos del prompt"""
+    return strict_object({field: AERLINGUS_FIELD_SCHEMAS.get(field, NULLABLE_STRING) for field in AERLINGUS_FIELDS})
+
+
+# Esquema de registro de cada prompt de extracción
+PROMPT_RECORD_SCHEMAS = {
+    'extract_description_fields_iberia.txt': iberia_record_schema,
+    'extract_description_fields_aerlingus_v1.txt': aerlingus_record_schema,
+    'extract_maintenance_fields.txt': aerlingus_record_schema,
+}
+
+
+def record_schema_for_prompt(prompt_template):
+    """Esquema de registro del prompt indicado, o None si el prompt no tiene esquema"""
+    factory = PROMPT_RECORD_SCHEMAS.get(prompt_template)
+    return factory() if factory else None
+
+
+def record_columns(prompt_template, prefix=''):
+    """
+    Columnas que genera pd.json_normalize(sep='_') con los registros del prompt
+    (los objetos anidados se aplanan), en el orden del esquema. Lista vacía si
+    el prompt no tiene esquema.
+    """
+    schema = record_schema_for_prompt(prompt_template)
+    if schema is None:
+        return []
+
+    def flatten(properties, path):
+        for name, prop in properties.items():
+            if prop.get("type") == "object" and "properties" in prop:
+                yield from flatten(prop["properties"], f"{path}{name}_")
+            else:
+                yield f"{path}{name}"
+    return list(flatten(schema["properties"], prefix))
+
+
+def batch_response_format(record_schema, num_items, name="extraction"):
+    """
+    response_format de tipo json_schema para un lote: un objeto con las claves
+    "1".."n" (como pide el prompt de Iberia), cada una con un registro.
+    """
+    keys = [str(i) for i in range(1, num_items + 1)]
+    schema = {
+        "type": "object",
+        "properties": {key: {"$ref": "#/$defs/record"} for key in keys},
+        "required": keys,
+        "additionalProperties": False,
+        "$defs": {"record": record_schema},
+    }
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def _relax(schema):
+    """Quita required/additionalProperties: al validar solo se exige el tipo de los campos presentes"""
+    schema = copy.deepcopy(schema)
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            node.pop("required", None)
+            node.pop("additionalProperties", None)
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return schema
+
+
+@lru_cache(maxsize=None)
+def _compiled_validator(prompt_template):
+    schema = record_schema_for_prompt(prompt_template)
+    if schema is None:
+        return None
+    relaxed = _relax(schema)
+    # Un registro vacío es un fallo de extracción, no un resultado válido
+    relaxed["minProperties"] = 1
+    return fastjsonschema.compile(relaxed)
+
+
+def record_validator(prompt_template):
+    """
+    Devuelve una función registro -> bool que valida con el esquema del prompt
+    (compilado una sola vez con fastjsonschema). Los modelos sin modo strict
+    pueden omitir campos, así que solo se rechazan los registros vacíos o con
+    campos de tipo incorrecto. Sin esquema, solo se rechazan los vacíos.
+    """
+    validate = _compiled_validator(prompt_template)
+
+    def is_valid(record):
+        if not isinstance(record, dict) or not record:
+            return False
+        if validate is None:
+            return True
+        try:
+            validate(record)
+        except fastjsonschema.JsonSchemaException:
+            return False
+        return True
+
+    return is_valid
@@ -1,113 +1,543 @@
+import argparse
 import pandas as pd
 import time
-from sqlalchemy import create_engine, Column, Integer, String, Text, Date, Boolean, ForeignKey
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
-from modules import load_pickle, write_to_pickle
-from modules_ai import parse_descriptions_bulk_batched
+from sqlalchemy import create_engine, event, insert, delete, select, text, inspect, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+from models import Base, Taskbar, WorkOrder, FindingPartNumber, FindingAmmTask
+from modules import description_hash
+from modules_ai import parse_descriptions_bulk_batched, load_prompt, extraction_namespace
+from llm_batch import run_batch_extraction
+from regex_extractor import hybrid_extract
+from semantic_cache import SemanticCache, semantic_extract
+from run_journal import RunJournal
+from excel_compactor import read_findings, DEFAULT_INTERMEDIATE_PATH
+from defect_codes import DefectCodeNormalizer, report_unmapped
 
 from settings import defect_code_dict
 
-# Initialize declarative base
-Base = declarative_base()
-
-class Taskbar(Base):
-    __tablename__ = 'finding_description_tasks'
-    id = Column(Integer, primary_key=True)
-    taskbar_id = Column(String(50), unique=False, nullable=False)
-    wo_number = Column(String(50), nullable=False)
-    taskcard = Column(String(50))
-    item_work_order = Column(String(50))
-    location = Column(String(50))
-    panel_code = Column(String(20))
-    part_numbers = Column(Text)  # Coma separada, no lista JSON
-    amm_task = Column(String(100))  # Primer código de tarea AMM
-    amm_description = Column(Text)  # Primer descripción de tarea AMM
-    amm_revisions_task = Column(String(50))  # Primer código de revisión AMM
-    amm_revisions_code = Column(String(20))  # Primer código de revisión
-    send_to_workshop = Column(Boolean)
-    damage_out_of_limits = Column(Boolean)
-    supply_new_material = Column(Boolean)
-    raw_description = Column(Text)
-    finding = Column(String(255))
-    item = Column(String(50))
-    fin = Column(String(50))
-    serial_number = Column(String(100), nullable=True)
-    repair_reference = Column(String(255), nullable=True)
-
-    work_orders = relationship('WorkOrder', back_populates='taskbar')
-
-class WorkOrder(Base):
-    __tablename__ = 'finding_work_orders'
-    id = Column(Integer, primary_key=True)
-    # Corregir la referencia del ForeignKey al nombre real de la tabla
-    taskbar_id = Column(String(50), ForeignKey('finding_description_tasks.taskbar_id'))
-    wo_number = Column(String(50), nullable=False)
-    ac = Column(String(10))
-    date = Column(Date)
-    ata = Column(String(10))
-    flags = Column(String(50))
-    non_relevant = Column(Boolean)
-    reason = Column(Text)
-    
-    taskbar = relationship('Taskbar', back_populates='work_orders')
+IBERIA_PROMPT = 'extract_description_fields_iberia.txt'
 
 engine = create_engine('sqlite:///aircraft_data.db')
-Base.metadata.create_all(engine)
 
-def get_information_parsed_from_llm(descriptions, batch_size=2):
-    parsed_list = []
-    
-    for i in range(0, len(descriptions), batch_size):
-        batch_descriptions = descriptions[i:i+batch_size]
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL + synchronous=NORMAL: un fsync por checkpoint en lugar de uno por transacción
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+    # SQLite solo aplica las claves foráneas (y su ON DELETE CASCADE) si se activan en cada conexión
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _has_description_key(db_engine):
+    inspector = inspect(db_engine)
+    names = {index['name'] for index in inspector.get_indexes('finding_description_tasks')}
+    names |= {constraint['name'] for constraint in inspector.get_unique_constraints('finding_description_tasks')}
+    return 'uq_finding_description_tasks_key' in names
+
+
+def migrate_description_keys(db_engine):
+    """
+    Prepara una base de datos creada antes de la carga incremental: añade y
+    rellena description_hash, elimina los duplicados de ejecuciones repetidas
+    (se conserva el último) y crea el índice único de la clave. Con el índice
+    ya creado no puede haber duplicados y no se borra nada.
+    """
+    columns = {column['name'] for column in inspect(db_engine).get_columns('finding_description_tasks')}
+    has_key = _has_description_key(db_engine)
+    with db_engine.begin() as connection:
+        if 'description_hash' not in columns:
+            connection.execute(text("ALTER TABLE finding_description_tasks ADD COLUMN description_hash VARCHAR(64)"))
+        rows = connection.execute(text(
+            "SELECT id, raw_description FROM finding_description_tasks WHERE description_hash IS NULL"
+        )).fetchall()
+        if rows:
+            connection.execute(
+                text("UPDATE finding_description_tasks SET description_hash = :hash WHERE id = :id"),
+                [{"id": row_id, "hash": description_hash(raw or "")} for row_id, raw in rows],
+            )
+        if not has_key:
+            connection.execute(text(
+                "DELETE FROM finding_description_tasks WHERE id NOT IN ("
+                " SELECT MAX(id) FROM finding_description_tasks GROUP BY taskbar_id, wo_number, description_hash)"
+            ))
+            # Una W/O puede tener varios hallazgos, cada uno con su orden de trabajo: se conservan las
+            # N más recientes de cada (taskbar_id, wo_number), con N = hallazgos que quedan de la W/O
+            connection.execute(text(
+                "DELETE FROM finding_work_orders WHERE id IN ("
+                " SELECT id FROM ("
+                "  SELECT o.id, ROW_NUMBER() OVER (PARTITION BY o.taskbar_id, o.wo_number ORDER BY o.id DESC) AS recency,"
+                "   (SELECT COUNT(*) FROM finding_description_tasks t"
+                "    WHERE t.taskbar_id = o.taskbar_id AND t.wo_number = o.wo_number) AS findings"
+                "  FROM finding_work_orders o)"
+                " WHERE recency > MAX(findings, 1))"
+            ))
+            connection.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_finding_description_tasks_key"
+                " ON finding_description_tasks (taskbar_id, wo_number, description_hash)"
+            ))
+
+
+def migrate_updated_at(db_engine):
+    """
+    Añade la columna updated_at (marca de la exportación incremental) y su
+    índice (updated_at, id) a las tablas creadas antes de que existiera; las
+    filas existentes toman la fecha de la migración.
+    """
+    for table in (Taskbar.__table__, WorkOrder.__table__):
+        columns = {column['name'] for column in inspect(db_engine).get_columns(table.name)}
+        with db_engine.begin() as connection:
+            if 'updated_at' not in columns:
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN updated_at DATETIME"))
+            connection.execute(text(f"UPDATE {table.name} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+            for index in table.indexes:
+                if 'updated_at' in index.columns:
+                    index.create(connection, checkfirst=True)
+
+
+def _backfill_child_tables(connection):
+    # Las bases de datos anteriores solo tienen los P/N separados por comas y la primera tarea AMM
+    rows = connection.execute(text(
+        "SELECT id, part_numbers, amm_task, amm_description FROM finding_description_tasks ORDER BY id"
+    )).fetchall()
+    part_rows, amm_rows = [], []
+    for finding_id, part_numbers, amm_task, amm_description in rows:
+        values = [value.strip() for value in (part_numbers or "").split(",") if value.strip()]
+        part_rows.extend({'finding_id': finding_id, 'position': position, 'part_number': value}
+                         for position, value in enumerate(values))
+        if amm_task or amm_description:
+            amm_rows.append({'finding_id': finding_id, 'position': 0, 'task': amm_task, 'description': amm_description})
+    if part_rows:
+        connection.execute(insert(FindingPartNumber), part_rows)
+    if amm_rows:
+        connection.execute(insert(FindingAmmTask), amm_rows)
+
+
+def migrate_finding_schema(db_engine):
+    """
+    Revisión del esquema de hallazgos para bases de datos existentes:
+    finding_work_orders se reconstruye con la clave subrogada finding_id (la
+    FK anterior apuntaba a finding_description_tasks.taskbar_id, que no es
+    único), se crean los índices de los modelos y las tablas finding_part_numbers
+    y finding_amm_tasks se rellenan con los valores desnormalizados existentes.
+    """
+    Base.metadata.create_all(db_engine)
+    columns = [column['name'] for column in inspect(db_engine).get_columns('finding_work_orders')]
+    if 'finding_id' not in columns:
+        copied = [column for column in columns if column in WorkOrder.__table__.c]
+        with db_engine.begin() as connection:
+            # SQLite no permite cambiar una FK con ALTER TABLE: se reconstruye la tabla conservando los ids
+            connection.execute(text("ALTER TABLE finding_work_orders RENAME TO finding_work_orders_old"))
+            # Los índices siguen en la tabla renombrada con el mismo nombre (p. ej. el de updated_at)
+            for index in inspect(connection).get_indexes('finding_work_orders_old'):
+                connection.execute(text(f"DROP INDEX {index['name']}"))
+            WorkOrder.__table__.create(connection)
+            # Los hallazgos y las órdenes de trabajo de una W/O se insertaron en el mismo orden:
+            # la k-ésima orden de trabajo de cada (taskbar_id, wo_number) es la del k-ésimo hallazgo
+            ranked = "ROW_NUMBER() OVER (PARTITION BY taskbar_id, wo_number ORDER BY id) AS position"
+            connection.execute(text(
+                f"INSERT INTO finding_work_orders ({', '.join(copied)}, finding_id)"
+                f" SELECT {', '.join(f'o.{column}' for column in copied)},"
+                "  COALESCE(t.id, (SELECT MAX(latest.id) FROM finding_description_tasks latest"
+                "   WHERE latest.taskbar_id = o.taskbar_id AND latest.wo_number = o.wo_number))"
+                f" FROM (SELECT *, {ranked} FROM finding_work_orders_old) o"
+                f" LEFT JOIN (SELECT id, taskbar_id, wo_number, {ranked} FROM finding_description_tasks) t"
+                "  ON t.taskbar_id = o.taskbar_id AND t.wo_number = o.wo_number AND t.position = o.position"
+            ))
+            connection.execute(text("DROP TABLE finding_work_orders_old"))
+            _backfill_child_tables(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db_engine, checkfirst=True)
+
+
+def migrate(db_engine=None):
+    """
+    Crea las tablas que falten y aplica las migraciones pendientes. Se llama
+    explícitamente (process_findings, --migrate): importar el módulo no toca
+    la base de datos.
 
-        batch_results = parse_descriptions_bulk_batched(
-            batch_descriptions,
+    Las bases de datos anteriores tienen una FK a finding_description_tasks.taskbar_id,
+    que no es único: con foreign_keys=ON SQLite rechaza cualquier escritura en esas
+    tablas. Las migraciones se ejecutan con un engine propio sin comprobación de
+    claves foráneas, como recomienda SQLite para reconstruir tablas.
+    """
+    db_engine = db_engine if db_engine is not None else engine
+    in_memory = db_engine.url.database in (None, "", ":memory:")
+    migration_engine = db_engine if in_memory else create_engine(db_engine.url)
+    try:
+        Base.metadata.create_all(migration_engine)
+        migrate_description_keys(migration_engine)
+        migrate_updated_at(migration_engine)
+        migrate_finding_schema(migration_engine)
+    finally:
+        if migration_engine is not db_engine:
+            migration_engine.dispose()
+
+
+def get_information_parsed_from_llm(descriptions, batch_size=20, max_concurrency=4,
+                                    requests_per_minute=None, tokens_per_minute=None,
+                                    max_input_tokens=8000, max_output_tokens=4000,
+                                    regex_first=True, min_completeness=0.85,
+                                    record_ids=None, journal=None, resume=False, stream=False,
+                                    batch_api=False, batch_poll_interval=60, batch_job_name=None,
+                                    semantic_cache=None):
+    """
+    Extrae los campos de las descripciones registrando cada lote completado
+    en el diario de la ejecución (run_journal.RunJournal).
+
+    Args:
+        record_ids: Identificador de cada descripción en el diario (por defecto su posición)
+        journal: RunJournal a usar (por defecto data/iberia/extraction_journal.jsonl)
+        resume: Reanudar la ejecución anterior: los registros ya presentes en el
+            diario no se vuelven a procesar. Si es False el diario se vacía
+        stream: Usar respuestas en streaming: cada registro se escribe en el diario en cuanto
+            se cierra su objeto JSON, sin esperar al resto del lote
+        batch_api: Enviar las descripciones como un trabajo de la Batch API (más barato y sin
+            límites interactivos, con resultados en horas); los resultados se escriben en el diario
+            al descargarse
+        batch_poll_interval: Segundos entre consultas del estado del trabajo batch
+        batch_job_name: Nombre del trabajo batch; si ya se envió uno con ese nombre
+            (ejecución interrumpida durante la espera) se reanuda en lugar de reenviarlo
+        semantic_cache: SemanticCache con hallazgos ya extraídos: las descripciones casi
+            idénticas a uno de ellos reutilizan su extracción (con los identificadores
+            corregidos por regex) en lugar de ir al LLM
+    """
+    record_ids = list(record_ids) if record_ids is not None else list(range(len(descriptions)))
+    journal = journal if journal is not None else RunJournal()
+    if resume:
+        done = journal.load(record_ids)
+        print(f"Reanudando: {len(done)} de {len(record_ids)} registros ya extraídos en {journal.path}")
+    else:
+        journal.reset()
+        done = {}
+
+    todo = [i for i, record_id in enumerate(record_ids) if record_id not in done]
+    todo_descriptions = [descriptions[i] for i in todo]
+
+    def journal_batch(batch_indices, results):
+        journal.append_many({record_ids[todo[i]]: result for i, result in zip(batch_indices, results)})
+
+    def llm_extract(pending_descriptions, on_batch=None):
+        if batch_api:
+            extracted = run_batch_extraction(
+                pending_descriptions,
+                prompt_template=IBERIA_PROMPT,
+                job_name=batch_job_name,
+                batch_size=batch_size,
+                max_input_tokens=max_input_tokens,
+                max_output_tokens=max_output_tokens,
+                poll_interval=batch_poll_interval,
+            )
+            results = [extracted.get(i, {}) for i in range(len(pending_descriptions))]
+            if on_batch:
+                on_batch(list(range(len(results))), results)
+            return results
+        return parse_descriptions_bulk_batched(
+            pending_descriptions,
             batch_size,
-              deepseek=False,
-              prompt_template='prompts/extract_description_fields_iberia.txt'
-              )
-        
-        parsed_list.extend(batch_results)
-        time.sleep(1)
-    write_to_pickle(parsed_list)
-    return parsed_list
-
-
-def process_findings(file_path):
-    df_original = pd.read_excel(file_path, sheet_name='Sheet1')
-    df = df_original.sample(n=100, random_state=42).reset_index(drop=True)
-    df['Reason'] = df['Reason'].map(defect_code_dict)
-    df['Reason'] = df['Reason'].str.lower()
-    df['Description'] = df['Description'].str.lower()
-    Session = sessionmaker(bind=engine)
-    session = Session()
+            deepseek=False,
+            prompt_template=IBERIA_PROMPT,
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_input_tokens=max_input_tokens,
+            max_output_tokens=max_output_tokens,
+            on_batch=None if stream else on_batch,
+            stream=stream,
+            on_record=(lambda index, record: on_batch([index], [record])) if stream and on_batch else None,
+        )
 
-    # Verificar columnas requeridas
-    required_columns = ['taskbar_id',
-                        'Description',
-                        'W/O', 'A/C',
-                        'Date',
-                        'ATA',
-                        'Flags',
-                        'Non-Relevant',
-                        'Reason'
-                    ]
-    
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    if missing_columns:
-        raise ValueError(f"Excel file is missing required columns: {missing_columns}")
+    if semantic_cache is not None:
+        llm_only_extract = llm_extract
+
+        def llm_extract(pending_descriptions, on_batch=None):
+            return semantic_extract(pending_descriptions, llm_only_extract, semantic_cache, on_batch=on_batch)
+
+    if todo:
+        # Primero regex: solo los registros incompletos pasan por el LLM
+        if regex_first:
+            extracted = hybrid_extract(todo_descriptions, llm_extract, min_completeness=min_completeness,
+                                       on_batch=journal_batch)
+        else:
+            extracted = llm_extract(todo_descriptions, on_batch=journal_batch)
+        done.update({record_ids[i]: result for i, result in zip(todo, extracted)})
+    return [done.get(record_id) or {} for record_id in record_ids]
+
+
+def _first_item(values):
+    return values[0] if isinstance(values, list) and values else None
+
+
+def _none_if_missing(series):
+    return series.astype(object).where(series.notna(), None)
+
+
+def _false_if_missing(series):
+    return series.where(series.notna(), False).astype(bool)
+
+
+def _parsed_records(df, parsed_list):
+    return [
+        parsed_list[i] if i < len(parsed_list) and isinstance(parsed_list[i], dict) else {}
+        for i in range(len(df))
+    ]
+
+
+def build_taskbar_rows(df, parsed_list):
+    """
+    Construye por columnas los diccionarios de filas de Taskbar a partir del
+    DataFrame de hallazgos y los resultados de extracción (mismo orden).
+    """
+    parsed = pd.DataFrame.from_records(_parsed_records(df, parsed_list), index=df.index)
+    empty = pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    def column(name):
+        return parsed[name] if name in parsed.columns else empty
+
+    part_numbers = column('part_numbers').map(lambda values: ",".join(values) if isinstance(values, list) else "")
+    first_amm_task = column('amm_tasks').map(_first_item)
+    first_revision = column('amm_revisions').map(_first_item)
+    actions = pd.DataFrame.from_records(
+        [value if isinstance(value, dict) else {} for value in column('actions')], index=df.index
+    )
+
+    def action(name):
+        return _false_if_missing(actions[name]) if name in actions.columns else False
+
+    rows = pd.DataFrame({
+        'taskbar_id': df['taskbar_id'],
+        'wo_number': df['W/O'],
+        'raw_description': df['Description'],
+        'description_hash': df['Description'].fillna("").map(description_hash),
+        'taskcard': column('taskcard'),
+        'item_work_order': column('work_order'),
+        'location': column('location'),
+        'panel_code': column('panel_code'),
+        'part_numbers': part_numbers,
+        'amm_task': first_amm_task.map(lambda task: task.get('task') if isinstance(task, dict) else task),
+        'amm_description': first_amm_task.map(lambda task: task.get('description') if isinstance(task, dict) else None),
+        'amm_revisions_task': first_revision.map(lambda rev: rev.get('task') if isinstance(rev, dict) else None),
+        'amm_revisions_code': first_revision.map(lambda rev: rev.get('revision') if isinstance(rev, dict) else None),
+        'send_to_workshop': action('send_to_workshop'),
+        'damage_out_of_limits': action('damage_out_of_limits'),
+        'supply_new_material': action('supply_new_material'),
+        'finding': column('finding'),
+        'item': column('item'),
+        'fin': column('fin'),
+        'serial_number': column('serial_number'),
+        'repair_reference': column('repair_reference'),
+    }, index=df.index)
+    return rows.apply(_none_if_missing).to_dict(orient='records')
+
+
+def build_work_order_rows(df):
+    """Construye por columnas los diccionarios de filas de WorkOrder"""
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    rows = pd.DataFrame({
+        'taskbar_id': df['taskbar_id'],
+        'wo_number': df['W/O'],
+        'ac': df['A/C'],
+        'date': _none_if_missing(dates.dt.date),
+        'ata': df['ATA'],
+        'flags': df['Flags'],
+        'non_relevant': _false_if_missing(df['Non-Relevant']),
+        'reason': df['Reason'],
+    }, index=df.index)
+    return rows.apply(_none_if_missing).to_dict(orient='records')
 
-    descriptions = df['Description'].tolist()
-    #descriptions = list(map(parsing_regex_fields, descriptions))  # REGEX MODE (NO PERFORMA, MUCHA VARIACIÓN EN EL DATO)
-    ##Procesar en lotes de 50 manteniendo el orden
-    parsed_description_list = []
-    parsed_description_list = get_information_parsed_from_llm(descriptions, batch_size=2)
-    #parsed_list = load_pickle() # Cargar resultados procesados previamente
 
+def _child_items(parsed):
+    """(P/N, [(tarea AMM, descripción)]) de un registro extraído, en su orden"""
+    part_numbers = [str(value) for value in parsed.get('part_numbers') or [] if value]
+    amm_tasks = []
+    for task in parsed.get('amm_tasks') or []:
+        if isinstance(task, dict):
+            if task.get('task') or task.get('description'):
+                amm_tasks.append((task.get('task'), task.get('description')))
+        elif task:
+            amm_tasks.append((task, None))
+    return part_numbers, amm_tasks
+
+
+def build_child_rows(parsed_records, finding_ids):
+    """Filas de finding_part_numbers y finding_amm_tasks de cada hallazgo (mismo orden que finding_ids)"""
+    part_rows, amm_rows = [], []
+    for parsed, finding_id in zip(parsed_records, finding_ids):
+        part_numbers, amm_tasks = _child_items(parsed)
+        part_rows.extend({'finding_id': finding_id, 'position': position, 'part_number': value}
+                         for position, value in enumerate(part_numbers))
+        amm_rows.extend({'finding_id': finding_id, 'position': position, 'task': task, 'description': description}
+                        for position, (task, description) in enumerate(amm_tasks))
+    return part_rows, amm_rows
+
+
+def _insert_rows(connection, table, rows, chunk_size, on_conflict_do_nothing=False):
+    statement = sqlite_insert(table).on_conflict_do_nothing() if on_conflict_do_nothing else insert(table)
+    for i in range(0, len(rows), chunk_size):
+        connection.execute(statement, rows[i:i+chunk_size])
+
+
+def bulk_load_findings(df, parsed_list, db_engine=None, chunk_size=10000):
+    """
+    Inserta Taskbar y WorkOrder con executemany en una sola transacción. Las
+    filas cuya clave (taskbar_id, W/O, hash de la descripción) ya está en la
+    base de datos se omiten (INSERT ... ON CONFLICT DO NOTHING), de modo que
+    repetir la carga no falla ni duplica filas.
+
+    Returns:
+        Número de filas insertadas (Taskbar + WorkOrder)
+    """
+    db_engine = db_engine if db_engine is not None else engine
+    start = time.perf_counter()
+
+    with db_engine.begin() as connection:
+        keys = _finding_keys(df)
+        stored = _stored_finding_ids(connection, keys)
+        new = pd.Series([key not in stored for key in keys.itertuples(index=False, name=None)], index=df.index)
+        parsed_records = [record for record, is_new in zip(_parsed_records(df, parsed_list), new) if is_new]
+        df = df[new]
+        taskbar_rows = build_taskbar_rows(df, parsed_records) if not df.empty else []
+        work_order_rows = build_work_order_rows(df) if not df.empty else []
+
+        _insert_rows(connection, Taskbar, taskbar_rows, chunk_size, on_conflict_do_nothing=True)
+        finding_ids = _finding_ids(connection, df)
+        for row, finding_id in zip(work_order_rows, finding_ids):
+            row['finding_id'] = finding_id
+        _insert_rows(connection, WorkOrder, work_order_rows, chunk_size)
+        # ON CONFLICT DO NOTHING: de una clave repetida en df se queda la primera fila
+        part_rows, amm_rows = build_child_rows(*_unique_findings(parsed_records, finding_ids, keep='first'))
+        _insert_rows(connection, FindingPartNumber, part_rows, chunk_size)
+        _insert_rows(connection, FindingAmmTask, amm_rows, chunk_size)
+
+    elapsed = time.perf_counter() - start
+    total_rows = len(taskbar_rows) + len(work_order_rows)
+    skipped = int((~new).sum())
+    print(f"Insertadas {total_rows} filas en {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} filas/s)"
+          + (f"; {skipped} hallazgos ya cargados omitidos" if skipped else ""))
+    return total_rows
+
+
+def _unique_findings(parsed_records, finding_ids, keep):
+    """
+    Una fila repetida en df es el mismo hallazgo: se conserva una sola (keep='first'
+    o 'last') para que sus P/N y tareas AMM se escriban una vez.
+
+    Returns:
+        (registros, ids de hallazgo) sin repeticiones
+    """
+    unique = ~pd.Series(finding_ids, dtype=object).duplicated(keep=keep).to_numpy()
+    return ([record for record, is_unique in zip(parsed_records, unique) if is_unique],
+            [finding_id for finding_id, is_unique in zip(finding_ids, unique) if is_unique])
+
+
+def _finding_keys(df):
+    return pd.DataFrame({
+        'taskbar_id': df['taskbar_id'].astype(str),
+        'wo_number': df['W/O'].astype(str),
+        'description_hash': df['Description'].fillna("").map(description_hash),
+    }, index=df.index)
+
+
+def _stored_finding_ids(connection, keys, chunk_size=500):
+    """{(taskbar_id, W/O, hash de la descripción): id} de las claves de `keys` presentes en la base de datos"""
+    taskbar_ids = keys['taskbar_id'].unique().tolist()
+    stored = {}
+    # SQLite limita el número de parámetros por consulta
+    for i in range(0, len(taskbar_ids), chunk_size):
+        rows = connection.execute(
+            select(Taskbar.taskbar_id, Taskbar.wo_number, Taskbar.description_hash, Taskbar.id)
+            .where(Taskbar.taskbar_id.in_(taskbar_ids[i:i+chunk_size]))
+        )
+        stored.update({(taskbar_id, wo_number, key_hash): finding_id
+                       for taskbar_id, wo_number, key_hash, finding_id in rows})
+    return stored
+
+
+def _finding_ids(connection, df):
+    """id de Taskbar de cada fila de df (None si la fila no está en la base de datos)"""
+    keys = _finding_keys(df)
+    stored = _stored_finding_ids(connection, keys)
+    return [stored.get(key) for key in keys.itertuples(index=False, name=None)]
+
+
+def find_unchanged_findings(df, db_engine=None, chunk_size=500):
+    """
+    Marca las filas cuya clave (taskbar_id, W/O, hash de la descripción) ya
+    está en la base de datos: su extracción no ha cambiado y no hay que
+    volver a enviarlas al LLM.
+
+    Returns:
+        Serie booleana alineada con df (True = sin cambios)
+    """
+    db_engine = db_engine if db_engine is not None else engine
+    keys = _finding_keys(df)
+    with db_engine.connect() as connection:
+        stored = _stored_finding_ids(connection, keys, chunk_size)
+    return pd.Series(
+        [key in stored for key in keys.itertuples(index=False, name=None)], index=df.index, dtype=bool
+    )
+
+
+def upsert_findings(df, parsed_list, db_engine=None, chunk_size=10000):
+    """
+    Carga incremental e idempotente: INSERT ... ON CONFLICT DO UPDATE sobre la
+    clave (taskbar_id, wo_number, description_hash). La orden de trabajo, los
+    P/N y las tareas AMM de cada hallazgo escrito se vuelven a generar.
+
+    Una descripción modificada entra como un hallazgo nuevo y la versión
+    anterior se conserva: una W/O puede tener varios hallazgos y la clave no
+    indica a cuál de ellos sustituye.
+
+    Returns:
+        Número de filas escritas (Taskbar + WorkOrder)
+    """
+    db_engine = db_engine if db_engine is not None else engine
+    start = time.perf_counter()
+    taskbar_rows = build_taskbar_rows(df, parsed_list)
+    work_order_rows = build_work_order_rows(df)
+
+    stmt = sqlite_insert(Taskbar)
+    key_columns = {'taskbar_id', 'wo_number', 'description_hash'}
+    upsert = stmt.on_conflict_do_update(
+        index_elements=sorted(key_columns),
+        set_={column.name: stmt.excluded[column.name] for column in Taskbar.__table__.columns
+              if column.name != 'id' and column.name not in key_columns},
+    )
+    stale_rows = [delete(table).where(table.finding_id == bindparam('key_finding_id'))
+                  for table in (WorkOrder, FindingPartNumber, FindingAmmTask)]
+
+    with db_engine.begin() as connection:
+        for i in range(0, len(taskbar_rows), chunk_size):
+            connection.execute(upsert, taskbar_rows[i:i+chunk_size])
+        finding_ids = _finding_ids(connection, df)
+        keys = [{'key_finding_id': finding_id} for finding_id in dict.fromkeys(finding_ids)]
+        for i in range(0, len(keys), chunk_size):
+            for statement in stale_rows:
+                connection.execute(statement, keys[i:i+chunk_size])
+        for row, finding_id in zip(work_order_rows, finding_ids):
+            row['finding_id'] = finding_id
+        _insert_rows(connection, WorkOrder, work_order_rows, chunk_size)
+        # ON CONFLICT DO UPDATE: de una clave repetida en df se queda la última fila
+        part_rows, amm_rows = build_child_rows(*_unique_findings(_parsed_records(df, parsed_list), finding_ids,
+                                                                 keep='last'))
+        _insert_rows(connection, FindingPartNumber, part_rows, chunk_size)
+        _insert_rows(connection, FindingAmmTask, amm_rows, chunk_size)
+
+    elapsed = time.perf_counter() - start
+    total_rows = len(taskbar_rows) + len(work_order_rows)
+    print(f"Actualizadas {total_rows} filas en {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} filas/s)")
+    return total_rows
+
+
+def load_findings_row_by_row(df, parsed_description_list, session):
     for index, row in df.iterrows():
         try:
             taskbar_id = row['taskbar_id']
-            taskbar = session.query(Taskbar).filter_by(taskbar_id=taskbar_id).first()
             parsed = parsed_description_list[index] if index < len(parsed_description_list) else {}
 
             # Extraer valores simples de los campos JSON
@@ -134,6 +564,7 @@ def process_findings(file_path):
                 taskbar_id=taskbar_id,
                 wo_number=row.get('W/O'),
                 raw_description=row['Description'],
+                description_hash=description_hash(row['Description'] if pd.notna(row['Description']) else ""),
                 taskcard=parsed.get('taskcard'),
                 item_work_order=parsed.get('work_order'),
                 location=parsed.get('location'),
@@ -152,10 +583,15 @@ def process_findings(file_path):
                 serial_number=parsed.get('serial_number'),
                 repair_reference=parsed.get('repair_reference')
             )
+            part_numbers, amm_task_items = _child_items(parsed)
+            taskbar.part_number_items = [FindingPartNumber(position=position, part_number=value)
+                                         for position, value in enumerate(part_numbers)]
+            taskbar.amm_task_items = [FindingAmmTask(position=position, task=task, description=description)
+                                      for position, (task, description) in enumerate(amm_task_items)]
             session.add(taskbar)
-            session.commit()
-            
+
             work_order = WorkOrder(
+                taskbar=taskbar,
                 taskbar_id=taskbar_id,
                 wo_number=row.get('W/O'),
                 ac=row.get('A/C'),
@@ -166,14 +602,99 @@ def process_findings(file_path):
                 reason=row.get('Reason')
             )
             session.add(work_order)
+            # Hallazgo y orden de trabajo en la misma transacción: un fallo solo descarta esta fila
+            session.commit()
         except KeyError as e:
+            session.rollback()
             print(f"Error processing row {index}: Missing column {e}")
         except Exception as e:
+            # Sin rollback la sesión queda inválida (p. ej. tras un IntegrityError) y fallarían las filas siguientes
+            session.rollback()
             print(f"Error processing row {index}: {str(e)}")
+
+
+def process_findings(file_path, bulk=True, incremental=False, resume=False, stream=False, batch_api=False,
+                     semantic_threshold=None, batch_job_name=None):
+    migrate(engine)
+    # Excel compactado o intermedio columnar de excel_compactor (.parquet / .feather)
+    df_original = read_findings(file_path)
+    df = df_original.sample(n=100, random_state=42).reset_index(drop=True)
+    # Cada código distinto se resuelve una vez (exacto, canónico o aproximado); los no traducidos quedan a NaN
+    df['Reason'], unmapped_reasons = DefectCodeNormalizer(defect_code_dict).normalize(df['Reason'])
+    report_unmapped(unmapped_reasons)
+    df['Reason'] = df['Reason'].str.lower()
+    df['Description'] = df['Description'].str.lower()
+
+    # Verificar columnas requeridas
+    required_columns = ['taskbar_id',
+                        'Description',
+                        'W/O', 'A/C',
+                        'Date',
+                        'ATA',
+                        'Flags',
+                        'Non-Relevant',
+                        'Reason'
+                    ]
     
-    session.commit()
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Excel file is missing required columns: {missing_columns}")
+
+    # Solo las filas nuevas o con la descripción modificada pasan por la extracción; la muestra es fija
+    # (random_state=42), así que sin esta comprobación repetir la carga volvería a pagar el LLM
+    unchanged = find_unchanged_findings(df)
+    print(f"{int(unchanged.sum())} filas ya cargadas, {int((~unchanged).sum())} nuevas o modificadas")
+    df = df[~unchanged].reset_index(drop=True)
+    if df.empty:
+        print("No hay cambios que importar")
+        return
+
+    descriptions = df['Description'].tolist()
+    #descriptions = list(map(parsing_regex_fields, descriptions))  # REGEX MODE (NO PERFORMA, MUCHA VARIACIÓN EN EL DATO)
+    # El diario se indexa por (taskbar_id, W/O, hash de la descripción): una descripción modificada se vuelve a extraer
+    record_ids = _finding_keys(df).agg("|".join, axis=1).tolist()
+    semantic_cache = None
+    if semantic_threshold is not None:
+        semantic_cache = SemanticCache(threshold=semantic_threshold,
+                                       namespace=extraction_namespace(load_prompt(IBERIA_PROMPT), False))
+    parsed_description_list = get_information_parsed_from_llm(descriptions, record_ids=record_ids, resume=resume,
+                                                              stream=stream, batch_api=batch_api,
+                                                              batch_job_name=batch_job_name,
+                                                              semantic_cache=semantic_cache)
+
+    if incremental:
+        upsert_findings(df, parsed_description_list)
+    elif bulk:
+        bulk_load_findings(df, parsed_description_list)
+    else:
+        Session = sessionmaker(bind=engine)
+        session = Session()
+        load_findings_row_by_row(df, parsed_description_list, session)
     print(f"Imported {len(df)} records successfully!")
 
 if __name__ == '__main__':
-    findings_file = "data/iberia/Findings_PP_compactado.xlsx"
-    process_findings(findings_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Carga los hallazgos de Iberia en aircraft_data.db")
+    parser.add_argument("findings_file", nargs="?", default=DEFAULT_INTERMEDIATE_PATH,
+                        help="Excel compactado o intermedio .parquet/.feather de excel_compactor.py")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reanudar la extracción anterior sin repetir los registros del diario")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Procesar solo las filas nuevas o modificadas respecto a la base de datos")
+    parser.add_argument("--stream", action="store_true",
+                        help="Respuestas LLM en streaming: cada registro se guarda en cuanto se recibe")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="Extraer con un trabajo de la Batch API (cargas nocturnas: más barato, resultados en horas)")
+    parser.add_argument("--batch-job", default=None, metavar="NOMBRE",
+                        help="Nombre del trabajo batch: si ya se envió, se reanuda la espera sin reenviarlo")
+    parser.add_argument("--semantic-cache", type=float, nargs="?", const=0.9, default=None, metavar="UMBRAL",
+                        help="Reutilizar la extracción de hallazgos casi idénticos ya procesados "
+                             "(similitud mínima, por defecto 0.9)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Solo crear las tablas y aplicar las migraciones de aircraft_data.db")
+    args = parser.parse_args()
+    if args.migrate:
+        migrate(engine)
+    else:
+        process_findings(args.findings_file, incremental=args.incremental, resume=args.resume, stream=args.stream,
+                         batch_api=args.batch_api, semantic_threshold=args.semantic_cache,
+                         batch_job_name=args.batch_job)
\ No newline at end of file
@@ -0,0 +1,202 @@
+import re
+import json
+
+# Fuera de una cadena solo importan los delimitadores de contenedores y las comillas;
+# dentro de una cadena, el cierre y los escapes. Ambas búsquedas avanzan siempre hacia delante.
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_STRING_END = re.compile(r'["\\]')
+_CONTAINER_START = re.compile(r'[\[{]')
+_KEY_NUMBER = re.compile(r'\d+')
+
+
+class StreamingJSONParser:
+    """
+    Parser incremental de respuestas JSON de un LLM. Devuelve cada elemento
+    en cuanto se cierra su objeto, junto con el índice de la descripción a
+    la que corresponde. Acepta las formas:
+
+    - array: [{...}, {...}]                 -> índice = posición en el array
+    - objeto con claves numéricas: {"1": {...}, "2": {...}} -> índice = clave - 1
+    - un único objeto: {"taskcard": ...}    -> índice 0
+
+    Ignora el texto antes y después del JSON (bloques ```json, explicaciones y
+    bloques <think> de los modelos de razonamiento). Si la respuesta llega
+    truncada, los elementos completos ya se han devuelto. Cada carácter se
+    examina una sola vez (tiempo lineal) y el buffer se recorta tras cada
+    elemento.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._string_start = None
+        self._item_start = None
+        self._top_start = None
+        self._mode = None
+        self._first_key = True
+        self._last_key = None
+        self._count = 0
+        self.done = False
+
+    @property
+    def started(self):
+        return self._mode is not None
+
+    @property
+    def truncated(self):
+        """True si el JSON empezó pero no llegó a cerrarse"""
+        return self.started and not self.done
+
+    def feed(self, chunk):
+        """
+        Añade texto a la respuesta.
+
+        Returns:
+            Lista de (índice, elemento) completados con este fragmento
+        """
+        if self.done or not chunk:
+            return []
+        buf = self._buffer + chunk
+        pos = self._pos
+        items = []
+
+        while True:
+            if self._in_string:
+                match = _STRING_END.search(buf, pos)
+                if match is None:
+                    pos = len(buf)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(buf):
+                        # El carácter escapado aún no ha llegado
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                if len(self._stack) == 1 and self._stack[0] == '{':
+                    self._on_top_level_string(buf[self._string_start + 1:match.start()])
+                continue
+
+            if not self._stack:
+                pos = self._find_start(buf, pos)
+                if pos is None or not self._stack:
+                    pos = len(buf) if pos is None else pos
+                    break
+                continue
+
+            match = _STRUCTURAL.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            char = match.group()
+            index = match.start()
+            pos = match.end()
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in '[{':
+                self._stack.append(char)
+                if len(self._stack) == 2 and self._mode != 'record':
+                    self._item_start = index
+            else:
+                self._stack.pop()
+                if not self._stack:
+                    if self._mode == 'record':
+                        self._emit(items, 0, buf[self._top_start:pos])
+                    self.done = True
+                    break
+                if len(self._stack) == 1 and self._item_start is not None:
+                    self._emit(items, self._item_index(), buf[self._item_start:pos])
+                    self._item_start = None
+
+        self._compact(buf, pos)
+        return items
+
+    def _find_start(self, buf, pos):
+        """Avanza hasta el primer '[' o '{' fuera de un bloque <think>; None si hay que esperar más texto"""
+        while True:
+            match = _CONTAINER_START.search(buf, pos)
+            think = buf.find("<think>", pos)
+            if think != -1 and (match is None or think < match.start()):
+                end = buf.find("</think>", think)
+                if end == -1:
+                    return think
+                pos = end + len("</think>")
+                continue
+            if match is None:
+                # Se conserva el final por si contiene el inicio de "<think>"
+                return max(pos, len(buf) - len("<think>"))
+            self._stack.append(match.group())
+            self._top_start = match.start()
+            self._mode = 'array' if match.group() == '[' else 'keyed'
+            return match.end()
+
+    def _on_top_level_string(self, text):
+        # En un objeto de primer nivel las cadenas de profundidad 1 son las claves
+        if self._mode == 'keyed':
+            if self._first_key and not _KEY_NUMBER.fullmatch(text.strip()):
+                self._mode = 'record'
+            self._first_key = False
+            self._last_key = text
+
+    def _item_index(self):
+        if self._mode == 'keyed' and self._last_key is not None:
+            number = _KEY_NUMBER.search(self._last_key)
+            if number:
+                return int(number.group()) - 1
+        return self._count
+
+    def _emit(self, items, index, text):
+        self._count += 1
+        try:
+            items.append((index, json.loads(text)))
+        except json.JSONDecodeError:
+            # Un elemento mal formado no impide aprovechar el resto
+            print(f"Warning: elemento {index + 1} con JSON inválido: {text[:100]}...")
+
+    def _compact(self, buf, pos):
+        """Descarta el texto ya procesado que ya no hace falta conservar"""
+        if self._mode == 'record' or self.done:
+            self._buffer, self._pos = buf, pos
+            return
+        cut = pos
+        if self._item_start is not None:
+            cut = min(cut, self._item_start)
+        if self._in_string:
+            cut = min(cut, self._string_start)
+        self._buffer = buf[cut:]
+        self._pos = pos - cut
+        if self._item_start is not None:
+            self._item_start -= cut
+        if self._in_string:
+            self._string_start -= cut
+
+
+def iter_json_items(text):
+    """Devuelve los (índice, elemento) completos de una respuesta ya recibida"""
+    return StreamingJSONParser().feed(text or "")
+
+
+def parse_json_items(text, num_items, default=dict):
+    """
+    Parsea una respuesta y coloca cada elemento en la posición de su descripción.
+
+    Args:
+        text: Contenido de la respuesta
+        num_items: Número de descripciones enviadas
+        default: Función que crea el valor de las posiciones sin resultado
+
+    Returns:
+        (lista de longitud num_items, número de elementos encontrados)
+    """
+    results = [default() for _ in range(num_items)]
+    items = iter_json_items(text)
+    for index, item in items:
+        if 0 <= index < num_items and isinstance(item, dict):
+            results[index] = item
+    return results, len(items)
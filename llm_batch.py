@@ -0,0 +1,250 @@
+import os
+import json
+import hashlib
+import time
+from datetime import datetime
+from batch_packing import pack_batches
+from extraction_schemas import record_validator
+from llm_cache import get_default_cache
+from llm_clients import get_provider, backend_models, backend_default_options
+from modules import deduplicate_descriptions
+from modules_ai import (load_prompt, load_template, build_bulk_messages, parse_bulk_response,
+                        structured_response_format, lookup_cached_results, extraction_cache_key,
+                        report_prompt_tokens)
+
+# Los trabajos batch solo existen en Azure OpenAI / OpenAI (OpenRouter no tiene Batch API)
+BATCH_BACKEND = "azure"
+# Azure necesita un deployment de tipo "Global Batch"; por defecto el mismo modelo que en línea
+BATCH_MODEL = os.getenv("OPENAI_BATCH_DEPLOYMENT", backend_models[BATCH_BACKEND])
+BATCH_ENDPOINT = "/chat/completions"
+DEFAULT_BATCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'batch')
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def build_batch_requests(descriptions, prompt_template, batch_size=20, max_input_tokens=None,
+                         max_output_tokens=None, output_tokens_per_item=300, structured_output=True):
+    """
+    Convierte las descripciones en líneas de la Batch API con los mismos prompts
+    multi-descripción que el modo en línea (build_bulk_messages).
+
+    Returns:
+        (lista de peticiones JSONL, {custom_id: índices de las descripciones de la petición})
+    """
+    compiled = load_template(prompt_template)
+    if max_input_tokens or max_output_tokens:
+        batches = pack_batches(descriptions, compiled.text, max_input_tokens=max_input_tokens,
+                               max_output_tokens=max_output_tokens,
+                               output_tokens_per_item=output_tokens_per_item, max_batch_size=batch_size)
+    else:
+        batches = [list(range(i, min(i + batch_size, len(descriptions))))
+                   for i in range(0, len(descriptions), batch_size)]
+
+    options = dict(backend_default_options[BATCH_BACKEND])
+    if max_output_tokens:
+        options["max_tokens"] = max_output_tokens
+    requests, groups = [], {}
+    for number, indices in enumerate(batches):
+        custom_id = f"request-{number}"
+        body = {
+            **options,
+            "model": BATCH_MODEL,
+            "messages": build_bulk_messages(compiled, [descriptions[i] for i in indices]),
+        }
+        response_format = structured_response_format(prompt_template, False, len(indices)) if structured_output else None
+        if response_format:
+            body["response_format"] = response_format
+        requests.append({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body})
+        groups[custom_id] = indices
+    report_prompt_tokens(compiled, [[descriptions[i] for i in indices] for indices in batches])
+    return requests, groups
+
+
+def _manifest_path(job_path):
+    return os.path.splitext(job_path)[0] + ".manifest.json"
+
+
+def _read_manifest(job_path):
+    with open(_manifest_path(job_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(job_path, manifest):
+    with open(_manifest_path(job_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def _job_input_hash(descriptions, record_ids, prompt_template):
+    """Hash de las entradas de un trabajo: solo se reanuda un trabajo enviado con las mismas"""
+    payload = json.dumps([prompt_template, list(descriptions), list(record_ids)], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def prepare_batch_job(descriptions, record_ids=None, prompt_template='extract_description_fields_iberia.txt',
+                      job_name=None, work_dir=DEFAULT_BATCH_DIR, batch_size=20, max_input_tokens=None,
+                      max_output_tokens=None, structured_output=True):
+    """
+    Escribe el archivo JSONL del trabajo y su manifiesto, que relaciona cada
+    custom_id con los ids de registro de sus descripciones (las descripciones
+    repetidas se envían una sola vez y su resultado se reparte al descargar).
+
+    Returns:
+        Ruta del archivo JSONL
+    """
+    record_ids = list(record_ids) if record_ids is not None else list(range(len(descriptions)))
+    unique_descriptions, inverse = deduplicate_descriptions(descriptions)
+    ids_by_unique = [[] for _ in unique_descriptions]
+    for record_id, unique_index in zip(record_ids, inverse):
+        ids_by_unique[unique_index].append(record_id)
+
+    requests, groups = build_batch_requests(unique_descriptions, prompt_template, batch_size=batch_size,
+                                            max_input_tokens=max_input_tokens, max_output_tokens=max_output_tokens,
+                                            structured_output=structured_output)
+    os.makedirs(work_dir, exist_ok=True)
+    job_name = job_name or f"extraction_{datetime.now():%Y%m%d_%H%M%S}"
+    job_path = os.path.join(work_dir, f"{job_name}.jsonl")
+    with open(job_path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    _write_manifest(job_path, {
+        "prompt_template": prompt_template,
+        "input_hash": _job_input_hash(descriptions, record_ids, prompt_template),
+        "descriptions": {custom_id: [unique_descriptions[i] for i in indices] for custom_id, indices in groups.items()},
+        "record_ids": {custom_id: [ids_by_unique[i] for i in indices] for custom_id, indices in groups.items()},
+        "batch_id": None,
+        "collected": False,
+    })
+    print(f"Trabajo batch: {len(descriptions)} descripciones -> {len(unique_descriptions)} únicas "
+          f"en {len(requests)} peticiones ({job_path})")
+    return job_path
+
+
+def submit_batch_job(job_path, completion_window="24h"):
+    """Sube el JSONL y crea el trabajo; el id del batch se guarda en el manifiesto"""
+    client = get_provider(BATCH_BACKEND).client
+    with open(job_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                  completion_window=completion_window)
+    manifest = _read_manifest(job_path)
+    manifest["batch_id"] = batch.id
+    _write_manifest(job_path, manifest)
+    print(f"Trabajo batch enviado: {batch.id}")
+    return batch
+
+
+def wait_for_batch_job(job_path, poll_interval=60, timeout=None):
+    """Consulta el estado del trabajo hasta que termina (completed, failed, expired o cancelled)"""
+    client = get_provider(BATCH_BACKEND).client
+    batch_id = _read_manifest(job_path)["batch_id"]
+    start = time.monotonic()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in BATCH_FINAL_STATUSES:
+            counts = batch.request_counts
+            if counts is not None:
+                print(f"Trabajo batch {batch_id}: {batch.status} "
+                      f"({counts.completed} de {counts.total} peticiones, {counts.failed} fallidas)")
+            return batch
+        if timeout is not None and time.monotonic() - start > timeout:
+            raise TimeoutError(f"El trabajo batch {batch_id} sigue en estado '{batch.status}'")
+        time.sleep(poll_interval)
+
+
+def _download_lines(client, file_id):
+    if not file_id:
+        return []
+    return [json.loads(line) for line in client.files.content(file_id).text.splitlines() if line.strip()]
+
+
+def collect_batch_results(job_path, batch=None, use_cache=True, cache=None):
+    """
+    Descarga la salida del trabajo y la asigna a los ids de registro del manifiesto.
+    Los registros que no superan la validación del esquema o cuya petición falló
+    no se incluyen (ni se guardan en la caché), para procesarlos más tarde. El
+    manifiesto queda marcado como descargado y el trabajo ya no se reanuda.
+
+    Returns:
+        {id de registro: resultado}
+    """
+    client = get_provider(BATCH_BACKEND).client
+    manifest = _read_manifest(job_path)
+    if batch is None:
+        batch = client.batches.retrieve(manifest["batch_id"])
+    is_valid = record_validator(manifest["prompt_template"])
+    template = load_prompt(manifest["prompt_template"])
+    if use_cache and cache is None:
+        cache = get_default_cache()
+    elif not use_cache:
+        cache = None
+
+    results = {}
+    failed = 0
+    for line in _download_lines(client, batch.output_file_id) + _download_lines(client, batch.error_file_id):
+        custom_id = line.get("custom_id")
+        response = line.get("response") or {}
+        if custom_id not in manifest["record_ids"]:
+            continue
+        if response.get("status_code") != 200:
+            failed += 1
+            continue
+        descriptions = manifest["descriptions"][custom_id]
+        content = response["body"]["choices"][0]["message"]["content"]
+        parsed = [result if is_valid(result) else {} for result in parse_bulk_response(content, len(descriptions))]
+        for ids, result in zip(manifest["record_ids"][custom_id], parsed):
+            for record_id in ids:
+                if result:
+                    results[record_id] = result
+        if cache is not None:
+            cache.set_many({extraction_cache_key(description, template, False): result
+                            for description, result in zip(descriptions, parsed)})
+    if failed:
+        print(f"Warning: {failed} peticiones del trabajo batch fallaron")
+    manifest["collected"] = True
+    _write_manifest(job_path, manifest)
+    return results
+
+
+def run_batch_extraction(descriptions, record_ids=None, prompt_template='extract_description_fields_iberia.txt',
+                         job_name=None, work_dir=DEFAULT_BATCH_DIR, batch_size=20, max_input_tokens=None,
+                         max_output_tokens=None, structured_output=True, completion_window="24h",
+                         poll_interval=60, timeout=None, use_cache=True, cache=None):
+    """
+    Extracción completa en modo batch: prepara el JSONL, lo envía, espera a que
+    termine y devuelve {id de registro: resultado}. Las descripciones que ya
+    están en la caché no se envían. Si el manifiesto de job_name tiene un
+    batch_id sin descargar y las mismas descripciones pendientes (ejecución
+    interrumpida durante la espera), no se vuelve a enviar: se espera a ese
+    trabajo y se descargan sus resultados. Con otras entradas, o si ya se
+    descargó, se prepara y envía un trabajo nuevo con ese nombre.
+    """
+    record_ids = list(record_ids) if record_ids is not None else list(range(len(descriptions)))
+    if use_cache and cache is None:
+        cache = get_default_cache()
+    elif not use_cache:
+        cache = None
+    cached, _, pending = lookup_cached_results(descriptions, load_prompt(prompt_template), False, cache)
+    results = {record_ids[i]: result for i, result in enumerate(cached) if result is not None}
+    if cache is not None:
+        print(f"Caché LLM: {len(results)} de {len(descriptions)} descripciones ya procesadas")
+    if not pending:
+        return results
+
+    pending_descriptions = [descriptions[i] for i in pending]
+    pending_ids = [record_ids[i] for i in pending]
+    job_path = os.path.join(work_dir, f"{job_name}.jsonl") if job_name else None
+    batch_id = None
+    if job_path and os.path.exists(_manifest_path(job_path)):
+        manifest = _read_manifest(job_path)
+        if (not manifest.get("collected")
+                and manifest.get("input_hash") == _job_input_hash(pending_descriptions, pending_ids, prompt_template)):
+            batch_id = manifest.get("batch_id")
+    if batch_id:
+        print(f"Reanudando el trabajo batch {batch_id} ({job_path})")
+    else:
+        job_path = prepare_batch_job(pending_descriptions, pending_ids, prompt_template, job_name=job_name,
+                                     work_dir=work_dir, batch_size=batch_size, max_input_tokens=max_input_tokens,
+                                     max_output_tokens=max_output_tokens, structured_output=structured_output)
+        submit_batch_job(job_path, completion_window=completion_window)
+    batch = wait_for_batch_job(job_path, poll_interval=poll_interval, timeout=timeout)
+    results.update(collect_batch_results(job_path, batch, cache=cache, use_cache=cache is not None))
+    return results
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from modules import normalize_description
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_cache.sqlite')
+
+
+class ExtractionCache:
+    """
+    Caché persistente en SQLite de resultados de extracción LLM, direccionada
+    por contenido: la clave es el hash de (descripción normalizada, contenido
+    del template de prompt, modelo, temperatura).
+
+    Args:
+        path: Ruta del archivo SQLite
+        max_entries: Número máximo de entradas (se eliminan las menos usadas). None = sin límite
+        max_age_days: Antigüedad máxima de una entrada en días. None = sin límite
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=None, max_age_days=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_cache ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_last_access ON extraction_cache (last_access)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(description, prompt_template, model, temperature):
+        payload = json.dumps(
+            [normalize_description(description), prompt_template, model, temperature],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def make_namespace(prompt_template, model, temperature):
+        """Hash de la configuración de extracción (prompt, modelo, temperatura) sin la descripción"""
+        payload = json.dumps([prompt_template, model, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """Devuelve {clave: resultado} para las claves presentes y actualiza los contadores"""
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            # SQLite limita el número de parámetros por consulta
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i:i+500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, result, created_at FROM extraction_cache WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, result, created_at in rows:
+                    if self._expired(created_at, now):
+                        continue
+                    found[key] = json.loads(result)
+            if found:
+                self._conn.executemany(
+                    "UPDATE extraction_cache SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        self.hits += sum(1 for key in keys if key in found)
+        self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def set_many(self, items):
+        """Guarda {clave: resultado}. Los resultados vacíos (fallos de parseo) no se guardan"""
+        now = time.time()
+        rows = [(key, json.dumps(result, ensure_ascii=False), now, now)
+                for key, result in items.items() if result]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO extraction_cache (key, result, created_at, last_access) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        if self.max_entries is not None:
+            self.evict()
+
+    def _expired(self, created_at, now):
+        return self.max_age_days is not None and now - created_at > self.max_age_days * 86400
+
+    def evict(self):
+        """Aplica las políticas de antigüedad y tamaño; devuelve el número de entradas eliminadas"""
+        removed = 0
+        with self._lock:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._conn.execute(
+                    "DELETE FROM extraction_cache WHERE created_at < ?", (cutoff,)
+                ).rowcount
+            if self.max_entries is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM extraction_cache WHERE key IN ("
+                    " SELECT key FROM extraction_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """Caché compartida del proceso en data/llm_cache.sqlite"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ExtractionCache()
+    return _default_cache
@@ -0,0 +1,232 @@
+import os
+import asyncio
+import threading
+import weakref
+import httpx
+from openai import OpenAI, AsyncOpenAI, AzureOpenAI, AsyncAzureOpenAI
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Límites del pool HTTP compartido (configurables por variables de entorno o configure_pool)
+pool_settings = {
+    "max_connections": int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20")),
+    "max_keepalive_connections": int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10")),
+    "keepalive_expiry": float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30")),
+    "timeout": float(os.getenv("LLM_TIMEOUT", "120")),
+}
+
+# Modelo y opciones por defecto de cada backend
+backend_models = {
+    "azure": "gpt-4o-mini",
+    "openrouter": "deepseek/deepseek-r1-0528:free",
+}
+backend_default_options = {
+    "azure": {"temperature": 0, "max_tokens": 4000},
+    "openrouter": {
+        "extra_headers": {
+            "HTTP-Referer": "<YOUR_SITE_URL>",  # Optional. Site URL for rankings on openrouter.ai.
+            "X-Title": "<YOUR_SITE_NAME>",  # Optional. Site title for rankings on openrouter.ai.
+        },
+        "extra_body": {},
+    },
+}
+# Backends que admiten response_format de tipo json_schema (salidas estructuradas).
+# Azure lo admite con gpt-4o-mini desde la API 2024-08-01-preview (ver
+# structured_outputs_supported); el modelo gratuito de OpenRouter no garantiza el
+# esquema, así que su salida solo se valida.
+backend_structured_outputs = {
+    "azure": True,
+    "openrouter": False,
+}
+# Primera versión de la API de Azure OpenAI con response_format json_schema
+AZURE_STRUCTURED_OUTPUTS_API_VERSION = "2024-08-01"
+
+
+def structured_outputs_supported(backend):
+    """
+    True si se puede enviar response_format json_schema al backend. En Azure
+    depende además de OPENAI_API_VERSION: las versiones anteriores a
+    2024-08-01-preview responden 400 a ese response_format.
+    """
+    if not backend_structured_outputs.get(backend):
+        return False
+    if backend == "azure":
+        # Las versiones son fechas AAAA-MM-DD (con sufijo -preview opcional): se comparan como texto
+        return (os.getenv("OPENAI_API_VERSION") or "")[:10] >= AZURE_STRUCTURED_OUTPUTS_API_VERSION
+    return True
+
+_lock = threading.Lock()
+_http_client = None
+_providers = {}
+# Los clientes async no pueden compartir conexiones entre event loops: uno por loop
+_async_http_clients = weakref.WeakKeyDictionary()
+
+
+def configure_pool(max_connections=None, max_keepalive_connections=None, keepalive_expiry=None, timeout=None):
+    """
+    Cambia los límites del pool HTTP. Los clientes ya creados se descartan
+    y se vuelven a crear con los nuevos límites en el siguiente uso.
+    """
+    for key, value in (("max_connections", max_connections),
+                       ("max_keepalive_connections", max_keepalive_connections),
+                       ("keepalive_expiry", keepalive_expiry),
+                       ("timeout", timeout)):
+        if value is not None:
+            pool_settings[key] = value
+    reset_providers()
+
+
+def reset_providers():
+    """Descarta los clientes creados (p. ej. tras cambiar variables de entorno)"""
+    global _http_client
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+        _providers.clear()
+        _async_http_clients.clear()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=pool_settings["max_connections"],
+        max_keepalive_connections=pool_settings["max_keepalive_connections"],
+        keepalive_expiry=pool_settings["keepalive_expiry"],
+    )
+
+
+def _shared_http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits(), timeout=pool_settings["timeout"])
+    return _http_client
+
+
+def _shared_async_http_client():
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(limits=_limits(), timeout=pool_settings["timeout"])
+        _async_http_clients[loop] = client
+    return client
+
+
+class LLMProvider:
+    """
+    Backend de chat completions con cliente reutilizable.
+
+    Args:
+        name: Nombre del backend ('azure' o 'openrouter')
+        model: Modelo o deployment a usar
+        client_factory: Función (http_client, async) -> cliente OpenAI/AzureOpenAI
+        default_options: Parámetros por defecto de cada petición (temperature, max_tokens...)
+    """
+
+    def __init__(self, name, model, client_factory, default_options=None):
+        self.name = name
+        self.model = model
+        self._client_factory = client_factory
+        self.default_options = default_options or {}
+        self.client = client_factory(_shared_http_client(), False)
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._client_factory(_shared_async_http_client(), True)
+            self._async_clients[loop] = client
+        return client
+
+    def _request_options(self, messages, options):
+        request = dict(self.default_options)
+        request.update({key: value for key, value in options.items() if value is not None})
+        request["model"] = self.model
+        request["messages"] = messages
+        return request
+
+    def chat(self, messages, **options):
+        """Petición síncrona; devuelve el objeto ChatCompletion completo"""
+        return self.client.chat.completions.create(**self._request_options(messages, options))
+
+    async def achat(self, messages, **options):
+        """Petición asíncrona; devuelve el objeto ChatCompletion completo"""
+        return await self.async_client.chat.completions.create(**self._request_options(messages, options))
+
+    def stream_chat(self, messages, **options):
+        """Petición síncrona en streaming; devuelve un iterable de ChatCompletionChunk"""
+        return self.client.chat.completions.create(stream=True, **self._request_options(messages, options))
+
+    async def astream_chat(self, messages, **options):
+        """Petición asíncrona en streaming; devuelve un iterable asíncrono de ChatCompletionChunk"""
+        return await self.async_client.chat.completions.create(stream=True, **self._request_options(messages, options))
+
+    def complete(self, prompt, **options):
+        completion = self.chat([{"role": "user", "content": f"{prompt}"}], **options)
+        return completion.choices[0].message.content
+
+    async def acomplete(self, prompt, **options):
+        completion = await self.achat([{"role": "user", "content": f"{prompt}"}], **options)
+        return completion.choices[0].message.content
+
+
+# Los reintentos los gestiona llm_resilience (backoff, concurrencia adaptativa y failover),
+# por eso los clientes se crean con max_retries=0
+def _create_azure_provider():
+    endpoint = os.getenv("OPENAI_API_ENDPOINT")
+    api_key = os.getenv("OPENAI_API_KEY")
+    api_version = os.getenv("OPENAI_API_VERSION")
+    if not endpoint or not api_key:
+        raise ValueError("OPENAI_API_ENDPOINT/OPENAI_API_KEY no encontradas. Configura las variables de entorno.")
+
+    def factory(http_client, is_async):
+        client_class = AsyncAzureOpenAI if is_async else AzureOpenAI
+        return client_class(
+            azure_endpoint=endpoint,
+            api_version=api_version,
+            api_key=api_key,
+            http_client=http_client,
+            max_retries=0,
+        )
+
+    return LLMProvider("azure", backend_models["azure"], factory,
+                       default_options=backend_default_options["azure"])
+
+
+def _create_openrouter_provider():
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        raise ValueError("OPENROUTER_API_KEY no encontrada. Configura la variable de entorno.")
+    base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+    def factory(http_client, is_async):
+        client_class = AsyncOpenAI if is_async else OpenAI
+        return client_class(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+
+    return LLMProvider("openrouter", backend_models["openrouter"], factory,
+                       default_options=backend_default_options["openrouter"])
+
+
+_provider_factories = {
+    "azure": _create_azure_provider,
+    "openrouter": _create_openrouter_provider,
+}
+
+
+def get_provider(backend):
+    """
+    Devuelve el proveedor del backend indicado, creándolo en el primer uso.
+    Todas las llamadas del proceso comparten el mismo cliente y pool HTTP.
+    """
+    if backend not in _provider_factories:
+        raise ValueError(f"Backend LLM desconocido: {backend}")
+    provider = _providers.get(backend)
+    if provider is None:
+        with _lock:
+            provider = _providers.get(backend)
+            if provider is None:
+                provider = _provider_factories[backend]()
+                _providers[backend] = provider
+    return provider
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenBucketRateLimiter:
+    """
+    Limitador de tasa tipo token bucket con dos cubos independientes:
+    peticiones por minuto y tokens por minuto. None desactiva el límite.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_level = float(requests_per_minute or 0)
+        self._token_level = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_level = min(
+                float(self.requests_per_minute),
+                self._request_level + elapsed * self.requests_per_minute / 60.0,
+            )
+        if self.tokens_per_minute:
+            self._token_level = min(
+                float(self.tokens_per_minute),
+                self._token_level + elapsed * self.tokens_per_minute / 60.0,
+            )
+
+    def _wait_time(self, tokens):
+        wait = 0.0
+        if self.requests_per_minute and self._request_level < 1:
+            wait = max(wait, (1 - self._request_level) * 60.0 / self.requests_per_minute)
+        if self.tokens_per_minute and self._token_level < tokens:
+            wait = max(wait, (tokens - self._token_level) * 60.0 / self.tokens_per_minute)
+        return wait
+
+    async def acquire(self, tokens=0):
+        """Espera hasta que haya capacidad para una petición de `tokens` tokens"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Una petición mayor que el cubo completo nunca cabría: se limita a su capacidad
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests_per_minute:
+                self._request_level -= 1
+            if self.tokens_per_minute:
+                self._token_level -= tokens
+
+
+async def dispatch_async(items, worker, max_concurrency=4, rate_limiter=None, cost=None, on_result=None):
+    """
+    Ejecuta `worker(item)` para cada elemento con como máximo `max_concurrency`
+    peticiones en vuelo y devuelve los resultados en el orden de entrada.
+
+    Args:
+        items: Lista de elementos a procesar (p. ej. prompts o lotes)
+        worker: Corrutina que recibe un elemento y devuelve su resultado
+        max_concurrency: Número máximo de peticiones simultáneas
+        rate_limiter: TokenBucketRateLimiter opcional
+        cost: Función opcional item -> tokens estimados para el limitador
+        on_result: Callback opcional (indice, resultado) llamado al completar cada elemento
+    """
+    results = [None] * len(items)
+    pending = iter(enumerate(items))
+
+    async def run_worker():
+        # Todos los workers comparten el mismo iterador; next() es atómico dentro del event loop
+        for index, item in pending:
+            if rate_limiter is not None:
+                await rate_limiter.acquire(cost(item) if cost else 0)
+            result = await worker(item)
+            results[index] = result
+            if on_result is not None:
+                on_result(index, result)
+
+    workers = [run_worker() for _ in range(max(1, min(max_concurrency, len(items))))]
+    await asyncio.gather(*workers)
+    return results
+
+
+def dispatch(items, worker, max_concurrency=4, requests_per_minute=None, tokens_per_minute=None, cost=None, on_result=None):
+    """
+    Versión síncrona de dispatch_async para los pipelines de Iberia y Aerlingus.
+    Si ya hay un event loop en marcha en este hilo (Jupyter, código asíncrono),
+    asyncio.run no puede usarse en él: el despacho se ejecuta con su propio
+    event loop en un hilo aparte y esta llamada espera a que termine.
+    """
+    rate_limiter = None
+    if requests_per_minute or tokens_per_minute:
+        rate_limiter = TokenBucketRateLimiter(requests_per_minute, tokens_per_minute)
+    coroutine = dispatch_async(
+        items,
+        worker,
+        max_concurrency=max_concurrency,
+        rate_limiter=rate_limiter,
+        cost=cost,
+        on_result=on_result,
+    )
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
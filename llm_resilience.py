@@ -0,0 +1,329 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+import openai
+from llm_clients import get_provider, structured_outputs_supported, pool_settings
+
+# Errores HTTP transitorios: se reintentan con backoff
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Backend al que se pasa cada backend cuando su circuito está abierto
+failover_backends = {
+    "azure": ["openrouter"],
+    "openrouter": ["azure"],
+}
+
+
+class LLMUnavailableError(RuntimeError):
+    """Ningún backend ha respondido tras los reintentos o todos tienen el circuito abierto"""
+
+
+def _mark_served(result, backend):
+    # Atributo privado: no forma parte del model_dump() del ChatCompletion
+    try:
+        result._served_backend = backend
+    except AttributeError:
+        pass
+    return result
+
+
+def served_backend(result, default=None):
+    """Backend que respondió la petición (el alternativo si hubo failover), o default si no se conoce"""
+    return getattr(result, "_served_backend", default)
+
+
+def error_status(error):
+    return getattr(error, "status_code", None)
+
+
+def is_rate_limited(error):
+    return error_status(error) == 429
+
+
+def is_retryable(error):
+    """Timeouts, errores de conexión, 429 y 5xx; los 4xx de configuración (401, 400...) no se reintentan"""
+    return isinstance(error, openai.APIConnectionError) or error_status(error) in RETRYABLE_STATUS
+
+
+def retry_after_seconds(error):
+    """Segundos indicados por las cabeceras retry-after-ms o Retry-After (segundos o fecha HTTP)"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+    except ValueError:
+        pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Backoff exponencial con jitter completo. Si el servidor indica Retry-After
+    se espera ese tiempo (con un jitter pequeño para no volver todos a la vez).
+    """
+
+    def __init__(self, max_retries=5, base_delay=1.0, max_delay=60.0, max_retry_after=300.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt, error=None):
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after) + random.uniform(0, self.base_delay / 10)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class AdaptiveConcurrency:
+    """
+    Límite de peticiones en vuelo con control AIMD: cada respuesta correcta
+    suma 1/límite (un punto por ventana completa) y cada 429 multiplica el
+    límite por `decrease`. Los 429 que llegan durante `cooldown` segundos tras
+    una reducción pertenecen a la misma ráfaga y no vuelven a reducirlo.
+    """
+
+    def __init__(self, initial=None, minimum=1, maximum=None, decrease=0.5, cooldown=1.0):
+        self.maximum = maximum or pool_settings["max_connections"]
+        self.minimum = minimum
+        self.limit = float(initial or self.maximum)
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        # Las primitivas de asyncio pertenecen a un event loop: una condición por loop
+        self._conditions = weakref.WeakKeyDictionary()
+
+    def _condition(self):
+        loop = asyncio.get_running_loop()
+        condition = self._conditions.get(loop)
+        if condition is None:
+            condition = asyncio.Condition()
+            self._conditions[loop] = condition
+        return condition
+
+    async def acquire(self):
+        condition = self._condition()
+        async with condition:
+            while self.in_flight >= max(self.minimum, int(self.limit)):
+                await condition.wait()
+            self.in_flight += 1
+
+    async def release(self):
+        condition = self._condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * self.decrease)
+
+
+class CircuitBreaker:
+    """
+    Circuito por backend: se abre tras `failure_threshold` fallos seguidos y,
+    pasados `reset_timeout` segundos, deja pasar peticiones de prueba
+    (semiabierto). Un acierto lo cierra; un fallo en semiabierto lo reabre.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            return self.state != "open"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class ResilientBackends:
+    """
+    Envía las peticiones de chat a un backend con reintentos, concurrencia
+    adaptativa y circuit breaker; si el circuito del backend pedido está
+    abierto o se agotan sus reintentos, pasa al backend de failover_backends.
+
+    Args:
+        retry_policy: RetryPolicy de los reintentos de cada backend
+        failure_threshold: Fallos seguidos que abren el circuito de un backend
+        reset_timeout: Segundos con el circuito abierto antes de probar de nuevo
+        failover: Pasar al backend alternativo cuando el pedido no está disponible
+    """
+
+    def __init__(self, retry_policy=None, failure_threshold=5, reset_timeout=30.0, failover=True):
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failover = failover
+        self.breakers = {}
+        self.concurrency = {}
+
+    def breaker(self, backend):
+        if backend not in self.breakers:
+            self.breakers[backend] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self.breakers[backend]
+
+    def limiter(self, backend):
+        if backend not in self.concurrency:
+            self.concurrency[backend] = AdaptiveConcurrency()
+        return self.concurrency[backend]
+
+    def _candidates(self, backend):
+        return [backend] + (failover_backends.get(backend, []) if self.failover else [])
+
+    def _provider(self, backend, candidate):
+        try:
+            return get_provider(candidate)
+        except ValueError:
+            # El backend alternativo puede no estar configurado (sin claves)
+            if candidate == backend:
+                raise
+            return None
+
+    @staticmethod
+    def _options(candidate, options):
+        # El esquema JSON solo se envía a los backends que admiten salidas estructuradas
+        if options.get("response_format") and not structured_outputs_supported(candidate):
+            return {key: value for key, value in options.items() if key != "response_format"}
+        return options
+
+    def _on_error(self, candidate, error, attempt):
+        if not is_retryable(error):
+            raise error
+        self.breaker(candidate).record_failure()
+        if is_rate_limited(error):
+            self.limiter(candidate).on_throttle()
+        print(f"Warning: {candidate} falló ({error_status(error) or type(error).__name__}), intento {attempt + 1}")
+
+    @staticmethod
+    def _unavailable(backend):
+        return LLMUnavailableError(f"Backend LLM no disponible: {backend} (ni sus alternativos)")
+
+    async def acall(self, backend, method, messages, **options):
+        """Llama a provider.<method>(messages, **options) de forma asíncrona (achat o astream_chat)"""
+        last_error = None
+        for candidate in self._candidates(backend):
+            provider = self._provider(backend, candidate)
+            if provider is None:
+                continue
+            breaker, limiter = self.breaker(candidate), self.limiter(candidate)
+            attempt = 0
+            while breaker.allow_request():
+                await limiter.acquire()
+                try:
+                    result = await getattr(provider, method)(messages, **self._options(candidate, options))
+                except Exception as error:
+                    self._on_error(candidate, error, attempt)
+                    last_error = error
+                else:
+                    breaker.record_success()
+                    limiter.on_success()
+                    return _mark_served(result, candidate)
+                finally:
+                    await limiter.release()
+                if attempt >= self.retry_policy.max_retries or not breaker.allow_request():
+                    break
+                await asyncio.sleep(self.retry_policy.delay(attempt, last_error))
+                attempt += 1
+            print(f"Warning: backend {candidate} no disponible")
+        raise self._unavailable(backend) from last_error
+
+    def call(self, backend, method, messages, **options):
+        """Versión síncrona de acall (chat o stream_chat)"""
+        last_error = None
+        for candidate in self._candidates(backend):
+            provider = self._provider(backend, candidate)
+            if provider is None:
+                continue
+            breaker = self.breaker(candidate)
+            attempt = 0
+            while breaker.allow_request():
+                try:
+                    result = getattr(provider, method)(messages, **self._options(candidate, options))
+                except Exception as error:
+                    self._on_error(candidate, error, attempt)
+                    last_error = error
+                else:
+                    breaker.record_success()
+                    return _mark_served(result, candidate)
+                if attempt >= self.retry_policy.max_retries or not breaker.allow_request():
+                    break
+                time.sleep(self.retry_policy.delay(attempt, last_error))
+                attempt += 1
+            print(f"Warning: backend {candidate} no disponible")
+        raise self._unavailable(backend) from last_error
+
+
+_backends = ResilientBackends()
+
+
+def configure_resilience(max_retries=5, base_delay=1.0, max_delay=60.0, failure_threshold=5,
+                         reset_timeout=30.0, failover=True):
+    """Sustituye la configuración de reintentos y circuitos (se descartan los estados anteriores)"""
+    global _backends
+    _backends = ResilientBackends(
+        RetryPolicy(max_retries=max_retries, base_delay=base_delay, max_delay=max_delay),
+        failure_threshold=failure_threshold,
+        reset_timeout=reset_timeout,
+        failover=failover,
+    )
+    return _backends
+
+
+def get_backends():
+    return _backends
+
+
+def chat(backend, messages, **options):
+    return _backends.call(backend, "chat", messages, **options)
+
+
+async def achat(backend, messages, **options):
+    return await _backends.acall(backend, "achat", messages, **options)
+
+
+def stream_chat(backend, messages, **options):
+    return _backends.call(backend, "stream_chat", messages, **options)
+
+
+async def astream_chat(backend, messages, **options):
+    return await _backends.acall(backend, "astream_chat", messages, **options)
@@ -0,0 +1,95 @@
+import datetime
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.orm import declarative_base, relationship
+
+# Initialize declarative base
+Base = declarative_base()
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class Taskbar(Base):
+    __tablename__ = 'finding_description_tasks'
+    # Clave de la carga incremental: un registro por taskbar, orden de trabajo y descripción
+    __table_args__ = (
+        UniqueConstraint('taskbar_id', 'wo_number', 'description_hash', name='uq_finding_description_tasks_key'),
+        # Orden y filtro de la exportación incremental (updated_at, id)
+        Index('ix_finding_description_tasks_updated_at', 'updated_at', 'id'),
+    )
+    id = Column(Integer, primary_key=True)
+    taskbar_id = Column(String(50), unique=False, nullable=False)
+    wo_number = Column(String(50), nullable=False)
+    taskcard = Column(String(50))
+    item_work_order = Column(String(50))
+    location = Column(String(50))
+    panel_code = Column(String(20))
+    part_numbers = Column(Text)  # Coma separada, no lista JSON (lista completa en finding_part_numbers)
+    amm_task = Column(String(100))  # Primer código de tarea AMM (todas en finding_amm_tasks)
+    amm_description = Column(Text)  # Primer descripción de tarea AMM
+    amm_revisions_task = Column(String(50))  # Primer código de revisión AMM
+    amm_revisions_code = Column(String(20))  # Primer código de revisión
+    send_to_workshop = Column(Boolean)
+    damage_out_of_limits = Column(Boolean)
+    supply_new_material = Column(Boolean)
+    raw_description = Column(Text)
+    description_hash = Column(String(64))  # sha256 de la descripción normalizada
+    finding = Column(String(255))
+    item = Column(String(50))
+    fin = Column(String(50))
+    serial_number = Column(String(100), nullable=True)
+    repair_reference = Column(String(255), nullable=True)
+    # Marca de modificación para la exportación incremental (también en los upserts)
+    updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow)
+
+    work_orders = relationship('WorkOrder', back_populates='taskbar')
+    part_number_items = relationship('FindingPartNumber', order_by='FindingPartNumber.position',
+                                     cascade='all, delete-orphan')
+    amm_task_items = relationship('FindingAmmTask', order_by='FindingAmmTask.position',
+                                  cascade='all, delete-orphan')
+
+class WorkOrder(Base):
+    __tablename__ = 'finding_work_orders'
+    # Filtros analíticos habituales (ATA, avión y motivo por rango de fechas) y búsqueda por clave de carga
+    __table_args__ = (
+        Index('ix_finding_work_orders_taskbar_wo', 'taskbar_id', 'wo_number'),
+        Index('ix_finding_work_orders_ata_date', 'ata', 'date'),
+        Index('ix_finding_work_orders_ac_date', 'ac', 'date'),
+        Index('ix_finding_work_orders_reason_date', 'reason', 'date'),
+        Index('ix_finding_work_orders_date', 'date'),
+        Index('ix_finding_work_orders_updated_at', 'updated_at', 'id'),
+    )
+    id = Column(Integer, primary_key=True)
+    # Clave subrogada del hallazgo: taskbar_id no es único en finding_description_tasks
+    finding_id = Column(Integer, ForeignKey('finding_description_tasks.id', ondelete='CASCADE'), index=True)
+    taskbar_id = Column(String(50))
+    wo_number = Column(String(50), nullable=False)
+    ac = Column(String(10))
+    date = Column(Date)
+    ata = Column(String(10))
+    flags = Column(String(50))
+    non_relevant = Column(Boolean)
+    reason = Column(Text)
+    updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow)
+    
+    taskbar = relationship('Taskbar', back_populates='work_orders')
+
+class FindingPartNumber(Base):
+    """Cada P/N extraído de un hallazgo, en el orden de la extracción"""
+    __tablename__ = 'finding_part_numbers'
+    id = Column(Integer, primary_key=True)
+    finding_id = Column(Integer, ForeignKey('finding_description_tasks.id', ondelete='CASCADE'), nullable=False,
+                        index=True)
+    position = Column(Integer, nullable=False)
+    part_number = Column(String(100), nullable=False, index=True)
+
+class FindingAmmTask(Base):
+    """Cada tarea AMM extraída de un hallazgo, en el orden de la extracción"""
+    __tablename__ = 'finding_amm_tasks'
+    id = Column(Integer, primary_key=True)
+    finding_id = Column(Integer, ForeignKey('finding_description_tasks.id', ondelete='CASCADE'), nullable=False,
+                        index=True)
+    position = Column(Integer, nullable=False)
+    task = Column(String(100), index=True)
+    description = Column(Text)
@@ -1,4 +1,7 @@
 import pickle
+import copy
+import hashlib
+import unicodedata
 
 def load_pickle(filename="data/iberia/parsed_list.pkl"):
     with open(filename, "rb") as f:
@@ -7,4 +10,73 @@ def load_pickle(filename="data/iberia/parsed_list.pkl"):
 
 def write_to_pickle(parsed_list, filename="data/iberia/parsed_list.pkl"):
     with open(filename, 'wb') as f:
-            pickle.dump(parsed_list, f)
\ No newline at end of file
+            pickle.dump(parsed_list, f)
+
+def normalize_description(text):
+    """Normaliza una descripción (unicode NFC y espacios colapsados) para compararla o usarla como clave"""
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFC", str(text))
+    return " ".join(text.split())
+
+def description_hash(text):
+    """Hash sha256 de la descripción normalizada; identifica si una descripción ha cambiado"""
+    return hashlib.sha256(normalize_description(text).encode('utf-8')).hexdigest()
+
+def deduplicate_descriptions(descriptions):
+    """
+    Agrupa las descripciones idénticas tras normalizarlas.
+
+    Returns:
+        (descripciones únicas en orden de primera aparición,
+         lista con el índice de la descripción única de cada elemento original)
+    """
+    unique_index = {}
+    unique_descriptions = []
+    inverse = []
+    for desc in descriptions:
+        key = normalize_description(desc)
+        if key not in unique_index:
+            unique_index[key] = len(unique_descriptions)
+            unique_descriptions.append(desc)
+        inverse.append(unique_index[key])
+    return unique_descriptions, inverse
+
+def expand_deduplicated(unique_results, inverse):
+    """Reparte los resultados de las descripciones únicas a todas las filas originales, en orden"""
+    seen = set()
+    results = []
+    for index in inverse:
+        result = unique_results[index]
+        # Las repeticiones reciben una copia para que modificar una fila no afecte a las demás
+        results.append(copy.deepcopy(result) if index in seen else result)
+        seen.add(index)
+    return results
+
+def expand_batch_callback(on_batch, inverse):
+    """
+    Adapta un callback (índices, resultados) de las descripciones únicas a los
+    índices originales: cada resultado se entrega a todas sus repeticiones.
+    """
+    positions = {}
+    for original_index, unique_index in enumerate(inverse):
+        positions.setdefault(unique_index, []).append(original_index)
+
+    def callback(unique_indices, unique_results):
+        indices = []
+        results = []
+        for unique_index, result in zip(unique_indices, unique_results):
+            for n, original_index in enumerate(positions.get(unique_index, [])):
+                indices.append(original_index)
+                results.append(result if n == 0 else copy.deepcopy(result))
+        on_batch(indices, results)
+
+    return callback
+
+def expand_record_callback(on_record, inverse):
+    """Como expand_batch_callback para un callback (índice, resultado) por registro"""
+    expanded = expand_batch_callback(
+        lambda indices, results: [on_record(index, result) for index, result in zip(indices, results)],
+        inverse,
+    )
+    return lambda unique_index, result: expanded([unique_index], [result])
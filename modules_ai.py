@@ -1,10 +1,17 @@
 import os
 import json
-import time
-from langchain_openai import AzureChatOpenAI
-from openai import OpenAI
 import re
 from dotenv import load_dotenv
+from modules import deduplicate_descriptions, expand_deduplicated, expand_batch_callback, expand_record_callback
+from batch_packing import count_tokens, pack_batches
+from llm_cache import ExtractionCache, get_default_cache
+from llm_clients import backend_models, backend_default_options, structured_outputs_supported
+import llm_resilience
+from llm_resilience import LLMUnavailableError, served_backend
+from llm_dispatcher import dispatch
+from json_stream import StreamingJSONParser, parse_json_items
+from prompt_templates import load_template_file
+from extraction_schemas import record_schema_for_prompt, record_validator, batch_response_format, AERLINGUS_FIELDS
 
 # Cargar variables de entorno
 load_dotenv()
@@ -13,39 +20,106 @@ from dotenv import load_dotenv
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
 
+def load_template(filename):
+    """Template de la carpeta prompts/ (PromptTemplate), leído y validado una sola vez por proceso"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return load_template_file(os.path.join(script_dir, 'prompts', filename))
+
+
 def load_prompt(filename):
     """Load prompt from prompts folder"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    prompt_path = os.path.join(script_dir, 'prompts', filename)
-    with open(prompt_path, 'r', encoding='utf-8') as f:
-        return f.read()
-
-def deepseek_request(prompt):
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        raise ValueError("OPENROUTER_API_KEY no encontrada. Configura la variable de entorno.")
-
-    client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    )
+    return load_template(filename).text
 
-    completion = client.chat.completions.create(
-    extra_headers={
-        "HTTP-Referer": "<YOUR_SITE_URL>", # Optional. Site URL for rankings on openrouter.ai.
-        "X-Title": "<YOUR_SITE_NAME>", # Optional. Site title for rankings on openrouter.ai.
-    },
-    extra_body={},
-    model="deepseek/deepseek-r1-0528:free",
-    messages=[
-        {
-          "role": "user",
-          "content": f"{prompt}"
-        }
-  ]
-     )
+
+def as_messages(prompt):
+    """Acepta un prompt de texto (un mensaje de usuario) o una lista de mensajes ya construida"""
+    if isinstance(prompt, list):
+        return prompt
+    return [{"role": "user", "content": f"{prompt}"}]
+
+def llm_backend(deepseek):
+    return "openrouter" if deepseek else "azure"
+
+
+def llm_request(prompt, deepseek=False, max_tokens=None, response_format=None):
+    """
+    Envía el prompt al backend indicado usando el cliente compartido del proceso.
+    Los errores transitorios se reintentan y, si el backend no está disponible,
+    se pasa al alternativo (llm_resilience); si ninguno responde se lanza LLMUnavailableError.
+    """
+    completion = llm_chat(prompt, deepseek, max_tokens=max_tokens, response_format=response_format)
     return completion.choices[0].message.content
-    #print(completion.choices[0].message.content)
+
+
+def llm_chat(prompt, deepseek=False, max_tokens=None, response_format=None):
+    """Como llm_request pero devuelve el ChatCompletion completo (served_backend indica quién respondió)"""
+    messages = as_messages(prompt)
+    return llm_resilience.chat(llm_backend(deepseek), messages, max_tokens=max_tokens,
+                               response_format=response_format)
+
+
+async def llm_request_async(prompt, deepseek=False, max_tokens=None):
+    completion = await llm_chat_async(prompt, deepseek, max_tokens=max_tokens)
+    return completion.choices[0].message.content
+
+
+async def llm_chat_async(prompt, deepseek=False, max_tokens=None, response_format=None):
+    """Como llm_request_async pero devuelve el ChatCompletion completo (incluye finish_reason)"""
+    messages = as_messages(prompt)
+    return await llm_resilience.achat(llm_backend(deepseek), messages, max_tokens=max_tokens,
+                                      response_format=response_format)
+
+
+def _consume_stream_chunk(chunk, parser, parts, on_item):
+    """Añade el fragmento al parser y notifica los objetos JSON que se cierran; devuelve el finish_reason"""
+    if not chunk.choices:
+        return None
+    choice = chunk.choices[0]
+    delta = choice.delta.content if choice.delta else None
+    if delta:
+        parts.append(delta)
+        for index, item in parser.feed(delta):
+            if on_item:
+                on_item(index, item)
+    return choice.finish_reason
+
+
+def llm_stream(prompt, deepseek=False, max_tokens=None, on_item=None, response_format=None):
+    """
+    Petición en streaming: la respuesta se parsea a medida que llega y
+    on_item(índice, elemento) se llama en cuanto se cierra cada objeto JSON.
+
+    Returns:
+        (contenido completo, finish_reason, backend que respondió)
+    """
+    messages = as_messages(prompt)
+    parser = StreamingJSONParser()
+    parts = []
+    finish_reason = None
+    stream = llm_resilience.stream_chat(llm_backend(deepseek), messages, max_tokens=max_tokens,
+                                        response_format=response_format)
+    for chunk in stream:
+        finish_reason = _consume_stream_chunk(chunk, parser, parts, on_item) or finish_reason
+    return "".join(parts), finish_reason, served_backend(stream, llm_backend(deepseek))
+
+
+async def llm_stream_async(prompt, deepseek=False, max_tokens=None, on_item=None, response_format=None):
+    """Versión asíncrona de llm_stream"""
+    messages = as_messages(prompt)
+    parser = StreamingJSONParser()
+    parts = []
+    finish_reason = None
+    stream = await llm_resilience.astream_chat(llm_backend(deepseek), messages, max_tokens=max_tokens,
+                                               response_format=response_format)
+    async for chunk in stream:
+        finish_reason = _consume_stream_chunk(chunk, parser, parts, on_item) or finish_reason
+    return "".join(parts), finish_reason, served_backend(stream, llm_backend(deepseek))
+
+
+def deepseek_request(prompt, stream=False, on_item=None):
+    if stream:
+        return llm_stream(prompt, deepseek=True, on_item=on_item)[0]
+    return llm_request(prompt, deepseek=True)
 
 
 def parse_description_deepseek(description):
@@ -56,88 +130,359 @@ def parse_description_deepseek(description):
     
 
 
-def parse_descriptions_bulk_batched(descriptions, batch_size, prompt_template, deepseek):
-    all_results = []
-    for i in range(0, len(descriptions), batch_size):
-        batch = descriptions[i:i+batch_size]
-        results = parse_descriptions_bulk(prompt_template, batch, deepseek)
-        all_results.extend(results)
-        time.sleep(60)
-    return all_results
+def estimate_request_tokens(prompt, max_tokens=4000):
+    """Estimación del coste en tokens de una petición (prompt + salida máxima) para el rate limiter"""
+    return count_tokens(prompt) + max_tokens
 
 
+def extraction_cache_key(description, prompt_template, deepseek, backend=None):
+    """Clave de caché de una extracción con el modelo de `backend` (por defecto el pedido con deepseek)"""
+    backend = backend or llm_backend(deepseek)
+    return ExtractionCache.make_key(
+        description,
+        prompt_template,
+        backend_models[backend],
+        backend_default_options[backend].get("temperature"),
+    )
 
 
-def parse_descriptions_bulk(prompt_template_filename, descriptions: list, deepseek: bool) -> list:
-    prompt_template = load_prompt(prompt_template_filename)
-    
-    # Prepare descriptions for the template
+def extraction_namespace(prompt_template, deepseek):
+    """Namespace de la caché semántica: las extracciones solo se reutilizan con el mismo prompt y modelo"""
+    backend = llm_backend(deepseek)
+    return ExtractionCache.make_namespace(
+        prompt_template,
+        backend_models[backend],
+        backend_default_options[backend].get("temperature"),
+    )
+
+
+def structured_response_format(prompt_template, deepseek, num_items):
+    """
+    response_format json_schema para un lote del prompt indicado, o None si el
+    prompt no tiene esquema o el backend no admite salidas estructuradas.
+    """
+    if not structured_outputs_supported(llm_backend(deepseek)):
+        return None
+    record_schema = record_schema_for_prompt(prompt_template)
+    if record_schema is None:
+        return None
+    name = os.path.splitext(prompt_template)[0]
+    return batch_response_format(record_schema, num_items, name=name)
+
+
+def lookup_cached_results(descriptions, prompt_template, deepseek, cache):
+    """
+    Consulta la caché para cada descripción.
+
+    Returns:
+        (resultados con None en los fallos de caché, claves de caché, índices pendientes)
+    """
+    keys = [extraction_cache_key(desc, prompt_template, deepseek) for desc in descriptions]
+    found = cache.get_many(keys) if cache is not None else {}
+    results = [found.get(key) for key in keys]
+    pending = [i for i, result in enumerate(results) if result is None]
+    return results, keys, pending
+
+
+def parse_descriptions_bulk_batched(descriptions, batch_size, prompt_template, deepseek,
+                                    max_concurrency=4, requests_per_minute=None, tokens_per_minute=None,
+                                    use_cache=True, cache=None, deduplicate=True,
+                                    max_input_tokens=None, max_output_tokens=None, output_tokens_per_item=300,
+                                    on_batch=None, stream=False, on_record=None,
+                                    structured_output=True, max_reasks=1):
+    """
+    Procesa las descripciones en lotes enviando varios lotes en paralelo.
+    Las descripciones repetidas se envían una sola vez y solo se envían al
+    LLM las que no están en la caché.
+
+    Args:
+        descriptions: Lista de textos a procesar
+        batch_size: Número de descripciones por petición
+        prompt_template: Nombre del archivo de prompt en la carpeta prompts/
+        deepseek: Usar DeepSeek vía OpenRouter en lugar de Azure OpenAI
+        max_concurrency: Número máximo de peticiones en vuelo
+        requests_per_minute: Límite de peticiones por minuto (None = sin límite)
+        tokens_per_minute: Límite de tokens por minuto (None = sin límite)
+        use_cache: Consultar y actualizar la caché persistente de resultados
+        cache: ExtractionCache a usar (por defecto data/llm_cache.sqlite)
+        deduplicate: Enviar una sola vez las descripciones idénticas tras normalizarlas
+        max_input_tokens: Presupuesto de tokens del prompt por petición. Si se indica
+            (o max_output_tokens), los lotes se llenan por tokens y batch_size es solo un máximo
+        max_output_tokens: Presupuesto de tokens de respuesta por petición (también se usa como max_tokens)
+        output_tokens_per_item: Tokens de salida estimados por descripción para el empaquetado
+        on_batch: Función (índices, resultados) llamada con los resultados de la caché y
+            con cada lote al completarse (p. ej. para escribir un diario de la ejecución)
+        stream: Usar chat completions en streaming: cada registro se parsea en cuanto se
+            cierra su objeto JSON y, si la respuesta se trunca, solo se reenvían los que faltan
+        on_record: Función (índice, resultado) llamada con cada registro en cuanto está
+            disponible (con stream, antes de que termine la respuesta de su lote)
+        structured_output: Pedir salida restringida por el esquema JSON del prompt
+            (ver extraction_schemas) si el backend la admite
+        max_reasks: Veces que se reenvían solo los registros que no superan la
+            validación; los que siguen fallando quedan como {} (ni caché ni diario)
+
+    Returns:
+        Lista de resultados en el mismo orden que `descriptions`
+    """
+    if deduplicate:
+        unique_descriptions, inverse = deduplicate_descriptions(descriptions)
+        if descriptions:
+            saved = 1 - len(unique_descriptions) / len(descriptions)
+            print(f"Deduplicación: {len(descriptions)} descripciones -> {len(unique_descriptions)} únicas "
+                  f"({saved:.1%} menos descripciones enviadas)")
+        unique_results = parse_descriptions_bulk_batched(
+            unique_descriptions, batch_size, prompt_template, deepseek,
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            use_cache=use_cache,
+            cache=cache,
+            deduplicate=False,
+            max_input_tokens=max_input_tokens,
+            max_output_tokens=max_output_tokens,
+            output_tokens_per_item=output_tokens_per_item,
+            on_batch=expand_batch_callback(on_batch, inverse) if on_batch else None,
+            stream=stream,
+            on_record=expand_record_callback(on_record, inverse) if on_record else None,
+            structured_output=structured_output,
+            max_reasks=max_reasks,
+        )
+        return expand_deduplicated(unique_results, inverse)
+
+    compiled = load_template(prompt_template)
+    template = compiled.text
+    is_valid = record_validator(prompt_template)
+    if use_cache and cache is None:
+        cache = get_default_cache()
+    elif not use_cache:
+        cache = None
+
+    all_results, _, pending = lookup_cached_results(descriptions, template, deepseek, cache)
+    if cache is not None:
+        print(f"Caché LLM: {len(descriptions) - len(pending)} de {len(descriptions)} descripciones ya procesadas")
+    cached = [i for i, result in enumerate(all_results) if result is not None]
+    if on_batch and cached:
+        on_batch(cached, [all_results[i] for i in cached])
+    if on_record:
+        for index in cached:
+            on_record(index, all_results[index])
+
+    if max_input_tokens or max_output_tokens:
+        packed = pack_batches(
+            [descriptions[i] for i in pending],
+            template,
+            max_input_tokens=max_input_tokens,
+            max_output_tokens=max_output_tokens,
+            output_tokens_per_item=output_tokens_per_item,
+            max_batch_size=batch_size,
+        )
+        batches = [[pending[i] for i in batch] for batch in packed]
+    else:
+        batches = [pending[i:i+batch_size] for i in range(0, len(pending), batch_size)]
+    report_prompt_tokens(compiled, [[descriptions[i] for i in batch] for batch in batches])
+    # Backend que respondió cada descripción (el alternativo si hubo failover)
+    served = {}
+
+    async def request_batch(batch_indices):
+        batch = [descriptions[i] for i in batch_indices]
+        prompt = build_bulk_messages(compiled, batch)
+        response_format = structured_response_format(prompt_template, deepseek, len(batch)) if structured_output else None
+        if stream:
+            results = [{} for _ in batch]
+
+            def emit(position, item):
+                if 0 <= position < len(batch) and is_valid(item) and not results[position]:
+                    results[position] = item
+                    if on_record:
+                        on_record(batch_indices[position], item)
+
+            content, finish_reason, backend = await llm_stream_async(prompt, deepseek, max_tokens=max_output_tokens,
+                                                                     on_item=emit, response_format=response_format)
+            served.update(dict.fromkeys(batch_indices, backend))
+            missing = [position for position, result in enumerate(results) if not result]
+            # Respuesta cortada: los registros ya recibidos se conservan y solo se reenvían los que faltan
+            if finish_reason == "length" and 0 < len(missing) < len(batch):
+                retried = await request_batch([batch_indices[position] for position in missing])
+                for position, result in zip(missing, retried):
+                    results[position] = result
+                return results
+            if finish_reason != "length" or len(batch_indices) == 1 or not missing:
+                if missing:
+                    print(f"Warning: Se esperaban {len(batch)} elementos, pero se obtuvieron {len(batch) - len(missing)}")
+                return results
+        else:
+            completion = await llm_chat_async(prompt, deepseek, max_tokens=max_output_tokens,
+                                              response_format=response_format)
+            served.update(dict.fromkeys(batch_indices, served_backend(completion, llm_backend(deepseek))))
+            choice = completion.choices[0]
+            content, finish_reason = choice.message.content, choice.finish_reason
+        # Respuesta cortada por max_tokens: se divide el lote y se reintentan las mitades
+        if finish_reason == "length" and len(batch_indices) > 1:
+            print(f"Warning: respuesta truncada en un lote de {len(batch)} descripciones. Dividiendo y reintentando...")
+            middle = len(batch_indices) // 2
+            first = await request_batch(batch_indices[:middle])
+            second = await request_batch(batch_indices[middle:])
+            return first + second
+        results = [result if is_valid(result) else {} for result in parse_bulk_response(content, len(batch))]
+        if on_record:
+            for index, result in zip(batch_indices, results):
+                if result:
+                    on_record(index, result)
+        return results
+
+    async def process_batch(batch_indices, attempt=0):
+        try:
+            results = await request_batch(batch_indices)
+        except LLMUnavailableError as error:
+            # El lote queda sin resultado (ni caché ni diario) y se puede reanudar más tarde
+            print(f"Warning: {error}. {len(batch_indices)} descripciones sin procesar")
+            return [{} for _ in batch_indices]
+        failed = [position for position, result in enumerate(results) if not result]
+        # Solo se vuelven a pedir los registros que faltan o no superan la validación
+        if failed and attempt < max_reasks:
+            print(f"Warning: {len(failed)} de {len(batch_indices)} registros sin resultado válido. Reenviando solo esos...")
+            retried = await process_batch([batch_indices[position] for position in failed], attempt + 1)
+            for position, result in zip(failed, retried):
+                results[position] = result
+        return results
+
+    def store_batch(batch_number, results):
+        batch_indices = batches[batch_number]
+        for index, result in zip(batch_indices, results):
+            all_results[index] = result
+        # Se guarda cada lote al completarse para no perderlo si la ejecución falla después, con la
+        # clave del backend que respondió: tras un failover no se atribuye al modelo pedido
+        if cache is not None:
+            cache.set_many({extraction_cache_key(descriptions[index], template, deepseek, served.get(index)): result
+                            for index, result in zip(batch_indices, results)})
+        if on_batch:
+            on_batch(batch_indices, results)
+
+    dispatch(
+        batches,
+        process_batch,
+        max_concurrency=max_concurrency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        cost=lambda batch_indices: estimate_request_tokens(
+            build_bulk_prompt(template, [descriptions[i] for i in batch_indices]),
+            max_tokens=max_output_tokens or 4000,
+        ),
+        on_result=store_batch,
+    )
+    return all_results
+
+
+def numbered_descriptions(descriptions):
+    """Texto con las descripciones numeradas ("Description 1: ...") que se inserta en el template"""
     descriptions_text = ""
     for i, desc in enumerate(descriptions, 1):
         descriptions_text += f"\nDescription {i}: {desc}"
-    
-    prompt = prompt_template.format(description=descriptions_text)
+    return descriptions_text
 
-    if deepseek:
-        content = deepseek_request(prompt)
-    else:
-        llm = AzureChatOpenAI(
-            azure_endpoint=os.getenv("OPENAI_API_ENDPOINT"),
-            azure_deployment="gpt-4o-mini",
-            api_version=os.getenv("OPENAI_API_VERSION"),
-            api_key=os.getenv("OPENAI_API_KEY"),
-            temperature=0,
-            max_tokens=4000,  # Aumentar tokens para respuestas más largas
-        )
 
-        response = llm.invoke(prompt)
-        # Extraer el contenido correctamente del objeto AIMessage
-        content = response.content if hasattr(response, 'content') else str(response)
+def build_bulk_prompt(prompt_template, descriptions):
+    """Inserta las descripciones numeradas en el template de prompt"""
+    return prompt_template.format(description=numbered_descriptions(descriptions))
+
 
-    # Manejo robusto de la respuesta JSON
-    def extract_json_array(text, num_expected_items):
-        # Intenta limpiar bloques de código
-        clean_text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.MULTILINE)
-        
+def build_bulk_messages(template, descriptions):
+    """
+    Mensajes de una petición: el sistema estático del PromptTemplate (idéntico en
+    todas las peticiones, cacheable por el proveedor) y las descripciones como usuario.
+    """
+    return template.messages(numbered_descriptions(descriptions))
+
+
+def report_prompt_tokens(template, batches):
+    """Informa de los tokens del prefijo estático y de la parte variable de una serie de peticiones"""
+    if not batches:
+        return None
+    report = template.token_report([template.messages(numbered_descriptions(batch))[-1]["content"]
+                                    for batch in batches])
+    print(f"Prompt {template.name}: sistema {report['system_tokens']} tokens por petición "
+          f"({'cacheable' if report['cacheable'] else 'por debajo del mínimo de la caché de prompts'}), "
+          f"usuario {report['user_tokens']} tokens en {report['requests']} peticiones; "
+          f"{report['cacheable_share']:.1%} de la entrada es prefijo común")
+    return report
+
+
+def parse_descriptions_bulk(prompt_template_filename, descriptions: list, deepseek: bool,
+                            use_cache: bool = True, cache: ExtractionCache = None,
+                            stream: bool = False, on_record=None,
+                            structured_output: bool = True, max_reasks: int = 1) -> list:
+    """
+    Procesa todas las descripciones en una sola petición.
+    Con stream=True la respuesta se parsea a medida que llega y on_record(índice, resultado)
+    se llama en cuanto se cierra cada objeto, sin esperar al final de la respuesta.
+    Con structured_output se pide salida restringida por el esquema del prompt si el
+    backend la admite; los registros que no superan la validación se reenvían solos
+    hasta max_reasks veces y, si siguen fallando, quedan como {}.
+    """
+    compiled = load_template(prompt_template_filename)
+    prompt_template = compiled.text
+    is_valid = record_validator(prompt_template_filename)
+    if use_cache and cache is None:
+        cache = get_default_cache()
+    elif not use_cache:
+        cache = None
+
+    # Solo se construye el prompt con las descripciones que no están en caché
+    results, _, pending = lookup_cached_results(descriptions, prompt_template, deepseek, cache)
+    if on_record:
+        for index, result in enumerate(results):
+            if result is not None:
+                on_record(index, result)
+
+    for attempt in range(max_reasks + 1):
+        if not pending:
+            break
+        if attempt:
+            print(f"Warning: {len(pending)} registros sin resultado válido. Reenviando solo esos...")
+        prompt = build_bulk_messages(compiled, [descriptions[i] for i in pending])
+        if not attempt:
+            report_prompt_tokens(compiled, [[descriptions[i] for i in pending]])
+        response_format = (structured_response_format(prompt_template_filename, deepseek, len(pending))
+                           if structured_output else None)
         try:
-            # Intenta cargar el texto limpio directamente
-            return json.loads(clean_text)
-        except json.JSONDecodeError:
-            try:
-                # Busca el primer array JSON válido
-                match = re.search(r'(\[\s*{.*}\s*\])', clean_text, re.DOTALL)
-                if match:
-                    return json.loads(match.group(1))
-            except Exception:
-                pass
-            
-            try:
-                # Si el JSON está incompleto, intenta completarlo
-                if clean_text.strip().startswith('[') and not clean_text.strip().endswith(']'):
-                    # Busca el último objeto completo
-                    last_complete = clean_text.rfind('}')
-                    if last_complete != -1:
-                        truncated_json = clean_text[:last_complete + 1] + ']'
-                        return json.loads(truncated_json)
-            except Exception:
-                pass
-        
-        # Si todo falla, devuelve array vacío con el número esperado de elementos
+            if stream:
+                def emit(position, item, batch=pending):
+                    if on_record and 0 <= position < len(batch) and is_valid(item):
+                        on_record(batch[position], item)
+
+                content, _, backend = llm_stream(prompt, deepseek, on_item=emit, response_format=response_format)
+            else:
+                completion = llm_chat(prompt, deepseek, response_format=response_format)
+                content, backend = completion.choices[0].message.content, served_backend(completion)
+        except LLMUnavailableError as error:
+            print(f"Warning: {error}. {len(pending)} descripciones sin procesar")
+            for index in pending:
+                results[index] = {}
+            break
+        parsed = [result if is_valid(result) else {} for result in parse_bulk_response(content, len(pending))]
+        for index, result in zip(pending, parsed):
+            results[index] = result
+            if on_record and not stream and result:
+                on_record(index, result)
+        if cache is not None:
+            cache.set_many({extraction_cache_key(descriptions[index], prompt_template, deepseek, backend): result
+                            for index, result in zip(pending, parsed)})
+        pending = [index for index, result in zip(pending, parsed) if not result]
+    return results
+
+
+def parse_bulk_response(content, num_descriptions):
+    """
+    Convierte la respuesta del LLM en una lista con un resultado por descripción.
+    Admite un array o un objeto con claves "1", "2"... (prompt de Iberia); las
+    posiciones sin resultado quedan como {}.
+    """
+    data, found = parse_json_items(content, num_descriptions)
+    if not found:
         print(f"Warning: No se pudo parsear el JSON. Devolviendo array vacío.")
-        print(f"Contenido recibido: {text[:200]}...")
-        return [{} for _ in range(num_expected_items)]
-    
-    data = extract_json_array(content, len(descriptions))
-    
-    # Asegurar que tenemos el número correcto de elementos
-    if len(data) != len(descriptions):
-        print(f"Warning: Se esperaban {len(descriptions)} elementos, pero se obtuvieron {len(data)}")
-        # Ajustar la lista para que tenga la longitud correcta
-        if len(data) < len(descriptions):
-            data.extend([{} for _ in range(len(descriptions) - len(data))])
-        else:
-            data = data[:len(descriptions)]
-    
+        print(f"Contenido recibido: {(content or '')[:200]}...")
+    elif found != num_descriptions:
+        print(f"Warning: Se esperaban {num_descriptions} elementos, pero se obtuvieron {found}")
     return data
 
 
@@ -186,144 +531,27 @@ def parsing_regex_fields(description):
     
     return result
 
-def test_json_parsing(response_content):
-    """
-    Función auxiliar para probar el parsing de JSON
-    """
-    def extract_json_array(text):
-        clean_text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.MULTILINE)
-        
-        try:
-            return json.loads(clean_text)
-        except json.JSONDecodeError:
-            try:
-                match = re.search(r'(\[\s*{.*}\s*\])', clean_text, re.DOTALL)
-                if match:
-                    return json.loads(match.group(1))
-            except Exception:
-                pass
-            
-            try:
-                if clean_text.strip().startswith('[') and not clean_text.strip().endswith(']'):
-                    last_complete = clean_text.rfind('}')
-                    if last_complete != -1:
-                        truncated_json = clean_text[:last_complete + 1] + ']'
-                        return json.loads(truncated_json)
-            except Exception:
-                pass
-        
-        return []
-    
-    try:
-        parsed = extract_json_array(response_content)
-        print(f"✅ JSON parseado exitosamente. {len(parsed)} elementos encontrados.")
-        return parsed
-    except Exception as e:
-        print(f"❌ Error al parsear JSON: {e}")
-        return []
-
 def extract_maintenance_fields(descriptions: list, use_deepseek: bool = True) -> list:
     """
-    Extrae campos de mantenimiento estandarizados de las descripciones
+    Extrae campos de mantenimiento estandarizados de las descripciones.
+    Los registros que no superan la validación se reenvían solos; los campos
+    que el modelo omite se completan con None (finding_related con False).
     """
-    prompt_template = load_prompt('extract_maintenance_fields.txt')
-    
-    # Preparar las descripciones para el template
-    descriptions_text = ""
-    for i, desc in enumerate(descriptions, 1):
-        descriptions_text += f"\nDescription {i}: {desc}"
-    
-    prompt = prompt_template.format(description=descriptions_text)
-
-    if use_deepseek:
-        content = deepseek_request(prompt)
-    else:
-        llm = AzureChatOpenAI(
-            azure_endpoint=os.getenv("OPENAI_API_ENDPOINT"),
-            azure_deployment="gpt-4o-mini",
-            api_version=os.getenv("OPENAI_API_VERSION"),
-            api_key=os.getenv("OPENAI_API_KEY"),
-            temperature=0,
-            max_tokens=4000,
-        )
-
-        response = llm.invoke(prompt)
-        content = response.content if hasattr(response, 'content') else str(response)
+    data = parse_descriptions_bulk('extract_maintenance_fields.txt', descriptions, use_deepseek, use_cache=False)
 
-    # Usar la función de extracción JSON existente
-    def extract_json_array(text, num_expected_items):
-        clean_text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.MULTILINE)
-        
-        try:
-            return json.loads(clean_text)
-        except json.JSONDecodeError:
-            try:
-                match = re.search(r'(\[\s*{.*}\s*\])', clean_text, re.DOTALL)
-                if match:
-                    return json.loads(match.group(1))
-            except Exception:
-                pass
-            
-            try:
-                if clean_text.strip().startswith('[') and not clean_text.strip().endswith(']'):
-                    last_complete = clean_text.rfind('}')
-                    if last_complete != -1:
-                        truncated_json = clean_text[:last_complete + 1] + ']'
-                        return json.loads(truncated_json)
-            except Exception:
-                pass
-        
-        # Si todo falla, devuelve estructura vacía con todos los campos
-        print(f"Warning: No se pudo parsear el JSON. Devolviendo estructura vacía.")
-        empty_structure = {
-            "description_id": None,
-            "maintenance_type": None,
-            "component": None,
-            "part_number": None,
-            "serial_number": None,
-            "position": None,
-            "action": None,
-            "result": None,
-            "reference": None,
-            "location": None,
-            "date": None,
-            "finding": None,
-            "taskcard": None,
-            "finding_related": False,
-            "task_type": None,
-            "failure_description": None,
-            "corrective_action": None,
-            "engineering_order": None,
-            "eo_revision": None,
-            "task": None,
-            "instructions": None,
-            "reporting": None,
-            "personnel": None,
-            "findings": [],
-            "additional_notes": None
-        }
-        return [empty_structure for _ in range(num_expected_items)]
-    
-    data = extract_json_array(content, len(descriptions))
-    
-    # Asegurar que todos los objetos tienen los campos requeridos
-    required_fields = ['description_id', 'maintenance_type', 'component', 'part_number', 
-                      'serial_number', 'position', 'action', 'result', 'reference', 
-                      'location', 'date', 'finding', 'taskcard', 'finding_related', 'task_type', 
-                      'failure_description', 'corrective_action', 'engineering_order', 'eo_revision', 
-                      'task', 'instructions', 'reporting', 'personnel', 'additional_notes']
-    
     for item in data:
-        for field in required_fields:
+        if not item:
+            continue
+        for field in AERLINGUS_FIELDS:
             if field not in item:
                 if field == 'finding_related':
                     item[field] = False
+                elif field == 'findings':
+                    # Asegurar que findings es una lista
+                    item[field] = []
                 else:
                     item[field] = None
-        # Asegurar que findings es una lista
-        if 'findings' not in item:
-            item['findings'] = []
-    
+
     return data
 
 def generate_extraction_examples(descriptions: list, use_deepseek: bool = False) -> dict:
@@ -340,21 +568,8 @@ def generate_extraction_examples(descriptions: list, use_deepseek: bool = False)
         descriptions_text += f"\nDescription {i}: {desc}"
     
     prompt = prompt_template.format(description=descriptions_text)
-
-    if use_deepseek:
-        content = deepseek_request(prompt)
-    else:
-        llm = AzureChatOpenAI(
-            azure_endpoint=os.getenv("OPENAI_API_ENDPOINT"),
-            azure_deployment="gpt-4o-mini",
-            api_version=os.getenv("OPENAI_API_VERSION"),
-            api_key=os.getenv("OPENAI_API_KEY"),
-            temperature=0,
-            max_tokens=3000,
-        )
-
-        response = llm.invoke(prompt)
-        content = response.content if hasattr(response, 'content') else str(response)
+    # Azure usaba un límite menor para la generación de ejemplos
+    content = llm_request(prompt, use_deepseek, max_tokens=None if use_deepseek else 3000)
 
     try:
         # Limpiar y parsear JSON
@@ -439,4 +654,4 @@ def extract_maintenance_fields_with_examples(descriptions: list, use_deepseek: b
 #     return extract_maintenance_fields(descriptions, use_deepseek)
 
 # Ejemplo de uso:
-# parsed_data = test_json_parsing(response.content)
+# parsed_data, found = parse_json_items(response.content, num_descriptions)
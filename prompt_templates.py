@@ -0,0 +1,105 @@
+import os
+import re
+import string
+from functools import lru_cache, cached_property
+from batch_packing import count_tokens
+
+PLACEHOLDER = "description"
+# Tokens mínimos del prefijo para que Azure OpenAI / OpenAI apliquen la caché de prompts
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+class PromptTemplate:
+    """
+    Template de prompt cargado y validado una sola vez.
+
+    Se divide en un mensaje de sistema estático (instrucciones, ejemplos y
+    requisitos de salida) y un mensaje de usuario con las descripciones, de
+    modo que el prefijo de cada petición es idéntico byte a byte y el
+    proveedor puede reutilizarlo de su caché de prompts.
+
+    Args:
+        name: Nombre del archivo de prompt
+        text: Contenido del template con un único campo {description}
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.system, self.user_template = split_template(name, text)
+
+    def format(self, descriptions_text):
+        """Prompt completo en un solo texto (formato anterior, un único mensaje de usuario)"""
+        return self.text.format(**{PLACEHOLDER: descriptions_text})
+
+    def messages(self, descriptions_text):
+        """Mensajes de chat: sistema estático + usuario con las descripciones"""
+        user = {"role": "user", "content": self.user_template.format(**{PLACEHOLDER: descriptions_text})}
+        if not self.system:
+            return [user]
+        return [{"role": "system", "content": self.system}, user]
+
+    @cached_property
+    def system_tokens(self):
+        return count_tokens(self.system) if self.system else 0
+
+    def token_report(self, user_messages):
+        """
+        Tokens de cada parte para una serie de peticiones.
+
+        Args:
+            user_messages: Contenido del mensaje de usuario de cada petición
+
+        Returns:
+            dict con los tokens de sistema (prefijo cacheable) y de usuario, y la
+            fracción de los tokens de entrada que forma parte del prefijo
+        """
+        user_tokens = sum(count_tokens(message) for message in user_messages)
+        system_tokens = self.system_tokens * len(user_messages)
+        total = system_tokens + user_tokens
+        return {
+            "requests": len(user_messages),
+            "system_tokens": self.system_tokens,
+            "user_tokens": user_tokens,
+            "cacheable_share": system_tokens / total if total else 0.0,
+            "cacheable": self.system_tokens >= PROMPT_CACHE_MIN_TOKENS,
+        }
+
+
+def _fields(name, text):
+    try:
+        return [(field, spec, conversion) for _, field, spec, conversion in string.Formatter().parse(text)
+                if field is not None]
+    except ValueError as error:
+        raise ValueError(f"Template de prompt {name} mal formado: {error}") from error
+
+
+def split_template(name, text):
+    """
+    Valida el template y lo separa en (sistema, usuario). El mensaje de usuario
+    es la línea del campo {description} y su encabezado ("INPUT DESCRIPTIONS:");
+    el resto del texto, antes y después, forma el mensaje de sistema.
+    """
+    fields = _fields(name, text)
+    if [field for field, _, _ in fields] != [PLACEHOLDER] or fields[0][1] or fields[0][2]:
+        raise ValueError(f"El template de prompt {name} debe tener un único campo {{{PLACEHOLDER}}} "
+                         f"(encontrados: {[field for field, _, _ in fields]})")
+
+    lines = text.splitlines()
+    line = next(i for i, content in enumerate(lines) if "{" + PLACEHOLDER + "}" in content)
+    start = line
+    if line > 0 and lines[line - 1].strip().endswith(":"):
+        start = line - 1
+    user = "\n".join(lines[start:line + 1])
+    system = "\n".join(lines[:start]).rstrip() + "\n\n" + "\n".join(lines[line + 1:]).strip()
+    system = re.sub(r"\n{3,}", "\n\n", system).strip()
+    # El sistema no tiene campos: format() solo deshace el escapado de llaves ({{ -> {)
+    return system.format(), user
+
+
+@lru_cache(maxsize=None)
+def load_template_file(path):
+    """Lee y valida el template una sola vez por proceso"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return PromptTemplate(os.path.basename(path), text)
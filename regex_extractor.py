@@ -0,0 +1,232 @@
+import re
+import pandas as pd
+
+# Patrones de test/test_regex.py adaptados al esquema de extract_description_fields_iberia.txt.
+# process_findings pasa las descripciones a minúsculas: el texto se convierte a mayúsculas una
+# vez y los patrones se compilan sin IGNORECASE, que impide a `re` buscar por prefijo literal.
+
+PATTERNS = {
+    "taskcard": re.compile(r"TASKCARD\s+([A-Z]{2}-\d{3}-\d{2}-\d(?:-\d+)?(?:\s*\(\d+\))?)"),
+    "item": re.compile(r"ITEM-(\d+)"),
+    "work_order": re.compile(r"(?<![A-Z])WO\s*(\d{6,8})"),
+    "location": re.compile(r"((?:AFT|FWD|BULK)\s+CARGO|[RL]/H\s+WING|WINGS?|CABIN|COCKPIT|GALLEY|LAVATORY)\s*:"),
+    "panel_code": re.compile(r"(?:FIN|PANEL)\s+(\d{3}[A-Z]{2})\b"),
+    "part_numbers": re.compile(r"P/N\s*:?\s*([A-Z]{0,2}\d{6,15}[A-Z0-9\-]*?)(?=AMM|[:\s]|$)"),
+    "amm_tasks": re.compile(
+        r"AMM\s*TASK\s*(\d{2}-\d{2}-\d{2}-\d{3}-\d{3}(?:-[A-Z](?=[A-Z]))?)"
+        r"(.*?)(?=AMM\s*TASK|SEND\s*TO|DAMAGES?\s*OUT|SUPPLY|WO\s*\d|$)"
+    ),
+    "amm_revisions": re.compile(r"AMM\s*(\d{2}-\d{2}-\d{2}(?:-\d{3})?)\s*(?:REV\.?\s*(\d+)|PB\s*(\d+))"),
+    "serial_number": re.compile(r"S/N\s*:?\s*([A-Z0-9\-]{3,})"),
+    "finding": re.compile(
+        r"(?:(?:AFT|FWD|BULK)\s+CARGO|[RL]/H\s+WING|WINGS?|CABIN|COCKPIT|GALLEY|LAVATORY)\s*:\s*"
+        r"(.*?)\s*(?=\d{3}[A-Z]{2}\b|P/N|AMM|$)"
+    ),
+    "repair_reference": re.compile(r"(IAW\s+(?!AMM)[A-Z0-9/\-]+?)(?=AMM|[\s.,;]|$)"),
+}
+
+ACTION_PATTERNS = {
+    "send_to_workshop": re.compile(r"SEND\s*TO\s*WORKSHOP"),
+    "damage_out_of_limits": re.compile(r"DAMAGES?\s*OUT\s*OF?\s*LIMITS?"),
+    "supply_new_material": re.compile(r"(?:SUPPLY|SUPPLIED|INSTALL)\s*(?:A\s*)?NEW\s*(?:PANEL|MATERIAL|PART)"),
+}
+
+# Campos que una descripción estructurada de Iberia suele contener; miden la completitud
+SCORED_FIELDS = ["taskcard", "work_order", "location", "panel_code", "part_numbers", "amm_tasks", "finding"]
+
+
+def _first(pattern, text):
+    match = pattern.search(text)
+    return match.group(1).strip() if match else None
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+
+def extract_regex_fields(text):
+    """
+    Extrae con expresiones regulares los campos del esquema de Iberia.
+    Los campos no encontrados quedan a None (o lista vacía).
+    """
+    text = "" if text is None else str(text).upper()
+    result = {}
+    result["taskcard"] = _first(PATTERNS["taskcard"], text)
+    work_order = _first(PATTERNS["work_order"], text)
+    result["work_order"] = f"WO{work_order}" if work_order else None
+    result["location"] = _first(PATTERNS["location"], text)
+    result["panel_code"] = _first(PATTERNS["panel_code"], text)
+    result["part_numbers"] = _unique(PATTERNS["part_numbers"].findall(text))
+
+    amm_tasks = {}
+    for task, description in PATTERNS["amm_tasks"].findall(text):
+        if task not in amm_tasks:
+            amm_tasks[task] = " ".join(description.split()) or None
+    result["amm_tasks"] = [{"task": task, "description": desc} for task, desc in amm_tasks.items()]
+
+    result["amm_revisions"] = [
+        {"task": task, "revision": rev if rev else f"PB{pb}"}
+        for task, rev, pb in PATTERNS["amm_revisions"].findall(text)
+    ]
+    result["actions"] = {
+        action: bool(pattern.search(text)) for action, pattern in ACTION_PATTERNS.items()
+    }
+
+    # El hallazgo es el texto entre "<LOCATION>:" y el código de panel, P/N o tarea AMM
+    finding = _first(PATTERNS["finding"], text)
+    result["finding"] = " ".join(finding.split()) if finding else None
+
+    result["item"] = _first(PATTERNS["item"], text)
+    result["fin"] = result["panel_code"]
+    result["serial_number"] = _first(PATTERNS["serial_number"], text)
+    result["repair_reference"] = _first(PATTERNS["repair_reference"], text)
+    return result
+
+
+def _none_if_missing(series):
+    return series.astype(object).where(series.notna(), None)
+
+
+def _collect_matches(series, pattern, build):
+    """
+    Aplica str.findall por columna y transforma las coincidencias de cada fila con `build`.
+    Es equivalente a str.extractall pero sin construir el MultiIndex intermedio.
+    """
+    return [[build(groups) for groups in matches] for matches in series.str.findall(pattern)]
+
+
+def _unique_tasks(tasks):
+    unique = {}
+    for task in tasks:
+        unique.setdefault(task["task"], task)
+    return list(unique.values())
+
+
+def extract_regex_frame(descriptions):
+    """
+    Versión vectorizada de extract_regex_fields sobre una Serie de pandas.
+    Los patrones compilados se aplican por columna con str.extract/findall y
+    cada texto distinto se procesa una sola vez (pd.factorize).
+
+    Returns:
+        DataFrame con una columna por campo (las acciones como columnas booleanas)
+        y el mismo orden de filas que `descriptions`
+    """
+    series = pd.Series(descriptions).reset_index(drop=True).fillna("").astype(str).str.upper()
+    codes, uniques = pd.factorize(series)
+    if len(uniques) < len(series):
+        return _extract_unique_frame(pd.Series(uniques)).take(codes).reset_index(drop=True)
+    return _extract_unique_frame(series)
+
+
+def _extract_unique_frame(series):
+    df = pd.DataFrame(index=series.index)
+
+    df["taskcard"] = _none_if_missing(series.str.extract(PATTERNS["taskcard"], expand=False))
+    work_order = series.str.extract(PATTERNS["work_order"], expand=False)
+    df["work_order"] = _none_if_missing("WO" + work_order)
+    df["location"] = _none_if_missing(series.str.extract(PATTERNS["location"], expand=False).str.strip())
+    df["panel_code"] = _none_if_missing(series.str.extract(PATTERNS["panel_code"], expand=False))
+
+    df["part_numbers"] = [_unique(part_numbers) for part_numbers in series.str.findall(PATTERNS["part_numbers"])]
+    df["amm_tasks"] = [
+        _unique_tasks(tasks)
+        for tasks in _collect_matches(
+            series, PATTERNS["amm_tasks"],
+            lambda groups: {"task": groups[0], "description": " ".join(groups[1].split()) or None},
+        )
+    ]
+    df["amm_revisions"] = _collect_matches(
+        series, PATTERNS["amm_revisions"],
+        lambda groups: {"task": groups[0], "revision": groups[1] if groups[1] else f"PB{groups[2]}"},
+    )
+    for action, pattern in ACTION_PATTERNS.items():
+        df[action] = series.str.contains(pattern)
+
+    finding = series.str.extract(PATTERNS["finding"], expand=False)
+    finding = finding.str.split().str.join(" ")
+    finding = finding.mask(finding == "")
+    df["finding"] = _none_if_missing(finding)
+    df["item"] = _none_if_missing(series.str.extract(PATTERNS["item"], expand=False))
+    df["fin"] = df["panel_code"]
+    df["serial_number"] = _none_if_missing(series.str.extract(PATTERNS["serial_number"], expand=False))
+    df["repair_reference"] = _none_if_missing(series.str.extract(PATTERNS["repair_reference"], expand=False))
+    return df
+
+
+def frame_to_records(df):
+    """Convierte el DataFrame de extract_regex_frame en registros con el esquema del LLM"""
+    actions = list(ACTION_PATTERNS)
+    records = []
+    for row in df.to_dict(orient="records"):
+        row["actions"] = {action: bool(row.pop(action)) for action in actions}
+        records.append(row)
+    return records
+
+
+def completeness_score(record):
+    """Fracción de SCORED_FIELDS con valor en el registro (0.0 - 1.0)"""
+    found = sum(1 for field in SCORED_FIELDS if record.get(field))
+    return found / len(SCORED_FIELDS)
+
+
+def merge_records(regex_record, llm_record):
+    """
+    Combina ambos resultados: los identificadores encontrados por regex se
+    mantienen y el LLM solo completa los campos que faltan.
+    """
+    merged = dict(llm_record or {})
+    for field, value in regex_record.items():
+        if field == "actions":
+            llm_actions = merged.get("actions") or {}
+            merged["actions"] = {
+                action: bool(flag or llm_actions.get(action, False)) for action, flag in value.items()
+            }
+        elif value or field not in merged:
+            merged[field] = value
+    return merged
+
+
+def hybrid_extract(descriptions, llm_extract, min_completeness=0.85, on_batch=None):
+    """
+    Extracción híbrida: primero regex y solo los registros incompletos se envían al LLM.
+
+    Args:
+        descriptions: Lista de descripciones
+        llm_extract: Función lista de descripciones -> lista de resultados LLM (mismo orden).
+            Si se indica on_batch recibe además un callback (índices, resultados) por lote
+        min_completeness: Completitud mínima (ver completeness_score) para no llamar al LLM
+        on_batch: Función (índices, registros) llamada con los registros completos por regex
+            y con cada lote del LLM ya combinado, a medida que terminan. Los registros cuyo
+            resultado LLM llega vacío no se notifican
+
+    Returns:
+        Lista de registros con el esquema que consume process_findings, en orden
+    """
+    records = frame_to_records(extract_regex_frame(descriptions))
+    pending = [i for i, record in enumerate(records) if completeness_score(record) < min_completeness]
+    print(f"Regex: {len(records) - len(pending)} de {len(records)} registros completos; "
+          f"{len(pending)} se envían al LLM")
+
+    if on_batch:
+        pending_set = set(pending)
+        complete = [i for i in range(len(records)) if i not in pending_set]
+        if complete:
+            on_batch(complete, [records[i] for i in complete])
+
+    if pending:
+        pending_descriptions = [descriptions[i] for i in pending]
+        if on_batch:
+            def merge_batch(batch_indices, llm_results):
+                # Un resultado LLM vacío es un fallo: el registro no se notifica (no se da por
+                # terminado en el diario) aunque regex haya encontrado parte de los campos
+                done = [(pending[i], llm_record) for i, llm_record in zip(batch_indices, llm_results) if llm_record]
+                if done:
+                    on_batch([i for i, _ in done], [merge_records(records[i], llm_record) for i, llm_record in done])
+
+            llm_results = llm_extract(pending_descriptions, merge_batch)
+        else:
+            llm_results = llm_extract(pending_descriptions)
+        for index, llm_record in zip(pending, llm_results):
+            records[index] = merge_records(records[index], llm_record)
+    return records
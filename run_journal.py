@@ -0,0 +1,70 @@
+import os
+import json
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'iberia', 'extraction_journal.jsonl')
+
+
+class RunJournal:
+    """
+    Diario de ejecución append-only en JSONL: una línea {"id", "result"} por
+    registro extraído. Se escribe al completar cada lote, de modo que una
+    ejecución interrumpida puede reanudarse sin repetir lo ya procesado.
+
+    Args:
+        path: Ruta del archivo JSONL
+        fsync: Forzar la escritura a disco tras cada lote
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def append_many(self, items):
+        """
+        Añade {id: resultado} al diario (una línea por registro). Los resultados
+        vacíos (fallos de parseo) no se guardan para que se reintenten al reanudar.
+        """
+        lines = "".join(
+            json.dumps({"id": record_id, "result": result}, ensure_ascii=False) + "\n"
+            for record_id, result in items.items() if result
+        )
+        if not lines:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def __iter__(self):
+        """Recorre el diario línea a línea devolviendo (id, resultado)"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Última línea a medio escribir si la ejecución se interrumpió
+                    continue
+                yield entry["id"], entry["result"]
+
+    def load(self, record_ids=None):
+        """
+        Devuelve {id: resultado} de los registros del diario (la última
+        entrada de cada id prevalece). Si se indica record_ids solo se
+        conservan esos registros.
+        """
+        wanted = set(record_ids) if record_ids is not None else None
+        results = {}
+        for record_id, result in self:
+            if wanted is None or record_id in wanted:
+                results[record_id] = result
+        return results
+
+    def reset(self):
+        """Vacía el diario para empezar una ejecución nueva"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,345 @@
+import os
+import re
+import copy
+import json
+import sqlite3
+import threading
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from modules import normalize_description
+from regex_extractor import extract_regex_fields
+
+DEFAULT_SEMANTIC_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'semantic_cache.sqlite')
+
+# Tokens con dígitos (códigos de panel, WO, P/N, taskcards, tareas AMM): se enmascaran para
+# que dos hallazgos que solo difieren en sus identificadores tengan el mismo vector
+_IDENTIFIER_TOKEN = re.compile(r"[A-Z/]*\d[A-Z0-9/\-]*")
+
+# Campos que se toman de la regex de la nueva descripción en lugar del vecino
+SCALAR_IDENTIFIER_FIELDS = ["taskcard", "work_order", "item", "panel_code", "fin", "serial_number"]
+LIST_IDENTIFIER_FIELDS = {"part_numbers": None, "amm_tasks": "task", "amm_revisions": "task"}
+
+
+def mask_identifiers(text):
+    """Texto normalizado en mayúsculas con cada identificador sustituido por '#'"""
+    return _IDENTIFIER_TOKEN.sub("#", normalize_description(text).upper())
+
+
+def _compact(text):
+    return re.sub(r"\s+", "", str(text)).upper()
+
+
+def _identifier_in(value, text):
+    return bool(value) and _compact(value) in text
+
+
+def _identifier_tokens(text):
+    return _IDENTIFIER_TOKEN.findall(normalize_description(text).upper())
+
+
+def _token_translator(neighbour_description, description):
+    """
+    Si ambas descripciones tienen el mismo número de identificadores, los del
+    vecino se corresponden por posición con los de la nueva descripción.
+    Devuelve una función valor del vecino -> valor para la nueva descripción
+    (None si algún identificador del valor no tiene correspondencia).
+    """
+    if neighbour_description is None:
+        return None
+    old_tokens, new_tokens = _identifier_tokens(neighbour_description), _identifier_tokens(description)
+    if len(old_tokens) != len(new_tokens):
+        return None
+    mapping = {}
+    for old, new in zip(old_tokens, new_tokens):
+        if mapping.setdefault(old, new) != new:
+            return None
+
+    def translate(value):
+        if not value:
+            return None
+        value = str(value).upper()
+        tokens = _IDENTIFIER_TOKEN.findall(value)
+        if not tokens or any(token not in mapping for token in tokens):
+            return None
+        return _IDENTIFIER_TOKEN.sub(lambda match: mapping[match.group(0)], value)
+
+    return translate
+
+
+def adapt_record(neighbour_record, description, regex_record=None, neighbour_description=None):
+    """
+    Usa la extracción del vecino como plantilla para una nueva descripción:
+    los identificadores se sustituyen por los que la regex encuentra en la
+    nueva descripción. Los que la regex no encuentra se trasladan por posición
+    desde la descripción del vecino o, si no, solo se conservan cuando aparecen
+    en el texto nuevo.
+    """
+    regex_record = regex_record if regex_record is not None else extract_regex_fields(description)
+    text = _compact(description)
+    translate = _token_translator(neighbour_description, description)
+    record = copy.deepcopy(neighbour_record)
+
+    def carry_over(value):
+        if _identifier_in(value, text):
+            return value
+        return translate(value) if translate else None
+
+    for field in SCALAR_IDENTIFIER_FIELDS:
+        value = regex_record.get(field)
+        if not value:
+            value = carry_over(record.get(field))
+        record[field] = value
+
+    for field, key in LIST_IDENTIFIER_FIELDS.items():
+        values = regex_record.get(field) or []
+        if not values:
+            for value in record.get(field) or []:
+                if key and isinstance(value, dict):
+                    adapted = carry_over(value.get(key))
+                    value = {**value, key: adapted}
+                else:
+                    value = adapted = carry_over(value)
+                if adapted:
+                    values.append(value)
+        record[field] = values
+
+    actions = record.get("actions") or {}
+    record["actions"] = {action: bool(flag or actions.get(action, False))
+                         for action, flag in (regex_record.get("actions") or {}).items()} or actions
+    return record
+
+
+class SemanticCache:
+    """
+    Índice local de descripciones ya extraídas con vectores TF-IDF de n-gramas
+    de caracteres (scikit-learn) sobre el texto con los identificadores
+    enmascarados. Una descripción nueva con un vecino por encima de `threshold`
+    (similitud coseno) reutiliza su extracción con los identificadores
+    corregidos por regex; el resto va al LLM.
+
+    Las descripciones y resultados se guardan en SQLite; el índice se
+    reconstruye en memoria cuando cambia. Cada caché solo ve las entradas de
+    su `namespace`: las extracciones de otro prompt o modelo no se reutilizan.
+
+    Args:
+        path: Ruta del archivo SQLite (None = solo en memoria)
+        threshold: Similitud mínima para reutilizar la extracción del vecino
+        ngram_range: Longitudes de los n-gramas de caracteres
+        namespace: Hash del prompt, modelo y temperatura de las extracciones
+            (modules_ai.extraction_namespace)
+    """
+
+    def __init__(self, path=DEFAULT_SEMANTIC_CACHE_PATH, threshold=0.9, ngram_range=(3, 5), namespace=""):
+        self.path = path
+        self.threshold = threshold
+        self.ngram_range = ngram_range
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._descriptions = []
+        self._records = []
+        self._vectorizer = None
+        self._matrix = None
+        self._conn = None
+        if path is not None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._create_table()
+            rows = self._conn.execute("SELECT key, description, result FROM semantic_cache WHERE namespace = ?",
+                                      (namespace,))
+            for key, description, result in rows:
+                self._store(key, description, json.loads(result))
+
+    def _create_table(self):
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(semantic_cache)")]
+        if columns and "namespace" not in columns:
+            # Las entradas anteriores no tienen namespace: quedan en el namespace vacío
+            self._conn.execute("ALTER TABLE semantic_cache RENAME TO semantic_cache_old")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " description TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        if columns and "namespace" not in columns:
+            self._conn.execute("INSERT INTO semantic_cache (namespace, key, description, result)"
+                               " SELECT '', key, description, result FROM semantic_cache_old")
+            self._conn.execute("DROP TABLE semantic_cache_old")
+        self._conn.commit()
+
+    def __len__(self):
+        return len(self._descriptions)
+
+    def _store(self, key, description, record):
+        if key in self._keys:
+            self._records[self._keys[key]] = record
+        else:
+            self._keys[key] = len(self._descriptions)
+            self._descriptions.append(description)
+            self._records.append(record)
+        self._matrix = None
+
+    def add_many(self, descriptions, records):
+        """Añade descripciones ya extraídas; los resultados vacíos (fallos) no se indexan"""
+        rows = []
+        with self._lock:
+            for description, record in zip(descriptions, records):
+                if not record:
+                    continue
+                key = normalize_description(description)
+                self._store(key, description, record)
+                rows.append((self.namespace, key, description, json.dumps(record, ensure_ascii=False)))
+            if self._conn is not None and rows:
+                self._conn.executemany("INSERT OR REPLACE INTO semantic_cache (namespace, key, description, result)"
+                                       " VALUES (?, ?, ?, ?)", rows)
+                self._conn.commit()
+
+    def _index(self):
+        if self._matrix is None:
+            self._vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=self.ngram_range,
+                                               sublinear_tf=True, dtype=np.float32)
+            self._matrix = self._vectorizer.fit_transform([mask_identifiers(d) for d in self._descriptions])
+        return self._vectorizer, self._matrix
+
+    def nearest(self, descriptions, chunk_size=1024):
+        """
+        Vecino más parecido de cada descripción.
+
+        Returns:
+            (índices de los vecinos en el caché, similitudes coseno) como arrays numpy;
+            -1 y 0 para las descripciones sin ningún n-grama en común con el caché
+        """
+        if not self._descriptions or not descriptions:
+            return np.full(len(descriptions), -1), np.zeros(len(descriptions), dtype=np.float32)
+        with self._lock:
+            vectorizer, matrix = self._index()
+        queries = vectorizer.transform([mask_identifiers(d) for d in descriptions])
+        neighbours = np.full(len(descriptions), -1)
+        similarities = np.zeros(len(descriptions), dtype=np.float32)
+        # Los vectores TF-IDF están normalizados (L2): el producto escalar es la similitud coseno.
+        # El producto se mantiene disperso y el máximo de cada fila se toma de sus valores no nulos
+        for start in range(0, queries.shape[0], chunk_size):
+            scores = (queries[start:start + chunk_size] @ matrix.T).tocsr()
+            for row in range(scores.shape[0]):
+                begin, end = scores.indptr[row], scores.indptr[row + 1]
+                if begin < end:
+                    best = begin + scores.data[begin:end].argmax()
+                    neighbours[start + row] = scores.indices[best]
+                    similarities[start + row] = scores.data[best]
+        return neighbours, similarities
+
+    def lookup(self, descriptions, regex_records=None):
+        """
+        Returns:
+            Lista con el registro adaptado del vecino para las descripciones por
+            encima del umbral y None para las que deben ir al LLM
+        """
+        neighbours, similarities = self.nearest(descriptions)
+        results = []
+        for i, (description, neighbour, similarity) in enumerate(zip(descriptions, neighbours, similarities)):
+            if neighbour >= 0 and similarity >= self.threshold:
+                regex_record = regex_records[i] if regex_records is not None else None
+                results.append(adapt_record(self._records[neighbour], description, regex_record,
+                                            neighbour_description=self._descriptions[neighbour]))
+                self.hits += 1
+            else:
+                results.append(None)
+                self.misses += 1
+        return results
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+def semantic_extract(descriptions, llm_extract, cache, on_batch=None):
+    """
+    Reutiliza la extracción de descripciones casi idénticas ya procesadas y
+    envía al LLM solo las que no tienen un vecino por encima del umbral. Los
+    resultados del LLM se añaden al índice.
+
+    Args:
+        descriptions: Lista de descripciones
+        llm_extract: Función lista de descripciones -> lista de resultados (mismo orden).
+            Si se indica on_batch recibe además un callback (índices, resultados) por lote
+        cache: SemanticCache
+        on_batch: Función (índices, resultados) llamada con los aciertos y con cada lote del LLM
+
+    Returns:
+        Lista de resultados en el mismo orden que `descriptions`
+    """
+    results = cache.lookup(descriptions)
+    reused = [i for i, result in enumerate(results) if result is not None]
+    pending = [i for i, result in enumerate(results) if result is None]
+    print(f"Caché semántica: {len(reused)} de {len(descriptions)} descripciones reutilizan un vecino "
+          f"(umbral {cache.threshold}); {len(pending)} se envían al LLM")
+    if on_batch and reused:
+        on_batch(reused, [results[i] for i in reused])
+
+    if pending:
+        pending_descriptions = [descriptions[i] for i in pending]
+        if on_batch:
+            def pending_batch(batch_indices, llm_results):
+                on_batch([pending[i] for i in batch_indices], llm_results)
+
+            llm_results = llm_extract(pending_descriptions, pending_batch)
+        else:
+            llm_results = llm_extract(pending_descriptions)
+        for index, result in zip(pending, llm_results):
+            results[index] = result
+        cache.add_many(pending_descriptions, llm_results)
+    return results
+
+
+def record_accuracy(predicted, expected, fields=None):
+    """Fracción de campos iguales entre dos registros (por defecto los del registro esperado)"""
+    fields = fields or list(expected)
+    if not fields:
+        return 1.0
+    return sum(1 for field in fields if predicted.get(field) == expected.get(field)) / len(fields)
+
+
+def evaluate_semantic_cache(descriptions, records, threshold=0.9, test_size=0.2, seed=42):
+    """
+    Evalúa la caché con un conjunto reservado: se indexa el resto y, para las
+    descripciones reservadas, se mide la tasa de aciertos y la exactitud de los
+    registros adaptados frente a la extracción real.
+
+    Returns:
+        dict con hit_rate, field_accuracy (media de campos correctos en los
+        aciertos) y exact_match (fracción de aciertos con el registro idéntico)
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(descriptions))
+    num_test = max(1, int(len(descriptions) * test_size))
+    test, train = order[:num_test], order[num_test:]
+
+    cache = SemanticCache(path=None, threshold=threshold)
+    cache.add_many([descriptions[i] for i in train], [records[i] for i in train])
+    predicted = cache.lookup([descriptions[i] for i in test])
+
+    hits = [(result, records[i]) for result, i in zip(predicted, test) if result is not None]
+    accuracies = [record_accuracy(result, expected) for result, expected in hits]
+    return {
+        "threshold": threshold,
+        "test_size": len(test),
+        "hits": len(hits),
+        "hit_rate": len(hits) / len(test),
+        "field_accuracy": float(np.mean(accuracies)) if accuracies else None,
+        "exact_match": sum(1 for accuracy in accuracies if accuracy == 1.0) / len(hits) if hits else None,
+    }
@@ -0,0 +1,155 @@
+import json
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from fake_openai_server import echo_completion
+
+
+class FakeBatchServer:
+    """
+    Servidor HTTP local con los endpoints de la Batch API (files y batches),
+    tanto en rutas de OpenAI (/v1/...) como de Azure (/openai/...).
+
+    Al crear un batch se procesa cada línea del archivo de entrada con
+    `responder`; el trabajo pasa por validating -> in_progress -> completed
+    en las sucesivas consultas de estado.
+
+    Args:
+        responder: Función prompt -> contenido de la respuesta
+        failing_custom_ids: custom_id cuyas peticiones terminan con error (van al archivo de errores)
+        polls_until_complete: Consultas de estado antes de que el trabajo termine
+    """
+
+    def __init__(self, responder=echo_completion, failing_custom_ids=(), polls_until_complete=2):
+        self.responder = responder
+        self.failing_custom_ids = set(failing_custom_ids)
+        self.polls_until_complete = polls_until_complete
+        self.files = {}
+        self.batches = {}
+        self.polls = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self, "GET", b"")
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                server.handle(self, "POST", self.rfile.read(length))
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, handler, method, body):
+        path = handler.path.split('?', 1)[0]
+        with self._lock:
+            self.requests.append((method, path))
+        if method == "POST" and path.endswith("/files"):
+            return self.send_json(handler, self.upload(handler.headers['Content-Type'], body))
+        if method == "POST" and path.endswith("/batches"):
+            return self.send_json(handler, self.create_batch(json.loads(body)))
+        match = re.search(r"/batches/([^/]+)$", path)
+        if method == "GET" and match:
+            return self.send_json(handler, self.poll(match.group(1)))
+        match = re.search(r"/files/([^/]+)/content$", path)
+        if method == "GET" and match:
+            return self.send_bytes(handler, self.files[match.group(1)]["content"])
+        self.send_json(handler, {"error": {"message": f"ruta no soportada: {method} {path}"}}, status=404)
+
+    def upload(self, content_type, body):
+        message = BytesParser(policy=default_policy).parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+        content, purpose = b"", None
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name == 'file':
+                content = part.get_payload(decode=True)
+            elif name == 'purpose':
+                purpose = part.get_content().strip()
+        return self.store_file(content, purpose)
+
+    def store_file(self, content, purpose):
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = {"content": content, "purpose": purpose}
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": f"{file_id}.jsonl", "purpose": purpose, "status": "processed"}
+
+    def create_batch(self, payload):
+        batch_id = f"batch-{len(self.batches) + 1}"
+        lines = [json.loads(line) for line in self.files[payload["input_file_id"]]["content"].decode().splitlines()
+                 if line.strip()]
+        outputs, errors = [], []
+        for line in lines:
+            custom_id = line["custom_id"]
+            if custom_id in self.failing_custom_ids:
+                errors.append({"id": f"req-{custom_id}", "custom_id": custom_id,
+                               "response": {"status_code": 500, "body": {"error": {"message": "fake error"}}},
+                               "error": None})
+                continue
+            prompt = line["body"]["messages"][-1]["content"]
+            outputs.append({"id": f"req-{custom_id}", "custom_id": custom_id, "error": None, "response": {
+                "status_code": 200, "request_id": custom_id,
+                "body": {"id": "chatcmpl-fake", "object": "chat.completion", "model": line["body"]["model"],
+                         "choices": [{"index": 0, "finish_reason": "stop",
+                                      "message": {"role": "assistant", "content": self.responder(prompt)}}]},
+            }})
+
+        def jsonl(rows):
+            return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": payload["endpoint"],
+            "completion_window": payload["completion_window"], "input_file_id": payload["input_file_id"],
+            "created_at": int(time.time()), "status": "validating",
+            "output_file_id": self.store_file(jsonl(outputs), "batch_output")["id"] if outputs else None,
+            "error_file_id": self.store_file(jsonl(errors), "batch_output")["id"] if errors else None,
+            "request_counts": {"total": len(lines), "completed": len(outputs), "failed": len(errors)},
+            "input_lines": lines,
+        }
+        self.batches[batch_id] = batch
+        self.polls[batch_id] = 0
+        return self.public(batch, "validating")
+
+    def poll(self, batch_id):
+        self.polls[batch_id] += 1
+        status = "completed" if self.polls[batch_id] >= self.polls_until_complete else "in_progress"
+        return self.public(self.batches[batch_id], status)
+
+    @staticmethod
+    def public(batch, status):
+        visible = {key: value for key, value in batch.items() if key != "input_lines"}
+        visible["status"] = status
+        if status != "completed":
+            visible.update(output_file_id=None, error_file_id=None)
+        return visible
+
+    def send_json(self, handler, payload, status=200):
+        self.send_bytes(handler, json.dumps(payload).encode('utf-8'), status, 'application/json')
+
+    def send_bytes(self, handler, data, status=200, content_type='application/octet-stream'):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
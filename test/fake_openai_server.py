@@ -0,0 +1,156 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def echo_completion(prompt):
+    """Respuesta por defecto: un objeto por cada 'Description N:' del prompt"""
+    descriptions = re.findall(r"Description \d+: (.*)", prompt)
+    return json.dumps([{"echo": desc} for desc in descriptions])
+
+
+class FakeOpenAIServer:
+    """
+    Servidor HTTP local compatible con la API de chat completions de OpenAI.
+
+    Args:
+        responder: Función prompt -> contenido o (contenido, finish_reason)
+        delay: Segundos (o función prompt -> segundos) de latencia simulada
+        stream_chunk_size: Caracteres por fragmento en las respuestas con stream=True
+        stream_delay: Segundos entre fragmentos en las respuestas con stream=True
+        fault: Función (número de petición desde 1, body) -> None o (status, cabeceras)
+            para inyectar errores HTTP (429, 503...) en lugar de responder
+    """
+
+    def __init__(self, responder=echo_completion, delay=0.0, stream_chunk_size=16, stream_delay=0.0, fault=None):
+        self.responder = responder
+        self.delay = delay
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_delay = stream_delay
+        self.fault = fault
+        self.requests = []
+        self.request_times = []
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                server.handle(self, body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, handler, body):
+        with self._lock:
+            self.requests.append(body)
+            self.request_times.append(time.monotonic())
+            number = len(self.requests)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            prompt = body.get('messages', [{}])[-1].get('content', '')
+            delay = self.delay(prompt) if callable(self.delay) else self.delay
+            time.sleep(delay)
+            fault = self.fault(number, body) if self.fault else None
+            if fault:
+                status, headers = fault
+                with self._lock:
+                    self.failures += 1
+                self.send_json(handler, status, {"error": {"message": f"fake error {status}", "type": "fake"}}, headers)
+                return
+            response = self.responder(prompt)
+            # El responder puede devolver (contenido, finish_reason) para simular truncados
+            content, finish_reason = response if isinstance(response, tuple) else (response, "stop")
+            if body.get('stream'):
+                self.send_stream(handler, content, finish_reason)
+            else:
+                self.send_json(handler, 200, self.completion(content, finish_reason))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def completion(self, content, finish_reason="stop"):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "fake-model",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def chunk(self, content=None, finish_reason=None):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "fake-model",
+            "choices": [{
+                "index": 0,
+                "delta": {"content": content} if content is not None else {},
+                "finish_reason": finish_reason,
+            }],
+        }
+
+    def send_stream(self, handler, content, finish_reason="stop"):
+        """Envía la respuesta como server-sent events en fragmentos de stream_chunk_size caracteres"""
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+        pieces = [content[i:i+self.stream_chunk_size] for i in range(0, len(content), self.stream_chunk_size)]
+        for piece in pieces:
+            handler.wfile.write(f"data: {json.dumps(self.chunk(piece))}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+            time.sleep(self.stream_delay)
+        handler.wfile.write(f"data: {json.dumps(self.chunk(finish_reason=finish_reason))}\n\n".encode('utf-8'))
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+    def send_json(self, handler, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+def fail_requests(numbers, status=429, headers=None):
+    """fault que devuelve `status` en las peticiones con esos números (desde 1)"""
+    numbers = set(numbers)
+    return lambda number, body: (status, headers or {}) if number in numbers else None
+
+
+def always_fail(status=503):
+    return lambda number, body: (status, {})
@@ -0,0 +1,108 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+import aerlingus_findings_to_db
+from aerlingus_findings_to_db import (iter_aerlingus_chunks, process_aerlingus, create_custom_descriptions, process_results,
+                                      AERLINGUS_PROMPT)
+from extraction_schemas import record_columns
+
+
+def write_exports(tmp_path):
+    first = pd.DataFrame({
+        'work_order_id': ["1", "2", "3"],
+        'ac_model': ["A320"] * 3,
+        'header_text': ["LH WING", None, "CARGO DOOR"],
+        'text_plain': ["PANEL DENTED", "SEAT TORN", None],
+        'action_text': ["PANEL REPLACED", None, "SEAL REPLACED"],
+        'action_comment': [None, "DEFERRED", None],
+    })
+    second = pd.DataFrame({
+        'work_order_id': ["4", "5"],
+        'header_text': ["GALLEY", "LAV"],
+        'text_html': ["OVEN INOP", "TAP LEAKING"],
+        'action_header_text': ["OVEN", None],
+        'unused': ["x", "y"],
+    })
+    paths = [str(tmp_path / "v0_1.csv"), str(tmp_path / "v0_2.csv")]
+    first.to_csv(paths[0], index=False)
+    second.to_csv(paths[1], index=False)
+    return paths, pd.concat([first, second], ignore_index=True)
+
+
+def test_chunks_project_columns_and_match_full_load(tmp_path):
+    paths, full = write_exports(tmp_path)
+
+    chunks = list(iter_aerlingus_chunks(paths, chunksize=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1, 2]
+    assert all('ac_model' not in chunk.columns and 'unused' not in chunk.columns for chunk in chunks)
+    streamed = pd.concat(chunks, ignore_index=True)
+    expected = create_custom_descriptions(full.reindex(columns=streamed.columns.drop(
+        ['description_custom', 'action_custom', 'source_file'])))
+    assert streamed['description_custom'].tolist() == expected['description_custom'].tolist()
+    assert streamed['action_custom'].tolist() == expected['action_custom'].tolist()
+    assert streamed['source_file'].tolist() == ["v0_1.csv"] * 3 + ["v0_2.csv"] * 2
+
+
+def test_streamed_output_is_written_incrementally(tmp_path):
+    paths, _ = write_exports(tmp_path)
+    output_file = str(tmp_path / "out" / "processed.csv")
+
+    total = process_aerlingus(use_llm=False, max_records=4, file_paths=paths, chunksize=2, output_file=output_file)
+
+    output = pd.read_csv(output_file)
+    assert total == 4
+    assert output['work_order_id'].tolist() == [1, 2, 3, 4]
+    assert output['description_custom'].tolist()[0] == "LH WING PANEL DENTED"
+
+
+def test_llm_columns_missing_from_the_first_chunk_are_kept(tmp_path, monkeypatch):
+    paths, _ = write_exports(tmp_path)
+    output_file = str(tmp_path / "processed.csv")
+
+    # Las peticiones del primer bloque fallan: ese bloque no tiene ninguna columna llm_
+    def extract(descriptions, **kwargs):
+        return [{"component": d.split()[0]} if "GALLEY" in d or "LAV" in d else {} for d in descriptions]
+    monkeypatch.setattr(aerlingus_findings_to_db, 'parse_descriptions_bulk_batched', extract)
+
+    process_aerlingus(use_llm=True, file_paths=paths, chunksize=3, output_file=output_file)
+
+    output = pd.read_csv(output_file)
+    assert [col for col in output.columns if col.startswith('llm_')] == record_columns(AERLINGUS_PROMPT, 'llm_')
+    assert output['llm_component'].tolist()[3:] == ["GALLEY", "LAV"]
+    assert output['llm_component'].iloc[:3].isna().all()
+
+
+def test_custom_descriptions_strip_html_and_skip_empty_values():
+    df = pd.DataFrame({
+        'header_text': ["  LH WING ", None, "nan", 12],
+        'text_plain': ["", "SEAT TORN", None, None],
+        'text_html': ["<p>PANEL <b>DENTED</b></p>", "<style>p {}</style>LAV &amp; GALLEY", None, "<br/>"],
+        'action_header_text': [None, None, None, None],
+        'action_text': ["REPLACED", "", None, "  "],
+        'action_comment': ["IAW SRM", None, None, None],
+    })
+
+    result = create_custom_descriptions(df)
+
+    assert result['description_custom'].tolist() == ["LH WING PANEL DENTED", "SEAT TORN LAV & GALLEY", "", "12"]
+    assert result['action_custom'].tolist() == ["REPLACED IAW SRM", "", "", ""]
+
+
+def test_results_are_joined_once_and_keep_their_types():
+    df = pd.DataFrame({'description_custom': ["LH WING PANEL DENTED", "", "SEAT TORN"]}, index=[10, 11, 12])
+    with_content = df.loc[[10, 12]]
+    results = [
+        {"component": "PANEL", "finding_related": True, "findings": ["DENT"], "amm_revisions": [{"task": "57-10", "revision": "3"}]},
+        {"component": "SEAT", "finding_related": False, "findings": [], "result": {"status": "OK"}},
+    ]
+
+    merged = process_results(df, with_content, results, [None, None])
+
+    assert merged.loc[10, 'llm_findings'] == ["DENT"]
+    assert merged.loc[10, 'llm_amm_revisions'] == [{"task": "57-10", "revision": "3"}]
+    assert merged.loc[12, 'llm_result_status'] == "OK"
+    assert merged.loc[[10, 12], 'llm_finding_related'].tolist() == [True, False]
+    assert merged['llm_component'].isna().tolist() == [False, True, False]
@@ -0,0 +1,58 @@
+import sys
+import os
+import json
+import re
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import modules_ai
+import llm_clients
+from batch_packing import count_tokens, pack_batches
+from fake_openai_server import FakeOpenAIServer
+
+
+def test_batches_respect_input_budget_and_order():
+    descriptions = ["short finding"] * 10 + ["long finding " * 200] + ["short finding"] * 3
+    template = "Extract:{description}"
+
+    batches = pack_batches(descriptions, template, max_input_tokens=300, output_tokens_per_item=0)
+
+    assert [i for batch in batches for i in batch] == list(range(len(descriptions)))
+    assert [10] in batches
+    for batch in batches:
+        if batch != [10]:
+            tokens = count_tokens("Extract:") + sum(count_tokens(descriptions[i]) + 6 for i in batch)
+            assert tokens <= 300
+
+
+def test_batches_respect_output_budget_and_max_size():
+    batches = pack_batches(["x"] * 10, "{description}", max_output_tokens=1000,
+                           output_tokens_per_item=300, max_batch_size=2)
+
+    assert all(len(batch) <= 2 for batch in batches)
+    assert len(batches) == 5
+
+
+def test_truncated_batches_are_split_and_retried(monkeypatch, tmp_path):
+    (tmp_path / 'prompts').mkdir()
+    (tmp_path / 'prompts' / 'echo.txt').write_text("Extract:{description}", encoding='utf-8')
+    monkeypatch.setattr(modules_ai, '__file__', str(tmp_path / 'modules_ai.py'))
+
+    def responder(prompt):
+        descriptions = re.findall(r"Description \d+: (.*)", prompt)
+        content = json.dumps([{"echo": desc} for desc in descriptions])
+        if len(descriptions) > 1:
+            return content[:len(content) // 2], "length"
+        return content, "stop"
+
+    with FakeOpenAIServer(responder) as server:
+        monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+        monkeypatch.setenv('OPENROUTER_BASE_URL', server.base_url)
+        llm_clients.reset_providers()
+        results = modules_ai.parse_descriptions_bulk_batched(
+            ["a", "b", "c"], batch_size=3, prompt_template='echo.txt', deepseek=True,
+            use_cache=False, max_output_tokens=4000, output_tokens_per_item=10
+        )
+
+    assert [r['echo'] for r in results] == ["a", "b", "c"]
+    assert server.requests[0]['max_tokens'] == 4000
@@ -0,0 +1,67 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+from defect_codes import DefectCodeNormalizer, CodeTrie, canonical_code
+from settings import defect_code_dict
+
+
+def test_spacing_and_case_variants_resolve_to_the_same_code():
+    normalizer = DefectCodeNormalizer(defect_code_dict)
+
+    assert canonical_code("  sp :  cracks & dents ") == "SP:CRACKS&DENTS"
+    assert normalizer.resolve_with_method("SP:CRACKS") == ("SIDEWALL PANEL CRACKS", "exact")
+    assert normalizer.resolve_with_method("sp:cracks") == ("SIDEWALL PANEL CRACKS", "exact")
+    assert normalizer.resolve_with_method("SP : CRACKS") == ("SIDEWALL PANEL CRACKS", "canonical")
+    assert normalizer.resolve("cp: damaged") == "CEILING PANEL DAMAGED"
+
+
+def test_fuzzy_fallback_is_bounded_and_rejects_ambiguous_matches():
+    normalizer = DefectCodeNormalizer(defect_code_dict)
+
+    assert normalizer.resolve_with_method("PLUG:DAMAGED") == ("PLUG DAMAGED", "fuzzy")
+    assert normalizer.resolve("SP:CRAKS") == "SIDEWALL PANEL CRACKS"
+    # Códigos cortos: sin búsqueda aproximada ("Q" no es "C")
+    assert normalizer.resolve("Q") is None
+    # A distancia 1 de "S:B/D" y de "B:B/D", con traducciones distintas
+    assert normalizer.resolve("N:B/D") is None
+    # Claves que solo difieren en espacios y traducen distinto: solo coincidencia exacta
+    assert normalizer.resolve("P: BAD CONDITION") == "PARTITION PANEL BAD CONDITION"
+    assert normalizer.resolve("P:BAD CONDITION") == "FIXED FLAP-TRACK FAIRING PAINT IN BAD CONDITION"
+    assert normalizer.resolve("P : BAD CONDITION") is None
+
+
+def test_trie_search_matches_brute_force_edit_distance():
+    def levenshtein(a, b):
+        row = list(range(len(b) + 1))
+        for i, char in enumerate(a, 1):
+            previous, row[0] = row[0], i
+            for j in range(1, len(b) + 1):
+                previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (char != b[j - 1]))
+        return row[-1]
+
+    keys = [canonical_code(code) for code in defect_code_dict]
+    trie = CodeTrie(keys)
+    for word in ["SP:CRAKS", "EW_C:OL", "S:DAMGED", "LEAKSS", "ZZZZ"]:
+        expected = sorted((levenshtein(word, key), key) for key in set(keys) if levenshtein(word, key) <= 2)
+        assert trie.search(word, 2) == expected
+
+
+def test_normalize_resolves_each_distinct_code_once_and_reports_unmapped():
+    normalizer = DefectCodeNormalizer(defect_code_dict)
+    calls = []
+    resolve = normalizer.resolve
+    normalizer.resolve = lambda code: calls.append(code) or resolve(code)
+    reasons = pd.Series(["SP:CRACKS", "XYZ", None, "sp: cracks", "XYZ", "SP:CRACKS", "FOO BAR"] * 100,
+                        index=range(100, 800), name="Reason")
+
+    translated, unmapped = normalizer.normalize(reasons)
+
+    assert sorted(calls) == sorted(["SP:CRACKS", "XYZ", "sp: cracks", "FOO BAR"])
+    assert isinstance(translated.dtype, pd.CategoricalDtype)
+    assert translated.index.equals(reasons.index) and translated.name == "Reason"
+    expected = reasons.map(lambda code: None if code is None else normalizer.resolve(code))
+    assert translated.astype(object).where(translated.notna(), None).tolist() == expected.tolist()
+    assert unmapped.to_dict() == {"XYZ": 200, "FOO BAR": 100}
+    assert list(unmapped.index) == ["XYZ", "FOO BAR"]
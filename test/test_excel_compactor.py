@@ -0,0 +1,84 @@
+import sys
+import os
+import importlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+import pytest
+import excel_compactor
+
+SHEETS = ["TB3", "TB1", "TB2", "TB5", "TB4"]
+
+
+def write_workbook(path, rows_per_sheet=3):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for n, sheet in enumerate(SHEETS):
+            pd.DataFrame({
+                'Description': [f"{sheet} panel {i} dented" for i in range(rows_per_sheet)],
+                # W/O mezcla números y texto como en el Excel original
+                'W/O': [8019242 + i if i % 2 else f"80192{i}A" for i in range(rows_per_sheet)],
+                'A/C': ["EC-MXV"] * rows_per_sheet,
+                'Date': pd.date_range("2024-03-01", periods=rows_per_sheet),
+                'ATA': ["25"] * rows_per_sheet,
+                'Flags': ["NRC"] * rows_per_sheet,
+                'Non-Relevant': [False] * rows_per_sheet,
+                'Reason': ["SP:CRACKS"] * rows_per_sheet,
+            }).to_excel(writer, sheet_name=sheet, index=False)
+    return str(path)
+
+
+def test_parallel_read_matches_sequential_read(tmp_path):
+    path = write_workbook(tmp_path / "findings.xlsx")
+
+    parallel = excel_compactor.concat_sheets_with_taskbar_id(path, max_workers=2, engine="openpyxl")
+    sequential = excel_compactor.concat_sheets_with_taskbar_id(path, max_workers=1, engine="openpyxl")
+
+    pd.testing.assert_frame_equal(parallel, sequential)
+    assert isinstance(parallel['taskbar_id'].dtype, pd.CategoricalDtype)
+    assert list(parallel['taskbar_id'].cat.categories) == SHEETS
+    assert parallel['taskbar_id'].astype(str).tolist() == [sheet for sheet in SHEETS for _ in range(3)]
+
+
+def test_mixed_type_columns_become_text():
+    df = pd.DataFrame({'W/O': [8019242, "8019243A", None], 'ATA': ["25", "52", None]})
+
+    safe = excel_compactor._columnar_safe(df)
+
+    assert safe['W/O'].tolist()[:2] == ["8019242", "8019243A"] and pd.isna(safe['W/O'].iloc[2])
+    assert safe['ATA'].equals(df['ATA'])
+
+
+def test_intermediate_is_cached_until_the_workbook_changes(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    path = write_workbook(tmp_path / "findings.xlsx")
+    intermediate = str(tmp_path / "findings.parquet")
+
+    first = excel_compactor.compact_findings(path, intermediate, max_workers=1)
+    monkeypatch.setattr(excel_compactor, 'concat_sheets_with_taskbar_id', lambda *args, **kwargs: pytest.fail())
+    cached = excel_compactor.compact_findings(path, intermediate)
+
+    assert isinstance(cached['taskbar_id'].dtype, pd.CategoricalDtype)
+    assert len(cached) == len(first) == 15
+
+
+@pytest.mark.parametrize("extension", [".xlsx", ".parquet"])
+def test_process_findings_reads_the_compacted_file(tmp_path, monkeypatch, extension):
+    if extension != ".xlsx":
+        pytest.importorskip("pyarrow")
+    findings = excel_compactor.concat_sheets_with_taskbar_id(write_workbook(tmp_path / "source.xlsx", 25),
+                                                              max_workers=1)
+    path = str(tmp_path / f"compacted{extension}")
+    if extension == ".xlsx":
+        findings.to_excel(path, index=False, sheet_name='Sheet1')
+    else:
+        excel_compactor.write_intermediate(findings, path)
+    monkeypatch.chdir(tmp_path)
+    iberia = importlib.import_module('iberia_findings_to_db')
+    loaded = {}
+    monkeypatch.setattr(iberia, 'get_information_parsed_from_llm', lambda descriptions, **kwargs: [{}] * len(descriptions))
+    monkeypatch.setattr(iberia, 'bulk_load_findings', lambda df, parsed: loaded.update(df=df))
+
+    iberia.process_findings(path)
+
+    assert len(loaded['df']) == 100
+    assert set(loaded['df']['taskbar_id'].astype(str)) <= set(SHEETS)
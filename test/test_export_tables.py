@@ -0,0 +1,120 @@
+import sys
+import os
+import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, insert, update, text
+import export_tables_to_csv as exporter
+from models import Base, Taskbar, WorkOrder
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "aircraft.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Taskbar), [
+            {"taskbar_id": f"TB{i}", "wo_number": f"80{i}", "part_numbers": "P1, P2" if i % 2 else None,
+             "send_to_workshop": bool(i % 3) if i % 4 else None, "finding": f'PANEL "{i}", DENTED'}
+            for i in range(7)
+        ])
+        connection.execute(insert(WorkOrder), [
+            {"taskbar_id": f"TB{i}", "wo_number": f"80{i}", "date": datetime.date(2024, 3, i + 1), "ata": "25",
+             "non_relevant": i % 2 == 0}
+            for i in range(5)
+        ])
+    engine.dispose()
+    return str(path)
+
+
+def test_tables_are_read_in_bounded_chunks(db_path):
+    engine = exporter.get_engine(db_path)
+    table = exporter._reflect_table('finding_description_tasks', engine)
+
+    chunks = list(exporter.iter_table_chunks(table, engine, chunk_size=3))
+
+    assert [len(rows) for rows in chunks] == [3, 3, 1]
+
+
+def test_streamed_csv_matches_full_table_export(db_path, tmp_path):
+    result = exporter.export_table_to_csv('finding_work_orders', db_path, str(tmp_path / "out"), chunk_size=2)
+
+    expected = pd.read_sql_table('finding_work_orders', create_engine(f"sqlite:///{db_path}"))
+    expected_path = tmp_path / "expected.csv"
+    expected.to_csv(expected_path, index=False, encoding='utf-8')
+    assert result["rows"] == 5
+    assert open(result["path"], encoding='utf-8').read() == open(expected_path, encoding='utf-8').read()
+    assert not os.path.exists(result["path"] + ".tmp")
+
+
+def test_all_tables_are_exported_in_parallel(db_path, tmp_path):
+    output_dir = tmp_path / "out"
+
+    exported = exporter.export_all_tables(db_path, str(output_dir), chunk_size=2, max_workers=2)
+
+    assert sorted(exported) == sorted(Base.metadata.tables)
+    tasks = pd.read_csv(output_dir / "finding_description_tasks.csv")
+    assert len(tasks) == 7
+    assert tasks.loc[1, "finding"] == 'PANEL "1", DENTED'
+
+
+def test_parquet_uses_model_types(db_path, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import pyarrow as pa
+
+    result = exporter.export_table_to_csv('finding_work_orders', db_path, str(tmp_path / "out"), format='parquet',
+                                          chunk_size=2)
+
+    table = pq.read_table(result["path"])
+    assert table.num_rows == 5
+    assert table.schema.field("date").type == pa.date32()
+    assert table.schema.field("non_relevant").type == pa.bool_()
+    assert table.schema.field("id").type == pa.int64()
+
+
+def test_unknown_format_is_rejected(db_path, tmp_path):
+    with pytest.raises(ValueError):
+        exporter.export_table_to_csv('finding_work_orders', db_path, str(tmp_path), format='xlsx')
+
+
+def test_incremental_export_writes_only_the_delta(db_path, tmp_path):
+    output_dir = str(tmp_path / "out")
+    first = exporter.export_table_incremental('finding_description_tasks', db_path, output_dir, chunk_size=3,
+                                              ingest_date="2024-03-01")
+    unchanged = exporter.export_table_incremental('finding_description_tasks', db_path, output_dir,
+                                                  ingest_date="2024-03-01")
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as connection:
+        connection.execute(insert(Taskbar), [{"taskbar_id": "TB7", "wo_number": "807"}])
+        connection.execute(update(Taskbar).where(Taskbar.taskbar_id == "TB2").values(finding="REPAIRED"))
+    delta = exporter.export_table_incremental('finding_description_tasks', db_path, output_dir, chunk_size=3,
+                                              ingest_date="2024-03-02")
+
+    assert first["rows"] == 7 and first["path"].endswith(os.path.join("ingest_date=2024-03-01", "part-full.csv"))
+    assert unchanged["rows"] == 0 and unchanged["path"] is None
+    rows = pd.read_csv(delta["path"])
+    assert sorted(rows["taskbar_id"]) == ["TB2", "TB7"]
+    assert rows.set_index("taskbar_id").loc["TB2", "finding"] == "REPAIRED"
+    assert exporter.load_watermarks(output_dir)["finding_description_tasks"] == delta["watermark"]
+
+
+def test_tables_without_updated_at_use_the_id(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE legacy (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("INSERT INTO legacy (name) VALUES ('a'), ('b')"))
+    output_dir = str(tmp_path / "out")
+
+    exporter.export_all_tables(db_path, output_dir, incremental=True)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO legacy (name) VALUES ('c')"))
+    result = exporter.export_table_incremental('legacy', db_path, output_dir)
+
+    assert result["watermark"] == {"column": "id", "id": 3}
+    assert pd.read_csv(result["path"])["name"].tolist() == ["c"]
+    assert os.path.basename(result["path"]) == "part-after-2.csv"
@@ -0,0 +1,310 @@
+import sys
+import os
+import importlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, inspect, select, text
+from sqlalchemy.orm import sessionmaker
+from test_regex_extractor import IBERIA_EXAMPLE
+from regex_extractor import extract_regex_fields
+from models import Taskbar, WorkOrder, FindingPartNumber, FindingAmmTask
+
+
+@pytest.fixture
+def iberia():
+    return importlib.import_module('iberia_findings_to_db')
+
+
+def findings_frame():
+    return pd.DataFrame({
+        'taskbar_id': ["TB1", "TB2", "TB3"],
+        'Description': [IBERIA_EXAMPLE.lower(), "cabin: seat damaged", None],
+        'W/O': ["8019242", "8019243", "8019244"],
+        'A/C': ["EC-MXV", "EC-NIG", "EC-LUB"],
+        'Date': [pd.Timestamp("2024-03-01"), pd.Timestamp("2024-03-02"), pd.Timestamp("2024-03-03")],
+        'ATA': ["25", "25", "52"],
+        'Flags': ["NRC", None, "NRC"],
+        'Non-Relevant': [False, True, None],
+        'Reason': ["damaged", None, "worn"],
+    })
+
+
+def new_engine(iberia, path):
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", iberia.set_sqlite_pragmas)
+    iberia.Base.metadata.create_all(engine)
+    return engine
+
+
+def dump(engine):
+    # updated_at depende del momento de la carga: no forma parte del contenido comparado
+    def rows(model):
+        columns = [column for column in model.__table__.columns if column.name != 'updated_at']
+        return connection.execute(select(*columns).order_by(model.id)).fetchall()
+
+    with engine.connect() as connection:
+        return rows(Taskbar), rows(WorkOrder)
+
+
+def dump_children(engine):
+    with engine.connect() as connection:
+        return (
+            connection.execute(select(FindingPartNumber.__table__).order_by(FindingPartNumber.id)).fetchall(),
+            connection.execute(select(FindingAmmTask.__table__).order_by(FindingAmmTask.id)).fetchall(),
+        )
+
+
+def test_bulk_load_matches_row_by_row(iberia, tmp_path):
+    df = findings_frame()
+    # El último registro no tiene resultado de extracción
+    parsed = [extract_regex_fields(desc) for desc in df['Description'][:2]]
+
+    row_engine = new_engine(iberia, tmp_path / "row.db")
+    session = sessionmaker(bind=row_engine)()
+    iberia.load_findings_row_by_row(df, parsed, session)
+    session.close()
+
+    bulk_engine = new_engine(iberia, tmp_path / "bulk.db")
+    assert iberia.bulk_load_findings(df, parsed, db_engine=bulk_engine, chunk_size=2) == 6
+
+    assert dump(bulk_engine) == dump(row_engine)
+    assert dump_children(bulk_engine) == dump_children(row_engine)
+    taskbars, work_orders = dump(bulk_engine)
+    assert [row.finding_id for row in work_orders] == [row.id for row in taskbars]
+    part_numbers, amm_tasks = dump_children(bulk_engine)
+    assert [(row.finding_id, row.part_number) for row in part_numbers] == [
+        (taskbars[0].id, pn) for pn in parsed[0]['part_numbers']]
+    assert [row.task for row in amm_tasks] == [task['task'] for task in parsed[0]['amm_tasks']]
+    with bulk_engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+
+
+def test_row_by_row_load_continues_after_a_duplicate_key(iberia, tmp_path):
+    engine = new_engine(iberia, tmp_path / "row.db")
+    df = findings_frame().iloc[[0, 1, 1, 2]].reset_index(drop=True)
+    session = sessionmaker(bind=engine)()
+    iberia.load_findings_row_by_row(df, [{} for _ in range(len(df))], session)
+    session.close()
+
+    # La fila repetida falla por la clave única; la anterior y la siguiente se cargan con su orden de trabajo
+    taskbars, work_orders = dump(engine)
+    assert [row.taskbar_id for row in taskbars] == ["TB1", "TB2", "TB3"]
+    assert [row.finding_id for row in work_orders] == [row.id for row in taskbars]
+
+
+def test_repeated_bulk_load_skips_stored_findings(iberia, tmp_path):
+    engine = new_engine(iberia, tmp_path / "bulk.db")
+    df = findings_frame()
+    parsed = [extract_regex_fields(desc) for desc in df['Description']]
+    iberia.bulk_load_findings(df, parsed, db_engine=engine)
+    first, first_children = dump(engine), dump_children(engine)
+
+    assert iberia.bulk_load_findings(df, parsed, db_engine=engine) == 0
+    assert dump(engine) == first and dump_children(engine) == first_children
+
+    extended = pd.concat([df, df.iloc[[1]].assign(Description="cabin: seat replaced")], ignore_index=True)
+    assert iberia.bulk_load_findings(extended, parsed + [{}], db_engine=engine) == 2
+    assert len(dump(engine)[0]) == 4
+
+
+def test_incremental_upsert_only_touches_changed_rows(iberia, tmp_path):
+    engine = new_engine(iberia, tmp_path / "incremental.db")
+    df = findings_frame()
+    parsed = [extract_regex_fields(desc) for desc in df['Description']]
+    iberia.upsert_findings(df, parsed, db_engine=engine)
+    first = dump(engine)
+
+    # Repetir la carga no duplica filas y ninguna fila queda pendiente de extraer
+    assert iberia.find_unchanged_findings(df, db_engine=engine).all()
+    iberia.upsert_findings(df, parsed, db_engine=engine)
+    assert [row[1:] for row in dump(engine)[0]] == [row[1:] for row in first[0]]
+
+    changed = df.copy()
+    changed.loc[1, 'Description'] = "cabin: seat replaced"
+    unchanged = iberia.find_unchanged_findings(changed, db_engine=engine)
+    assert unchanged.tolist() == [True, False, True]
+
+    delta = changed[~unchanged].reset_index(drop=True)
+    iberia.upsert_findings(delta, [extract_regex_fields(desc) for desc in delta['Description']], db_engine=engine)
+    taskbars, work_orders = dump(engine)
+    # La descripción modificada entra como hallazgo nuevo; la versión anterior se conserva
+    assert sorted(row.raw_description or "" for row in taskbars) == sorted(
+        desc or "" for desc in [*df['Description'], "cabin: seat replaced"])
+    assert len(work_orders) == 4
+    # Cada hallazgo tiene su orden de trabajo y los P/N no se duplican al repetir la carga
+    assert sorted(row.finding_id for row in work_orders) == sorted(row.id for row in taskbars)
+    part_numbers, _ = dump_children(engine)
+    assert sorted(row.part_number for row in part_numbers) == sorted(parsed[0]['part_numbers'])
+    assert {row.finding_id for row in part_numbers} <= {row.id for row in taskbars}
+
+
+def test_upsert_keeps_sibling_findings_of_a_work_order(iberia, tmp_path):
+    engine = new_engine(iberia, tmp_path / "siblings.db")
+    df = findings_frame().iloc[[1, 1]].reset_index(drop=True)
+    df['Description'] = ["desc a", "desc b"]
+    parsed = [{"finding": desc} for desc in df['Description']]
+    iberia.upsert_findings(df, parsed, db_engine=engine)
+    iberia.upsert_findings(df.iloc[[0]], parsed[:1], db_engine=engine)
+
+    added = df.iloc[[0]].assign(Description="desc c")
+    iberia.upsert_findings(added, [{"finding": "desc c"}], db_engine=engine)
+
+    taskbars, work_orders = dump(engine)
+    assert [row.raw_description for row in taskbars] == ["desc a", "desc b", "desc c"]
+    assert sorted(row.finding_id for row in work_orders) == [row.id for row in taskbars]
+
+
+def test_upsert_writes_the_children_of_a_repeated_key_once(iberia, tmp_path):
+    engine = new_engine(iberia, tmp_path / "repeated.db")
+    df = findings_frame().iloc[[1, 1]].reset_index(drop=True)
+    parsed = [{"part_numbers": ["P1"]}, {"part_numbers": ["P2", "P3"]}]
+    iberia.upsert_findings(df, parsed, db_engine=engine)
+
+    taskbars, _ = dump(engine)
+    part_numbers, _ = dump_children(engine)
+    # La última fila de la clave es la que queda en Taskbar: sus P/N se escriben una sola vez
+    assert len(taskbars) == 1
+    assert [(row.finding_id, row.position, row.part_number) for row in part_numbers] == [
+        (taskbars[0].id, 0, "P2"), (taskbars[0].id, 1, "P3")]
+
+
+def test_deleting_a_finding_cascades_to_its_rows(iberia, tmp_path):
+    engine = new_engine(iberia, tmp_path / "cascade.db")
+    df = findings_frame()
+    iberia.bulk_load_findings(df, [extract_regex_fields(desc) for desc in df['Description'][:2]], db_engine=engine)
+    taskbars, _ = dump(engine)
+
+    with engine.begin() as connection:
+        connection.execute(Taskbar.__table__.delete().where(Taskbar.id == taskbars[0].id))
+
+    _, work_orders = dump(engine)
+    part_numbers, amm_tasks = dump_children(engine)
+    assert [row.finding_id for row in work_orders] == [row.id for row in taskbars[1:]]
+    assert part_numbers == [] and amm_tasks == []
+
+
+def test_migration_adds_key_to_existing_database(iberia, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE finding_description_tasks (id INTEGER PRIMARY KEY, taskbar_id VARCHAR(50),"
+            " wo_number VARCHAR(50), raw_description TEXT)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE finding_work_orders (id INTEGER PRIMARY KEY, taskbar_id VARCHAR(50), wo_number VARCHAR(50))"
+        ))
+        # Dos ejecuciones completas anteriores duplicaron las filas
+        for _ in range(2):
+            connection.execute(text(
+                "INSERT INTO finding_description_tasks (taskbar_id, wo_number, raw_description)"
+                " VALUES ('TB1', '8019242', 'cabin: seat damaged')"
+            ))
+            connection.execute(text("INSERT INTO finding_work_orders (taskbar_id, wo_number) VALUES ('TB1', '8019242')"))
+
+    iberia.migrate_description_keys(engine)
+    iberia.migrate_description_keys(engine)
+    iberia.migrate_updated_at(engine)
+    iberia.migrate_updated_at(engine)
+
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT id, description_hash FROM finding_description_tasks")).fetchall()
+        assert connection.execute(text("SELECT COUNT(*) FROM finding_work_orders")).scalar() == 1
+        for table in ("finding_description_tasks", "finding_work_orders"):
+            assert connection.execute(text(f"SELECT COUNT(*) FROM {table} WHERE updated_at IS NULL")).scalar() == 0
+    for table in ("finding_description_tasks", "finding_work_orders"):
+        indexes = {index['name']: index['column_names'] for index in inspect(engine).get_indexes(table)}
+        assert indexes[f"ix_{table}_updated_at"] == ['updated_at', 'id']
+    assert len(rows) == 1
+    assert rows[0][1] == iberia.description_hash("cabin: seat damaged")
+
+
+def test_migrations_keep_the_work_orders_of_every_finding(iberia, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE finding_description_tasks (id INTEGER PRIMARY KEY, taskbar_id VARCHAR(50),"
+            " wo_number VARCHAR(50), raw_description TEXT, part_numbers TEXT, amm_task VARCHAR(100), amm_description TEXT)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE finding_work_orders (id INTEGER PRIMARY KEY, taskbar_id VARCHAR(50)"
+            " REFERENCES finding_description_tasks (taskbar_id), wo_number VARCHAR(50), ata VARCHAR(10))"
+        ))
+        # Dos ejecuciones completas de una W/O con dos hallazgos
+        for _ in range(2):
+            for description, ata in [("panel dented", "25"), ("seat torn", "52")]:
+                connection.execute(text(
+                    "INSERT INTO finding_description_tasks (taskbar_id, wo_number, raw_description)"
+                    " VALUES ('TB1', '8019242', :description)"
+                ), {"description": description})
+                connection.execute(text(
+                    "INSERT INTO finding_work_orders (taskbar_id, wo_number, ata) VALUES ('TB1', '8019242', :ata)"
+                ), {"ata": ata})
+
+    # La FK anterior no es válida con foreign_keys=ON: la migración no debe comprobarla
+    engine = create_engine(engine.url)
+    event.listen(engine, "connect", iberia.set_sqlite_pragmas)
+    for _ in range(2):
+        iberia.migrate(engine)
+
+    with engine.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT t.raw_description, o.ata FROM finding_work_orders o"
+            " JOIN finding_description_tasks t ON t.id = o.finding_id ORDER BY o.id"
+        )).fetchall()
+    assert rows == [("panel dented", "25"), ("seat torn", "52")]
+
+
+def test_schema_migration_adds_surrogate_key_indexes_and_child_tables(iberia, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE finding_description_tasks (id INTEGER PRIMARY KEY, taskbar_id VARCHAR(50),"
+            " wo_number VARCHAR(50), raw_description TEXT, part_numbers TEXT, amm_task VARCHAR(100),"
+            " amm_description TEXT)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE finding_work_orders (id INTEGER PRIMARY KEY, taskbar_id VARCHAR(50)"
+            " REFERENCES finding_description_tasks (taskbar_id), wo_number VARCHAR(50), ata VARCHAR(10), date DATE)"
+        ))
+        connection.execute(text(
+            "INSERT INTO finding_description_tasks (taskbar_id, wo_number, raw_description, part_numbers, amm_task)"
+            " VALUES ('TB1', '8019242', 'panel dented', 'P1, P2', '25-53-00'), ('TB2', '8019243', 'seat torn', '', NULL)"
+        ))
+        connection.execute(text(
+            "INSERT INTO finding_work_orders (id, taskbar_id, wo_number, ata, date)"
+            " VALUES (7, 'TB1', '8019242', '25', '2024-03-01'), (9, 'TB2', '8019243', '52', '2024-03-02')"
+        ))
+
+    for _ in range(2):
+        iberia.migrate_description_keys(engine)
+        iberia.migrate_updated_at(engine)
+        iberia.migrate_finding_schema(engine)
+
+    with engine.connect() as connection:
+        work_orders = connection.execute(text(
+            "SELECT o.id, o.ata, t.taskbar_id FROM finding_work_orders o"
+            " JOIN finding_description_tasks t ON t.id = o.finding_id ORDER BY o.id"
+        )).fetchall()
+        assert connection.execute(text("SELECT part_number FROM finding_part_numbers ORDER BY position")).fetchall() == [
+            ("P1",), ("P2",)]
+        assert connection.execute(text("SELECT task FROM finding_amm_tasks")).fetchall() == [("25-53-00",)]
+        plan = connection.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM finding_work_orders WHERE ata = '25' AND date >= '2024-01-01'"
+        )).fetchall()
+    assert work_orders == [(7, '25', 'TB1'), (9, '52', 'TB2')]
+    assert "ix_finding_work_orders_ata_date" in " ".join(row[-1] for row in plan)
+    foreign_keys = inspect(engine).get_foreign_keys('finding_work_orders')
+    assert [(fk['constrained_columns'], fk['referred_columns']) for fk in foreign_keys] == [(['finding_id'], ['id'])]
+
+
+def test_import_does_not_touch_the_database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delitem(sys.modules, 'iberia_findings_to_db', raising=False)
+    iberia = importlib.import_module('iberia_findings_to_db')
+    assert not os.path.exists(tmp_path / "aircraft_data.db")
+
+    iberia.migrate(create_engine(f"sqlite:///{tmp_path / 'aircraft_data.db'}"))
+    assert set(inspect(create_engine(f"sqlite:///{tmp_path / 'aircraft_data.db'}")).get_table_names()) == set(
+        iberia.Base.metadata.tables)
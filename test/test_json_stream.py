@@ -0,0 +1,110 @@
+import sys
+import os
+import json
+import random
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from json_stream import StreamingJSONParser, iter_json_items, parse_json_items
+from modules_ai import parse_bulk_response
+
+TRICKY_STRINGS = ['AFT CARGO: {DENT}', 'P/N "G255" [x]', 'back\\slash', 'ñ°€ 🛩', '}]"', '', '\\"', '<think>']
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(6 if depth < 2 else 4)
+    if kind == 0:
+        return rng.choice(TRICKY_STRINGS) + str(rng.randrange(1000))
+    if kind == 1:
+        return rng.choice([None, True, False, rng.randrange(-5, 10**6), rng.random()])
+    if kind in (2, 3):
+        return rng.choice(TRICKY_STRINGS)
+    if kind == 4:
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randrange(4))}
+
+
+def random_records(rng, count):
+    return [{"taskcard": f"ZL-{i}", **{f"f{j}": random_value(rng) for j in range(rng.randrange(5))}}
+            for i in range(count)]
+
+
+def render(rng, records):
+    """Serializa como array u objeto con claves y envuelve en texto, fences o <think>"""
+    indent = rng.choice([None, 2])
+    ascii_only = rng.choice([True, False])
+    if rng.random() < 0.5:
+        body = json.dumps(records, indent=indent, ensure_ascii=ascii_only)
+    else:
+        body = json.dumps({str(i + 1): r for i, r in enumerate(records)}, indent=indent, ensure_ascii=ascii_only)
+    prefix = rng.choice(["", "```json\n", "Here is the result:\n```\n", "<think>use [brackets] {x}</think>\n"])
+    suffix = "\n```" if "```" in prefix else rng.choice(["", "\nDone."])
+    return prefix + body + suffix
+
+
+def feed_in_chunks(rng, text, parser=None):
+    parser = parser or StreamingJSONParser()
+    items = []
+    pos = 0
+    while pos < len(text):
+        size = rng.choice([1, 2, 3, 7, 64, 1000])
+        items.extend(parser.feed(text[pos:pos + size]))
+        pos += size
+    return parser, items
+
+
+def test_fuzz_complete_responses_in_random_chunks():
+    rng = random.Random(1234)
+    for _ in range(300):
+        records = random_records(rng, rng.randrange(0, 8))
+        parser, items = feed_in_chunks(rng, render(rng, records))
+
+        assert items == list(enumerate(records))
+        assert parser.done
+
+
+def test_fuzz_truncated_responses_salvage_completed_items():
+    rng = random.Random(99)
+    for _ in range(300):
+        records = random_records(rng, rng.randrange(1, 6))
+        text = render(rng, records)
+        cut = rng.randrange(len(text))
+        _, items = feed_in_chunks(rng, text[:cut])
+
+        # Solo elementos completos, en orden y con su índice correcto
+        assert items == list(enumerate(records))[:len(items)]
+        # El resultado no depende de cómo se trocea la respuesta
+        assert items == iter_json_items(text[:cut])
+
+
+def test_keyed_object_maps_to_description_index():
+    content = '```json\n{"2": {"taskcard": "B"}, "1": {"taskcard": "A"}, "4": {"taskcard": "D"}}\n```'
+
+    results, found = parse_json_items(content, 4)
+
+    assert found == 3
+    assert [r.get("taskcard") for r in results] == ["A", "B", None, "D"]
+
+
+def test_single_record_and_garbage():
+    assert iter_json_items('{"taskcard": "ZL-1", "part_numbers": ["1", "2"]}') == [
+        (0, {"taskcard": "ZL-1", "part_numbers": ["1", "2"]})]
+    assert iter_json_items("Sorry, I cannot help with that.") == []
+    assert iter_json_items(None) == []
+
+
+def test_malformed_item_does_not_hide_the_rest():
+    assert parse_bulk_response('[{"a": 1}, {"b": 2,}, {"c": 3}]', 3) == [{"a": 1}, {}, {"c": 3}]
+
+
+def test_parse_time_is_linear_with_tiny_chunks():
+    def elapsed(count):
+        text = json.dumps([{"finding": "X" * 40, "part_numbers": ["G1", "G2"]}] * count)
+        parser = StreamingJSONParser()
+        start = time.perf_counter()
+        for i in range(0, len(text), 3):
+            parser.feed(text[i:i + 3])
+        return time.perf_counter() - start
+
+    small, large = elapsed(2000), elapsed(8000)
+    assert large < small * 8
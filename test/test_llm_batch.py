@@ -0,0 +1,129 @@
+import sys
+import os
+import re
+import json
+import importlib
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import llm_clients
+import llm_batch
+from llm_cache import ExtractionCache
+from run_journal import RunJournal
+from fake_batch_server import FakeBatchServer
+
+IBERIA_PROMPT = 'extract_description_fields_iberia.txt'
+
+
+def iberia_responder(prompt):
+    descriptions = re.findall(r"Description \d+: (.*)", prompt)
+    return json.dumps({str(i + 1): {"taskcard": d, "part_numbers": [], "actions": {}} for i, d in enumerate(descriptions)})
+
+
+@pytest.fixture
+def azure(monkeypatch):
+    def use(server):
+        monkeypatch.setenv('OPENAI_API_ENDPOINT', server.base_url)
+        monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+        monkeypatch.setenv('OPENAI_API_VERSION', '2024-08-01-preview')
+        llm_clients.reset_providers()
+    yield use
+    llm_clients.reset_providers()
+
+
+def test_batch_job_maps_results_back_to_record_ids(azure, tmp_path):
+    descriptions = ["PANEL DENTED", "SEAT TORN", " PANEL  DENTED", "LAV INOP", "OVEN INOP"]
+    record_ids = ["A", "B", "C", "D", "E"]
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite"))
+
+    with FakeBatchServer(responder=iberia_responder, polls_until_complete=3) as server:
+        azure(server)
+        results = llm_batch.run_batch_extraction(descriptions, record_ids, IBERIA_PROMPT, job_name="nightly",
+                                                 work_dir=str(tmp_path), batch_size=2, poll_interval=0, cache=cache)
+
+    assert {record_id: result["taskcard"] for record_id, result in results.items()} == {
+        "A": "PANEL DENTED", "B": "SEAT TORN", "C": "PANEL DENTED", "D": "LAV INOP", "E": "OVEN INOP"}
+    # El JSONL usa el mismo prompt multi-descripción y las repeticiones se envían una sola vez
+    lines = [json.loads(line) for line in open(tmp_path / "nightly.jsonl", encoding='utf-8')]
+    assert [line["custom_id"] for line in lines] == ["request-0", "request-1"]
+    assert all(line["method"] == "POST" and line["url"] == llm_batch.BATCH_ENDPOINT for line in lines)
+    assert lines[0]["body"]["messages"][0]["content"].startswith("Extract aircraft maintenance details")
+    assert lines[0]["body"]["response_format"]["type"] == "json_schema"
+    assert sum(len(re.findall("Description \\d+:", line["body"]["messages"][-1]["content"])) for line in lines) == 4
+    assert server.polls["batch-1"] == 3
+    assert json.load(open(tmp_path / "nightly.manifest.json"))["batch_id"] == "batch-1"
+    assert len(cache) == 4
+
+
+def test_failed_requests_and_cached_descriptions_are_not_resubmitted(azure, tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite"))
+
+    with FakeBatchServer(responder=iberia_responder, failing_custom_ids={"request-1"}) as server:
+        azure(server)
+        first = llm_batch.run_batch_extraction(["A", "B", "C"], prompt_template=IBERIA_PROMPT, job_name="first",
+                                               work_dir=str(tmp_path), batch_size=2, poll_interval=0, cache=cache)
+        second = llm_batch.run_batch_extraction(["A", "B", "C"], prompt_template=IBERIA_PROMPT, job_name="second",
+                                                work_dir=str(tmp_path), batch_size=2, poll_interval=0, cache=cache)
+
+    assert sorted(first) == [0, 1]
+    assert sorted(second) == [0, 1, 2]
+    # Solo la descripción sin resultado vuelve a enviarse
+    resent = [json.loads(line) for line in open(tmp_path / "second.jsonl", encoding='utf-8')]
+    assert re.findall(r"Description \d+: (.*)", resent[0]["body"]["messages"][-1]["content"]) == ["C"]
+
+
+def test_interrupted_job_is_resumed_without_resubmitting(azure, tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite"))
+
+    with FakeBatchServer(responder=iberia_responder, polls_until_complete=3) as server:
+        azure(server)
+        # La primera ejecución se interrumpe mientras el trabajo sigue en curso
+        with pytest.raises(TimeoutError):
+            llm_batch.run_batch_extraction(["A", "B", "C"], prompt_template=IBERIA_PROMPT, job_name="nightly",
+                                           work_dir=str(tmp_path), batch_size=2, poll_interval=0, timeout=0,
+                                           cache=cache)
+        results = llm_batch.run_batch_extraction(["A", "B", "C"], prompt_template=IBERIA_PROMPT, job_name="nightly",
+                                                 work_dir=str(tmp_path), batch_size=2, poll_interval=0, cache=cache)
+
+    assert {record_id: result["taskcard"] for record_id, result in results.items()} == {0: "A", 1: "B", 2: "C"}
+    assert list(server.batches) == ["batch-1"]
+    assert len(server.files) == 2
+
+
+def test_job_name_reused_with_other_inputs_submits_a_new_job(azure, tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite"))
+
+    with FakeBatchServer(responder=iberia_responder, polls_until_complete=3) as server:
+        azure(server)
+        # Trabajo interrumpido con otras descripciones: no se reanuda
+        with pytest.raises(TimeoutError):
+            llm_batch.run_batch_extraction(["A", "B"], prompt_template=IBERIA_PROMPT, job_name="nightly",
+                                           work_dir=str(tmp_path), poll_interval=0, timeout=0, cache=cache)
+        changed = llm_batch.run_batch_extraction(["X", "Y"], prompt_template=IBERIA_PROMPT, job_name="nightly",
+                                                 work_dir=str(tmp_path), poll_interval=0, cache=cache)
+        # Trabajo ya descargado: la siguiente ejecución envía uno nuevo
+        next_night = llm_batch.run_batch_extraction(["Z"], prompt_template=IBERIA_PROMPT, job_name="nightly",
+                                                    work_dir=str(tmp_path), poll_interval=0, cache=cache)
+
+    assert {record_id: result["taskcard"] for record_id, result in changed.items()} == {0: "X", 1: "Y"}
+    assert {record_id: result["taskcard"] for record_id, result in next_night.items()} == {0: "Z"}
+    assert list(server.batches) == ["batch-1", "batch-2", "batch-3"]
+    assert json.load(open(tmp_path / "nightly.manifest.json"))["collected"] is True
+
+
+def test_iberia_batch_mode_writes_the_journal(azure, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    iberia = importlib.import_module('iberia_findings_to_db')
+    monkeypatch.setattr(llm_batch, 'get_default_cache', lambda: ExtractionCache(str(tmp_path / "cache.sqlite")))
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+
+    with FakeBatchServer(responder=iberia_responder) as server:
+        azure(server)
+        monkeypatch.setattr(iberia, 'run_batch_extraction', lambda *args, **kwargs: llm_batch.run_batch_extraction(
+            *args, work_dir=str(tmp_path / "batch"), **{**kwargs, 'poll_interval': 0}))
+        results = iberia.get_information_parsed_from_llm(["X1", "X2"], record_ids=["k1", "k2"], journal=journal,
+                                                         regex_first=False, batch_api=True)
+
+    assert [r["taskcard"] for r in results] == ["X1", "X2"]
+    assert set(journal.load()) == {"k1", "k2"}
@@ -0,0 +1,61 @@
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import modules_ai
+import llm_clients
+from llm_cache import ExtractionCache
+from fake_openai_server import FakeOpenAIServer
+
+
+def test_key_ignores_whitespace_but_not_template_or_model():
+    key = ExtractionCache.make_key("AFT CARGO:  IN BAD\nCONDITION", "tpl", "gpt-4o-mini", 0)
+
+    assert key == ExtractionCache.make_key("AFT CARGO: IN BAD CONDITION ", "tpl", "gpt-4o-mini", 0)
+    assert key != ExtractionCache.make_key("AFT CARGO: IN BAD CONDITION", "tpl v2", "gpt-4o-mini", 0)
+    assert key != ExtractionCache.make_key("AFT CARGO: IN BAD CONDITION", "tpl", "other-model", 0)
+
+
+def test_counters_and_size_eviction(tmp_path):
+    cache = ExtractionCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    cache.set_many({"a": {"x": 1}, "b": {"x": 2}, "empty": {}})
+    time.sleep(0.01)
+    cache.get_many(["a"])
+    cache.set_many({"c": {"x": 3}})
+
+    found = cache.get_many(["a", "b", "c"])
+
+    assert set(found) == {"a", "c"}
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+    assert len(cache) == 2
+
+
+def test_age_eviction(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ExtractionCache(path)
+    cache.set_many({"old": {"x": 1}})
+    cache._conn.execute("UPDATE extraction_cache SET created_at = created_at - 10 * 86400")
+    cache._conn.commit()
+
+    assert ExtractionCache(path, max_age_days=7).get_many(["old"]) == {}
+
+
+def test_only_cache_misses_are_sent(monkeypatch, tmp_path):
+    (tmp_path / 'prompts').mkdir()
+    (tmp_path / 'prompts' / 'echo.txt').write_text("Extract:{description}", encoding='utf-8')
+    monkeypatch.setattr(modules_ai, '__file__', str(tmp_path / 'modules_ai.py'))
+    cache = ExtractionCache(str(tmp_path / 'cache.sqlite'))
+
+    with FakeOpenAIServer() as server:
+        monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+        monkeypatch.setenv('OPENROUTER_BASE_URL', server.base_url)
+        llm_clients.reset_providers()
+        modules_ai.parse_descriptions_bulk_batched(["a", "b"], 2, 'echo.txt', deepseek=True, cache=cache)
+        results = modules_ai.parse_descriptions_bulk_batched(["a", "c", "b"], 2, 'echo.txt', deepseek=True, cache=cache)
+
+    assert [r['echo'] for r in results] == ["a", "c", "b"]
+    assert server.requests[-1]['messages'][-1]['content'] == "Extract:\nDescription 1: c"
+    assert len(server.requests) == 2
@@ -0,0 +1,94 @@
+import sys
+import os
+import asyncio
+import random
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import modules_ai
+import llm_clients
+from llm_dispatcher import TokenBucketRateLimiter, dispatch
+from fake_openai_server import FakeOpenAIServer
+
+
+def test_dispatch_preserves_input_order():
+    async def worker(item):
+        await asyncio.sleep(random.uniform(0, 0.02))
+        return item * 2
+
+    assert dispatch(list(range(50)), worker, max_concurrency=8) == [i * 2 for i in range(50)]
+
+
+def test_dispatch_works_inside_a_running_event_loop():
+    async def worker(item):
+        await asyncio.sleep(0)
+        return item + 1
+
+    # Como en Jupyter: la llamada síncrona se hace desde código que ya corre en un event loop
+    async def caller():
+        return dispatch([1, 2, 3], worker, max_concurrency=2)
+
+    assert asyncio.run(caller()) == [2, 3, 4]
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = TokenBucketRateLimiter(requests_per_minute=600)
+    limiter._request_level = 0  # cubo vacío: 10 peticiones/s
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.25
+
+
+def test_bulk_batched_against_fake_server(monkeypatch, tmp_path):
+    (tmp_path / 'prompts').mkdir()
+    (tmp_path / 'prompts' / 'echo.txt').write_text("Extract:{description}", encoding='utf-8')
+    monkeypatch.setattr(modules_ai, '__file__', str(tmp_path / 'modules_ai.py'))
+
+    with FakeOpenAIServer(delay=lambda prompt: random.uniform(0.01, 0.05)) as server:
+        monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+        monkeypatch.setenv('OPENROUTER_BASE_URL', server.base_url)
+        llm_clients.reset_providers()
+        descriptions = [f"finding {i}" for i in range(20)]
+
+        results = modules_ai.parse_descriptions_bulk_batched(
+            descriptions, batch_size=2, prompt_template='echo.txt', deepseek=True, max_concurrency=4,
+            use_cache=False
+        )
+
+    assert [r['echo'] for r in results] == descriptions
+    assert len(server.requests) == 10
+    assert 1 < server.max_in_flight <= 4
+
+
+def test_provider_is_created_once_per_process(monkeypatch):
+    monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+    llm_clients.reset_providers()
+    provider = llm_clients.get_provider('openrouter')
+
+    assert llm_clients.get_provider('openrouter') is provider
+    assert provider.client._client is llm_clients._http_client
+
+
+def test_duplicates_are_sent_once_and_fanned_out(monkeypatch, tmp_path):
+    (tmp_path / 'prompts').mkdir()
+    (tmp_path / 'prompts' / 'echo.txt').write_text("Extract:{description}", encoding='utf-8')
+    monkeypatch.setattr(modules_ai, '__file__', str(tmp_path / 'modules_ai.py'))
+    descriptions = ["wo1  sidewall", "wo2 floor", "wo1 sidewall", "wo1\tsidewall "]
+
+    with FakeOpenAIServer() as server:
+        monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+        monkeypatch.setenv('OPENROUTER_BASE_URL', server.base_url)
+        llm_clients.reset_providers()
+        results = modules_ai.parse_descriptions_bulk_batched(
+            descriptions, batch_size=10, prompt_template='echo.txt', deepseek=True, use_cache=False
+        )
+
+    assert [r['echo'] for r in results] == ["wo1  sidewall", "wo2 floor", "wo1  sidewall", "wo1  sidewall"]
+    assert results[0] is not results[2]
+    assert server.requests[0]['messages'][-1]['content'].count("Description") == 2
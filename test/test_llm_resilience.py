@@ -0,0 +1,175 @@
+import sys
+import os
+import re
+import asyncio
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import httpx
+import openai
+import pytest
+import modules_ai
+import llm_clients
+import llm_resilience
+from llm_resilience import AdaptiveConcurrency, CircuitBreaker, ResilientBackends, RetryPolicy
+from fake_openai_server import FakeOpenAIServer, fail_requests, always_fail
+
+
+@pytest.fixture
+def echo_prompt(monkeypatch, tmp_path):
+    (tmp_path / 'prompts').mkdir()
+    (tmp_path / 'prompts' / 'echo.txt').write_text("Extract:{description}", encoding='utf-8')
+    monkeypatch.setattr(modules_ai, '__file__', str(tmp_path / 'modules_ai.py'))
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    """Reintentos rápidos y estado de circuitos limpio en cada test"""
+    def configure(openrouter=None, azure=None, **options):
+        for name in ('OPENROUTER_API_KEY', 'OPENROUTER_BASE_URL', 'OPENAI_API_ENDPOINT', 'OPENAI_API_KEY'):
+            monkeypatch.delenv(name, raising=False)
+        if openrouter:
+            monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+            monkeypatch.setenv('OPENROUTER_BASE_URL', openrouter.base_url)
+        if azure:
+            monkeypatch.setenv('OPENAI_API_ENDPOINT', azure.base_url.rsplit('/v1', 1)[0])
+            monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+            monkeypatch.setenv('OPENAI_API_VERSION', '2024-08-01-preview')
+        llm_clients.reset_providers()
+        options.setdefault('retry_policy', RetryPolicy(max_retries=3, base_delay=0.01))
+        resilient = ResilientBackends(**options)
+        monkeypatch.setattr(llm_resilience, '_backends', resilient)
+        return resilient
+    yield configure
+    llm_clients.reset_providers()
+
+
+def prompt_descriptions(body):
+    return re.findall(r"Description \d+: (.*)", body['messages'][-1]['content'])
+
+
+def test_rate_limited_request_waits_for_retry_after(backends, echo_prompt):
+    with FakeOpenAIServer(fault=fail_requests([1], 429, {'retry-after-ms': '300'})) as server:
+        backends(openrouter=server)
+        results = modules_ai.parse_descriptions_bulk_batched(
+            ["a", "b"], batch_size=2, prompt_template='echo.txt', deepseek=True, use_cache=False)
+
+    assert [r['echo'] for r in results] == ["a", "b"]
+    assert len(server.requests) == 2
+    assert server.request_times[1] - server.request_times[0] >= 0.3
+
+
+def test_retry_after_header_formats():
+    def error(headers):
+        response = httpx.Response(429, headers=headers, request=httpx.Request('POST', 'http://test'))
+        return openai.RateLimitError("rate limited", response=response, body=None)
+
+    assert llm_resilience.retry_after_seconds(error({'retry-after-ms': '1500'})) == 1.5
+    assert llm_resilience.retry_after_seconds(error({'retry-after': '7'})) == 7
+    assert 0 < llm_resilience.retry_after_seconds(error({'retry-after': 'Wed, 21 Oct 2099 07:28:00 GMT'}))
+    assert llm_resilience.retry_after_seconds(error({})) is None
+    # Sin Retry-After: backoff exponencial con jitter acotado por max_delay
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    assert all(0 <= policy.delay(attempt) <= min(5.0, 2 ** attempt) for attempt in range(8))
+
+
+def test_aimd_halves_on_throttle_once_per_burst_and_grows_additively():
+    limiter = AdaptiveConcurrency(initial=8, maximum=16, cooldown=10)
+
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.on_success()
+    assert 4.9 < limiter.limit < 5.1
+
+    async def peak_in_flight():
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            await limiter.acquire()
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            await limiter.release()
+
+        await asyncio.gather(*(request() for _ in range(20)))
+        return peak
+
+    assert asyncio.run(peak_in_flight()) == int(limiter.limit)
+
+
+def test_concurrency_backs_off_after_429s(backends, echo_prompt):
+    with FakeOpenAIServer(delay=0.05, fault=fail_requests(range(1, 5), 429)) as server:
+        resilient = backends(openrouter=server, failure_threshold=10)
+        results = modules_ai.parse_descriptions_bulk_batched(
+            [f"d{i}" for i in range(8)], batch_size=1, prompt_template='echo.txt', deepseek=True,
+            use_cache=False, max_concurrency=8)
+
+    assert [r['echo'] for r in results] == [f"d{i}" for i in range(8)]
+    assert resilient.limiter('openrouter').limit < llm_clients.pool_settings['max_connections']
+
+
+def test_circuit_opens_and_fails_over_to_the_other_backend(backends, echo_prompt):
+    with FakeOpenAIServer(fault=always_fail(503)) as azure, FakeOpenAIServer() as openrouter:
+        resilient = backends(openrouter=openrouter, azure=azure, failure_threshold=3)
+        results = modules_ai.parse_descriptions_bulk_batched(
+            [f"d{i}" for i in range(4)], batch_size=1, prompt_template='echo.txt', deepseek=False,
+            use_cache=False, max_concurrency=1)
+
+    assert [r['echo'] for r in results] == [f"d{i}" for i in range(4)]
+    # Tras abrirse el circuito no se vuelve a llamar a Azure
+    assert azure.failures == len(azure.requests) == 3
+    assert resilient.breaker('azure').state == "open"
+    assert sorted(d for body in openrouter.requests for d in prompt_descriptions(body)) == [f"d{i}" for i in range(4)]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_results_after_failover_are_cached_under_the_serving_backend(backends, echo_prompt, tmp_path, stream):
+    cache = modules_ai.ExtractionCache(str(tmp_path / "cache.sqlite"))
+    with FakeOpenAIServer(fault=always_fail(503)) as azure, FakeOpenAIServer() as openrouter:
+        backends(openrouter=openrouter, azure=azure, failure_threshold=1)
+        modules_ai.parse_descriptions_bulk_batched(["a", "b"], batch_size=1, prompt_template='echo.txt',
+                                                   deepseek=False, cache=cache, max_concurrency=1, stream=stream)
+        modules_ai.parse_descriptions_bulk('echo.txt', ["c"], deepseek=False, cache=cache, stream=stream)
+
+    template = modules_ai.load_prompt('echo.txt')
+    served_by_openrouter = [modules_ai.extraction_cache_key(d, template, True) for d in ["a", "b", "c"]]
+    requested_azure = [modules_ai.extraction_cache_key(d, template, False) for d in ["a", "b", "c"]]
+    assert set(cache.get_many(served_by_openrouter)) == set(served_by_openrouter)
+    assert cache.get_many(requested_azure) == {}
+
+
+def test_unavailable_backends_leave_records_empty_instead_of_raising(backends, echo_prompt, tmp_path):
+    cache = modules_ai.ExtractionCache(str(tmp_path / "cache.sqlite"))
+    with FakeOpenAIServer(fault=always_fail(500)) as server:
+        backends(openrouter=server, failure_threshold=2)
+        batched = modules_ai.parse_descriptions_bulk_batched(
+            ["a", "b"], batch_size=1, prompt_template='echo.txt', deepseek=True, cache=cache, max_concurrency=1)
+        single = modules_ai.parse_descriptions_bulk('echo.txt', ["c"], deepseek=True, cache=cache)
+
+    assert batched == [{}, {}] and single == [{}]
+    assert len(server.requests) == 2
+    assert len(cache) == 0
+
+
+def test_half_open_circuit_closes_after_a_success():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.allow_request() and breaker.state == "half_open"
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_client_errors_are_not_retried(backends, echo_prompt):
+    with FakeOpenAIServer(fault=always_fail(400)) as server:
+        backends(openrouter=server)
+        with pytest.raises(openai.BadRequestError):
+            modules_ai.llm_request("Description 1: a", deepseek=True)
+
+    assert len(server.requests) == 1
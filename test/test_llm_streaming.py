@@ -0,0 +1,81 @@
+import sys
+import os
+import re
+import json
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import modules_ai
+import llm_clients
+from fake_openai_server import FakeOpenAIServer, echo_completion
+
+
+@pytest.fixture
+def echo_prompt(monkeypatch, tmp_path):
+    (tmp_path / 'prompts').mkdir()
+    (tmp_path / 'prompts' / 'echo.txt').write_text("Extract:{description}", encoding='utf-8')
+    monkeypatch.setattr(modules_ai, '__file__', str(tmp_path / 'modules_ai.py'))
+
+
+def use_server(monkeypatch, server):
+    monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setenv('OPENROUTER_BASE_URL', server.base_url)
+    llm_clients.reset_providers()
+
+
+def test_records_are_emitted_before_the_response_ends(monkeypatch, echo_prompt):
+    emitted = []
+    descriptions = [f"finding {i}" for i in range(6)]
+
+    with FakeOpenAIServer(stream_chunk_size=8, stream_delay=0.02) as server:
+        use_server(monkeypatch, server)
+        results = modules_ai.parse_descriptions_bulk_batched(
+            descriptions, batch_size=6, prompt_template='echo.txt', deepseek=True, use_cache=False,
+            stream=True, on_record=lambda index, record: emitted.append((index, record, time.monotonic())),
+        )
+        finished = time.monotonic()
+
+    assert [r['echo'] for r in results] == descriptions
+    assert [(index, record) for index, record, _ in emitted] == list(enumerate(results))
+    assert server.requests[0]['stream'] is True
+    # Cada registro se entrega al cerrarse su objeto, no al final de la respuesta
+    assert finished - emitted[0][2] > 0.15
+
+
+def test_truncated_stream_only_resends_missing_records(monkeypatch, echo_prompt):
+    def truncate_first(prompt):
+        content = echo_completion(prompt)
+        if len(server.requests) == 1:
+            # Se corta a mitad del tercer objeto
+            cut = content.index('{', content.index('{', content.index('{') + 1) + 1) + 5
+            return content[:cut], "length"
+        return content
+
+    descriptions = [f"finding {i}" for i in range(4)]
+    with FakeOpenAIServer(responder=truncate_first) as server:
+        use_server(monkeypatch, server)
+        results = modules_ai.parse_descriptions_bulk_batched(
+            descriptions, batch_size=4, prompt_template='echo.txt', deepseek=True, use_cache=False, stream=True,
+        )
+
+    assert [r['echo'] for r in results] == descriptions
+    retried = re.findall(r"Description \d+: (.*)", server.requests[1]['messages'][-1]['content'])
+    assert retried == ["finding 2", "finding 3"]
+
+
+def test_sync_bulk_stream_emits_each_record(monkeypatch, echo_prompt):
+    emitted = {}
+    descriptions = ["a", "b", "a"]
+
+    with FakeOpenAIServer(responder=lambda prompt: "```json\n" + json.dumps(
+            {str(i + 1): {"echo": d} for i, d in enumerate(re.findall(r"Description \d+: (.*)", prompt))}) + "\n```"
+    ) as server:
+        use_server(monkeypatch, server)
+        results = modules_ai.parse_descriptions_bulk(
+            'echo.txt', descriptions, deepseek=True, use_cache=False, stream=True, on_record=emitted.__setitem__,
+        )
+
+    assert [r['echo'] for r in results] == descriptions
+    assert emitted == dict(enumerate(results))
@@ -0,0 +1,82 @@
+import sys
+import os
+import glob
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import modules_ai
+import llm_clients
+from prompt_templates import PromptTemplate, load_template_file
+from fake_openai_server import FakeOpenAIServer
+
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'prompts')
+TEMPLATE = "Extract the fields.\nUse {{\"taskcard\": ...}} objects.\n\nINPUT:\n{description}\n\nReturn ONLY JSON."
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(PROMPTS_DIR, '*.txt'))))
+def test_shipped_templates_split_without_losing_text(path):
+    template = load_template_file(path)
+    descriptions_text = modules_ai.numbered_descriptions(["PANEL DENTED", "SEAT TORN"])
+
+    system, user = [message["content"] for message in template.messages(descriptions_text)]
+
+    assert "Description 1: PANEL DENTED" in user and "PANEL DENTED" not in system
+    # El texto completo y el dividido tienen las mismas líneas (llaves ya desescapadas)
+    full_lines = {line.strip() for line in template.format(descriptions_text).splitlines() if line.strip()}
+    split_lines = {line.strip() for line in (system + "\n" + user).splitlines() if line.strip()}
+    assert full_lines == split_lines
+
+
+def test_static_text_goes_to_system_message():
+    template = PromptTemplate("test.txt", TEMPLATE)
+
+    assert template.system == 'Extract the fields.\nUse {"taskcard": ...} objects.\n\nReturn ONLY JSON.'
+    assert template.messages("\nDescription 1: X")[-1] == {"role": "user", "content": "INPUT:\n\nDescription 1: X"}
+    assert PromptTemplate("echo.txt", "Extract:{description}").messages("x") == [
+        {"role": "user", "content": "Extract:x"}]
+
+
+@pytest.mark.parametrize("text", ["No placeholder", "{description} and {other}", "{description} {description}",
+                                  "{description!r}", "unbalanced { brace {description}"])
+def test_invalid_templates_are_rejected(text):
+    with pytest.raises(ValueError):
+        PromptTemplate("bad.txt", text)
+
+
+def test_templates_are_read_once(tmp_path):
+    path = tmp_path / "prompt.txt"
+    path.write_text(TEMPLATE, encoding='utf-8')
+    first = load_template_file(str(path))
+    path.write_text("changed {description}", encoding='utf-8')
+
+    assert load_template_file(str(path)) is first
+
+
+def test_system_prefix_is_identical_across_requests(monkeypatch, tmp_path):
+    (tmp_path / 'prompts').mkdir()
+    (tmp_path / 'prompts' / 'static.txt').write_text(TEMPLATE, encoding='utf-8')
+    monkeypatch.setattr(modules_ai, '__file__', str(tmp_path / 'modules_ai.py'))
+
+    with FakeOpenAIServer() as server:
+        monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+        monkeypatch.setenv('OPENROUTER_BASE_URL', server.base_url)
+        llm_clients.reset_providers()
+        results = modules_ai.parse_descriptions_bulk_batched(
+            ["A", "B", "C"], batch_size=1, prompt_template='static.txt', deepseek=True, use_cache=False)
+
+    assert [r['echo'] for r in results] == ["A", "B", "C"]
+    systems = {body['messages'][0]['content'] for body in server.requests}
+    assert len(systems) == 1 and {body['messages'][0]['role'] for body in server.requests} == {"system"}
+
+
+def test_token_report_separates_static_and_variable_parts():
+    template = PromptTemplate("test.txt", TEMPLATE)
+
+    report = modules_ai.report_prompt_tokens(template, [["A"], ["B", "C"]])
+
+    assert report['requests'] == 2
+    assert report['system_tokens'] == template.system_tokens > 0
+    assert report['user_tokens'] > 0
+    assert 0 < report['cacheable_share'] < 1
+    assert report['cacheable'] is False
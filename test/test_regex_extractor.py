@@ -0,0 +1,71 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from regex_extractor import extract_regex_fields, extract_regex_frame, frame_to_records, completeness_score, hybrid_extract
+
+IBERIA_EXAMPLE = (
+    "FINDING (NRC) TASKCARD ZL-151-02-2 (4) / ITEM-1WO8019242    AFT CARGO: IN BAD CONDITION "
+    "SIDEWALLPANEL 152NW  P/NG2557685700000AMM TASK 25-53-00-000-801-AREMOVAL OF THE CEILING PANELS, "
+    "THEPARTITION PANELS AND THE SIDEWALLPANELS IN THE AFT CARGO COMPARTMENTSEND TO WORKSHOP IAW WRFAMM "
+    "TASK 25-53-00-400-801-AINSTALLATION OF THE CEILING PANELS, THEPARTITION PANELS AND THESIDEWALL PANELS "
+    "IN THE AFT CARGO COMPARTMENTWO8019242    AFT CARGO: IN BAD CONDITION SIDEWALLPANEL 152NW  "
+    "P/NG2557676800000:FAPE3AMM TASK 25-53-00-000-801-AREMOVAL OF THE CEILING PANELS, THEPARTITION PANELS "
+    "AND THE SIDEWALLPANELS IN THE AFT CARGO COMPARTMENTDAMAGES OUT OF LIMITS IAW AMM 25-50-00-283 REV "
+    "42SUPPLY A NEW PANELAMM TASK 25-53-00-400-801-AINSTALLATION OF THE CEILING PANELS, THEPARTITION "
+    "PANELS AND THESIDEWALL PANELS IN THE AFT CARGO COMPARTMENT"
+)
+
+
+def test_prompt_example_is_fully_resolved_by_regex():
+    result = extract_regex_fields(IBERIA_EXAMPLE.lower())
+
+    assert result["taskcard"] == "ZL-151-02-2 (4)"
+    assert result["work_order"] == "WO8019242"
+    assert result["panel_code"] == "152NW"
+    assert result["part_numbers"] == ["G2557685700000", "G2557676800000"]
+    assert [task["task"] for task in result["amm_tasks"]] == ["25-53-00-000-801-A", "25-53-00-400-801-A"]
+    assert result["amm_revisions"] == [{"task": "25-50-00-283", "revision": "42"}]
+    assert result["actions"] == {"send_to_workshop": True, "damage_out_of_limits": True, "supply_new_material": True}
+    assert completeness_score(result) == 1.0
+
+
+def test_only_incomplete_records_go_to_llm():
+    sent = []
+
+    def llm_extract(descriptions):
+        sent.extend(descriptions)
+        return [{"location": "CABIN", "finding": "SEAT DAMAGED", "taskcard": "WRONG"} for _ in descriptions]
+
+    records = hybrid_extract([IBERIA_EXAMPLE, "TASKCARD ZL-151-02-2 SEAT DAMAGED"], llm_extract)
+
+    assert sent == ["TASKCARD ZL-151-02-2 SEAT DAMAGED"]
+    assert records[0]["panel_code"] == "152NW"
+    assert records[1]["taskcard"] == "ZL-151-02-2"
+    assert records[1]["location"] == "CABIN"
+    assert records[1]["actions"]["send_to_workshop"] is False
+
+
+def test_batches_are_reported_after_merging():
+    reported = {}
+
+    def llm_extract(descriptions, on_batch):
+        results = [{"location": "CABIN", "finding": "SEAT DAMAGED"} for _ in descriptions]
+        on_batch(list(range(len(descriptions))), results)
+        return results
+
+    texts = ["TASKCARD ZL-151-02-2 SEAT DAMAGED", IBERIA_EXAMPLE]
+    records = hybrid_extract(texts, llm_extract, on_batch=lambda indices, batch: reported.update(zip(indices, batch)))
+
+    assert reported == dict(enumerate(records))
+    assert reported[0]["taskcard"] == "ZL-151-02-2"
+    assert reported[0]["location"] == "CABIN"
+
+
+def test_frame_extraction_matches_row_extraction():
+    texts = [IBERIA_EXAMPLE, IBERIA_EXAMPLE.lower(), "", None, IBERIA_EXAMPLE,
+             "R/H WING: DENTED  S/N AB1234 AMM 57-10-00 PB301"]
+
+    records = frame_to_records(extract_regex_frame(texts))
+
+    assert records == [extract_regex_fields(text) for text in texts]
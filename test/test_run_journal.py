@@ -0,0 +1,110 @@
+import sys
+import os
+import importlib
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import modules_ai
+import llm_clients
+from run_journal import RunJournal
+from fake_openai_server import FakeOpenAIServer
+
+
+def test_journal_streams_entries_and_skips_torn_line(tmp_path):
+    journal = RunJournal(str(tmp_path / 'journal.jsonl'), fsync=False)
+    journal.append_many({"a": {"x": 1}, "b": {}})
+    journal.append_many({"a": {"x": 2}, "c": {"x": 3}})
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"id": "d", "res')
+
+    assert list(journal) == [("a", {"x": 1}), ("a", {"x": 2}), ("c", {"x": 3})]
+    assert journal.load() == {"a": {"x": 2}, "c": {"x": 3}}
+    assert journal.load(["c", "d"]) == {"c": {"x": 3}}
+
+
+def test_batches_are_reported_for_every_duplicate(monkeypatch, tmp_path):
+    (tmp_path / 'prompts').mkdir()
+    (tmp_path / 'prompts' / 'echo.txt').write_text("Extract:{description}", encoding='utf-8')
+    monkeypatch.setattr(modules_ai, '__file__', str(tmp_path / 'modules_ai.py'))
+    reported = {}
+
+    with FakeOpenAIServer() as server:
+        monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+        monkeypatch.setenv('OPENROUTER_BASE_URL', server.base_url)
+        llm_clients.reset_providers()
+        descriptions = ["a", "b", "a", "c", "b"]
+        results = modules_ai.parse_descriptions_bulk_batched(
+            descriptions, batch_size=1, prompt_template='echo.txt', deepseek=True, use_cache=False,
+            on_batch=lambda indices, batch: reported.update(zip(indices, batch)),
+        )
+
+    assert len(server.requests) == 3
+    assert [reported[i] for i in range(len(descriptions))] == results
+
+
+def test_interrupted_run_resumes_from_journal(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    iberia = importlib.import_module('iberia_findings_to_db')
+    journal = RunJournal(str(tmp_path / 'journal.jsonl'), fsync=False)
+    sent = []
+
+    def flaky_llm(descriptions, batch_size, on_batch=None, fail_after=None, **kwargs):
+        results = []
+        for start in range(0, len(descriptions), batch_size):
+            if fail_after is not None and start >= fail_after:
+                raise RuntimeError("rate limit")
+            batch = descriptions[start:start+batch_size]
+            sent.extend(batch)
+            batch_results = [{"finding": desc} for desc in batch]
+            on_batch(list(range(start, start + len(batch))), batch_results)
+            results.extend(batch_results)
+        return results
+
+    descriptions = [f"finding {i}" for i in range(6)]
+    record_ids = [f"TB{i}" for i in range(6)]
+    monkeypatch.setattr(iberia, 'parse_descriptions_bulk_batched',
+                        lambda *args, **kwargs: flaky_llm(*args, fail_after=4, **kwargs))
+    with pytest.raises(RuntimeError):
+        iberia.get_information_parsed_from_llm(descriptions, batch_size=2, regex_first=False,
+                                               record_ids=record_ids, journal=journal)
+    assert set(journal.load()) == {"TB0", "TB1", "TB2", "TB3"}
+
+    sent.clear()
+    monkeypatch.setattr(iberia, 'parse_descriptions_bulk_batched', flaky_llm)
+    results = iberia.get_information_parsed_from_llm(descriptions, batch_size=2, regex_first=False,
+                                                     record_ids=record_ids, journal=journal, resume=True)
+
+    assert sent == ["finding 4", "finding 5"]
+    assert [r["finding"] for r in results] == descriptions
+
+
+def test_llm_failures_are_retried_on_resume_under_regex_first(monkeypatch, tmp_path):
+    iberia = importlib.import_module('iberia_findings_to_db')
+    journal = RunJournal(str(tmp_path / 'journal.jsonl'), fsync=False)
+    # Descripciones incompletas para regex: todas pasan por el LLM, aunque regex encuentra la ubicación
+    descriptions = [f"cabin: seat {i} damaged" for i in range(3)]
+    record_ids = [f"TB{i}" for i in range(3)]
+    sent = []
+
+    def llm(descriptions, batch_size, on_batch=None, failing=(), **kwargs):
+        sent.extend(descriptions)
+        results = [{} if desc in failing else {"item": desc} for desc in descriptions]
+        on_batch(list(range(len(results))), results)
+        return results
+
+    monkeypatch.setattr(iberia, 'parse_descriptions_bulk_batched',
+                        lambda *args, **kwargs: llm(*args, failing={descriptions[1]}, **kwargs))
+    first = iberia.get_information_parsed_from_llm(descriptions, record_ids=record_ids, journal=journal)
+    # El registro fallido conserva lo extraído por regex en esta ejecución, pero no queda en el diario
+    assert first[1]["location"] == "CABIN" and not first[1]["item"]
+    assert set(journal.load()) == {"TB0", "TB2"}
+
+    sent.clear()
+    monkeypatch.setattr(iberia, 'parse_descriptions_bulk_batched', llm)
+    results = iberia.get_information_parsed_from_llm(descriptions, record_ids=record_ids, journal=journal,
+                                                     resume=True)
+
+    assert sent == [descriptions[1]]
+    assert set(journal.load()) == set(record_ids)
+    assert [r["item"] for r in results] == descriptions
@@ -0,0 +1,143 @@
+import sys
+import os
+import sqlite3
+import importlib
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from semantic_cache import SemanticCache, adapt_record, mask_identifiers, semantic_extract, evaluate_semantic_cache
+from run_journal import RunJournal
+import numpy as np
+
+SIDEWALL = "FINDING (NRC) TASKCARD ZL-151-02-2 (4) / ITEM-1WO8019242 AFT CARGO: IN BAD CONDITION SIDEWALLPANEL 152NW P/NG2557685700000"
+SIDEWALL_RECORD = {
+    "taskcard": "ZL-151-02-2 (4)", "work_order": "WO8019242", "item": "1", "location": "AFT CARGO",
+    "panel_code": "152NW", "fin": "152NW", "serial_number": None, "repair_reference": None,
+    "part_numbers": ["G2557685700000"], "amm_tasks": [], "amm_revisions": [],
+    "finding": "Sidewall panel in bad condition",
+    "actions": {"send_to_workshop": True, "damage_out_of_limits": False, "supply_new_material": False},
+}
+
+
+def test_identifiers_are_masked():
+    other = SIDEWALL.replace("8019242", "8020001").replace("152NW", "153NW")
+
+    assert mask_identifiers(SIDEWALL) == mask_identifiers(other.lower())
+    assert "8019242" not in mask_identifiers(SIDEWALL)
+
+
+def test_neighbour_extraction_is_patched_with_the_new_identifiers():
+    description = SIDEWALL.replace("8019242", "8020001").replace("152NW", "153NW").replace("G2557685700000", "G2557685700001")
+
+    record = adapt_record(SIDEWALL_RECORD, description)
+
+    assert record["work_order"] == "WO8020001"
+    assert record["panel_code"] == record["fin"] == "153NW"
+    assert record["part_numbers"] == ["G2557685700001"]
+    # Lo no identificador se toma del vecino
+    assert record["finding"] == "Sidewall panel in bad condition"
+    assert record["actions"]["send_to_workshop"] is True
+    assert SIDEWALL_RECORD["work_order"] == "WO8019242"
+
+
+def test_neighbour_identifiers_missing_from_the_text_are_dropped():
+    record = adapt_record(SIDEWALL_RECORD, "AFT CARGO: IN BAD CONDITION SIDEWALLPANEL")
+
+    assert record["taskcard"] is None and record["work_order"] is None
+    assert record["part_numbers"] == []
+
+
+def test_only_misses_go_to_the_llm(tmp_path):
+    cache = SemanticCache(str(tmp_path / "semantic.sqlite"), threshold=0.9)
+    cache.add_many([SIDEWALL, "SEAT 12C BACKREST TORN"], [SIDEWALL_RECORD, {}])
+    sent = []
+
+    def llm_extract(descriptions):
+        sent.extend(descriptions)
+        return [{"finding": d} for d in descriptions]
+
+    near = SIDEWALL.replace("8019242", "8020001")
+    results = semantic_extract([near, "GALLEY OVEN INOP"], llm_extract, cache)
+
+    assert sent == ["GALLEY OVEN INOP"]
+    assert results[0]["work_order"] == "WO8020001"
+    assert results[1] == {"finding": "GALLEY OVEN INOP"}
+    assert cache.stats()["hits"] == 1
+    # Los resultados del LLM se indexan y persisten; los vacíos no
+    reopened = SemanticCache(str(tmp_path / "semantic.sqlite"))
+    assert len(reopened) == 2
+    assert reopened.lookup(["GALLEY OVEN INOP"])[0]["finding"] == "GALLEY OVEN INOP"
+
+
+def test_entries_are_only_reused_within_their_namespace(tmp_path):
+    path = str(tmp_path / "semantic.sqlite")
+    SemanticCache(path, namespace="prompt-a").add_many([SIDEWALL], [SIDEWALL_RECORD])
+
+    assert SemanticCache(path, namespace="prompt-b").lookup([SIDEWALL]) == [None]
+    assert SemanticCache(path, namespace="prompt-a").lookup([SIDEWALL])[0]["finding"] == SIDEWALL_RECORD["finding"]
+
+
+def test_entries_without_namespace_are_kept_out_of_namespaced_caches(tmp_path):
+    path = str(tmp_path / "semantic.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE semantic_cache (key TEXT PRIMARY KEY, description TEXT NOT NULL, result TEXT NOT NULL)")
+    connection.execute("INSERT INTO semantic_cache VALUES ('k', ?, '{\"finding\": \"old\"}')", (SIDEWALL,))
+    connection.commit()
+    connection.close()
+
+    assert len(SemanticCache(path, namespace="prompt-a")) == 0
+    assert len(SemanticCache(path)) == 1
+
+
+def test_sparse_nearest_matches_dense_scores():
+    descriptions = [SIDEWALL.replace("152NW", f"{100 + i}NW") + f" ZONE {chr(65 + i % 26)}" for i in range(40)]
+    descriptions += ["SEAT 12C BACKREST TORN", "GALLEY OVEN INOP", "LAV DOOR HINGE LOOSE"]
+    cache = SemanticCache(path=None)
+    cache.add_many(descriptions[::2], [{"finding": d} for d in descriptions[::2]])
+    queries = descriptions[1::2] + ["ZZZZ"]
+
+    neighbours, similarities = cache.nearest(queries, chunk_size=4)
+
+    vectorizer, matrix = cache._index()
+    dense = (vectorizer.transform([mask_identifiers(d) for d in queries]) @ matrix.T).toarray()
+    assert np.allclose(similarities, dense.max(axis=1))
+    assert (dense[np.arange(len(queries) - 1), neighbours[:-1]] == dense.max(axis=1)[:-1]).all()
+    assert neighbours[-1] == -1 and similarities[-1] == 0
+
+
+def test_held_out_evaluation_reports_hit_rate_and_accuracy():
+    descriptions, records = [], []
+    for i in range(50):
+        work_order = f"WO80{19000 + i}"
+        descriptions.append(SIDEWALL.replace("WO8019242", work_order))
+        records.append({**SIDEWALL_RECORD, "work_order": work_order})
+
+    report = evaluate_semantic_cache(descriptions, records, threshold=0.9, test_size=0.2)
+
+    assert report["test_size"] == 10
+    assert report["hit_rate"] == 1.0
+    assert report["exact_match"] == 1.0
+
+
+def test_iberia_uses_the_semantic_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    iberia = importlib.import_module('iberia_findings_to_db')
+    cache = SemanticCache(path=None)
+    cache.add_many([SIDEWALL], [SIDEWALL_RECORD])
+    sent = []
+
+    def fake_llm(descriptions, *args, on_batch=None, **kwargs):
+        sent.extend(descriptions)
+        results = [{"finding": d} for d in descriptions]
+        on_batch(list(range(len(results))), results)
+        return results
+
+    monkeypatch.setattr(iberia, 'parse_descriptions_bulk_batched', fake_llm)
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+    near = SIDEWALL.replace("8019242", "8020001")
+    results = iberia.get_information_parsed_from_llm([near, "OVEN INOP"], journal=journal, regex_first=False,
+                                                     semantic_cache=cache)
+
+    assert sent == ["OVEN INOP"]
+    assert results[0]["work_order"] == "WO8020001"
+    assert set(journal.load()) == {0, 1}
@@ -0,0 +1,124 @@
+import sys
+import os
+import re
+import json
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import modules_ai
+import llm_clients
+import extraction_schemas
+from fake_openai_server import FakeOpenAIServer
+from models import Taskbar
+
+IBERIA_PROMPT = 'extract_description_fields_iberia.txt'
+
+
+def iberia_record(description, **overrides):
+    record = {
+        "taskcard": description, "work_order": "WO1", "location": None, "panel_code": None,
+        "part_numbers": ["G1"], "amm_tasks": [], "amm_revisions": [],
+        "actions": {"send_to_workshop": False, "damage_out_of_limits": False, "supply_new_material": True},
+        "finding": None, "item": "1", "fin": None, "serial_number": None, "repair_reference": None,
+    }
+    record.update(overrides)
+    return record
+
+
+def prompt_descriptions(prompt):
+    return re.findall(r"Description \d+: (.*)", prompt)
+
+
+@pytest.fixture
+def server_backend(monkeypatch):
+    def use(server, structured):
+        monkeypatch.setenv('OPENROUTER_API_KEY', 'test-key')
+        monkeypatch.setenv('OPENROUTER_BASE_URL', server.base_url)
+        monkeypatch.setitem(llm_clients.backend_structured_outputs, 'openrouter', structured)
+        llm_clients.reset_providers()
+    return use
+
+
+def test_iberia_schema_covers_taskbar_columns():
+    schema = extraction_schemas.iberia_record_schema()
+    extracted = {c.name for c in Taskbar.__table__.columns} - extraction_schemas.TASKBAR_NON_EXTRACTED_COLUMNS
+
+    assert set(schema['properties']['actions']['properties']) == {'send_to_workshop', 'damage_out_of_limits',
+                                                                  'supply_new_material'}
+    assert {'work_order', 'amm_tasks', 'amm_revisions', 'part_numbers', 'finding'} <= set(schema['properties'])
+    assert not {'updated_at', 'description_hash', 'raw_description'} & set(schema['properties'])
+    assert all(extraction_schemas.TASKBAR_RECORD_FIELDS.get(name, name) in schema['properties']
+               for name in extracted if name not in schema['properties']['actions']['properties'])
+    # Modo strict: todas las propiedades obligatorias y sin propiedades extra
+    assert schema['required'] == list(schema['properties'])
+    assert schema['additionalProperties'] is False
+
+
+@pytest.mark.parametrize("api_version, structured", [
+    ("2024-02-15-preview", False), ("2024-06-01", False), ("2024-08-01-preview", True), ("2024-10-21", True), (None, False),
+])
+def test_azure_structured_outputs_depend_on_the_api_version(monkeypatch, api_version, structured):
+    if api_version is None:
+        monkeypatch.delenv('OPENAI_API_VERSION', raising=False)
+    else:
+        monkeypatch.setenv('OPENAI_API_VERSION', api_version)
+
+    assert llm_clients.structured_outputs_supported('azure') is structured
+    assert (modules_ai.structured_response_format(IBERIA_PROMPT, False, 2) is not None) is structured
+
+
+def test_validator_rejects_empty_and_mistyped_records():
+    is_valid = extraction_schemas.record_validator(IBERIA_PROMPT)
+
+    assert is_valid(iberia_record("ZL-1"))
+    assert is_valid({"taskcard": "ZL-1"})
+    assert not is_valid({})
+    assert not is_valid(iberia_record("ZL-1", part_numbers="G1,G2"))
+    assert not is_valid(iberia_record("ZL-1", actions={"send_to_workshop": "yes"}))
+
+
+def test_schema_is_requested_and_only_invalid_records_are_reasked(server_backend):
+    def responder(prompt):
+        descriptions = prompt_descriptions(prompt)
+        records = {str(i + 1): iberia_record(d) for i, d in enumerate(descriptions)}
+        if len(server.requests) == 1:
+            records["2"]["part_numbers"] = "G1"  # tipo incorrecto
+            del records["4"]  # registro ausente
+        return json.dumps(records)
+
+    descriptions = [f"ZL-{i}" for i in range(5)]
+    with FakeOpenAIServer(responder=responder) as server:
+        server_backend(server, structured=True)
+        results = modules_ai.parse_descriptions_bulk_batched(
+            descriptions, batch_size=5, prompt_template=IBERIA_PROMPT, deepseek=True, use_cache=False,
+        )
+
+    assert [r['taskcard'] for r in results] == descriptions
+    response_format = server.requests[0]['response_format']
+    assert response_format['type'] == 'json_schema'
+    assert response_format['json_schema']['strict'] is True
+    assert response_format['json_schema']['schema']['required'] == ["1", "2", "3", "4", "5"]
+    assert len(server.requests) == 2
+    assert prompt_descriptions(server.requests[1]['messages'][-1]['content']) == ["ZL-1", "ZL-3"]
+    assert server.requests[1]['response_format']['json_schema']['schema']['required'] == ["1", "2"]
+
+
+def test_records_failing_every_attempt_stay_empty_and_uncached(server_backend, tmp_path):
+    cache = modules_ai.ExtractionCache(str(tmp_path / "cache.sqlite"))
+    responder = lambda prompt: json.dumps(
+        [iberia_record(d, part_numbers=None if d == "ZL-bad" else ["G1"]) for d in prompt_descriptions(prompt)])
+
+    with FakeOpenAIServer(responder=responder) as server:
+        server_backend(server, structured=False)
+        results = modules_ai.parse_descriptions_bulk(
+            IBERIA_PROMPT, ["ZL-ok", "ZL-bad"], deepseek=True, cache=cache, max_reasks=2,
+        )
+
+    assert results[0]['taskcard'] == "ZL-ok" and results[1] == {}
+    assert 'response_format' not in server.requests[0]
+    assert [prompt_descriptions(r['messages'][-1]['content']) for r in server.requests] == [
+        ["ZL-ok", "ZL-bad"], ["ZL-bad"], ["ZL-bad"]]
+    cached, _, pending = modules_ai.lookup_cached_results(
+        ["ZL-ok", "ZL-bad"], modules_ai.load_prompt(IBERIA_PROMPT), True, cache)
+    assert pending == [1]